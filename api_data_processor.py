@@ -1,10 +1,11 @@
 import pandas as pd
 import json
 import logging
-from datetime import datetime
 import os
 from battle_history_manager import update_battle_history, load_battle_history, get_battles_by_timeframe
 from api_scraper import refresh_battle_data
+from json_stream import iter_json_file
+from battle_normalizer import summarize_in_batches
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -15,79 +16,22 @@ GUILD_NAME = "We Profit"
 # Arquivo local com dados baixados previamente
 DATA_FILE = "data.json"
 
+# Colunas do DataFrame de batalhas processadas
+PROCESSED_COLUMNS = ['battle_id', 'time', 'players', 'kills', 'deaths', 'fame', 'details']
+
 def process_raw_battle_data(battles_data):
     """
     Processa dados brutos de batalhas para o formato padronizado
-    """
-    processed_battles = []
-    
-    for battle in battles_data:
-        try:
-            # Extrair informações básicas
-            battle_id = battle['id']
-            battle_time = datetime.fromisoformat(battle['startTime'].replace('Z', '+00:00'))
-            total_fame = battle['totalFame']
-            
-            # Os jogadores estão organizados como um dicionário, onde as chaves são os IDs dos jogadores
-            players_dict = battle['players']
-            all_players = list(players_dict.values())
-            
-            # Filtrar jogadores da guild
-            guild_players = [p for p in all_players if p.get('guildId') == GUILD_ID]
-            
-            if guild_players:
-                players_count = len(guild_players)
-                guild_kills = sum(p.get('kills', 0) for p in guild_players)
-                guild_deaths = sum(p.get('deaths', 0) for p in guild_players)
-                
-                # Agrupar por guild
-                guilds_stats = {}
-                
-                for player in all_players:
-                    guild_name = player.get('guildName', 'Unknown')
-                    
-                    if guild_name not in guilds_stats:
-                        guilds_stats[guild_name] = {
-                            'players': [],
-                            'total_kills': 0,
-                            'total_deaths': 0,
-                            'total_fame': 0
-                        }
-                    
-                    player_stats = {
-                        'name': player.get('name', 'Unknown'),
-                        'kills': player.get('kills', 0),
-                        'deaths': player.get('deaths', 0),
-                        'fame': player.get('killFame', 0)
-                    }
-                    
-                    guilds_stats[guild_name]['players'].append(player_stats)
-                    guilds_stats[guild_name]['total_kills'] += player_stats['kills']
-                    guilds_stats[guild_name]['total_deaths'] += player_stats['deaths']
-                    guilds_stats[guild_name]['total_fame'] += player_stats['fame']
-                
-                # Criar objeto de detalhes
-                battle_details = {
-                    'id': battle_id,
-                    'time': battle_time,
-                    'guilds': guilds_stats
-                }
-                
-                # Adicionar à lista
-                processed_battles.append({
-                    'battle_id': battle_id,
-                    'time': battle_time,
-                    'players': players_count,
-                    'kills': guild_kills,
-                    'deaths': guild_deaths,
-                    'fame': total_fame,
-                    'details': battle_details
-                })
-        except Exception as e:
-            logging.error(f"Erro ao processar batalha {battle.get('id', 'unknown')}: {e}")
     
-    # Criar DataFrame
-    return pd.DataFrame(processed_battles)
+    battles_data pode ser uma lista ou qualquer iterável (por exemplo, o gerador
+    de json_stream.iter_json_file), consumido em lotes por
+    battle_normalizer.summarize_in_batches; batalhas sem jogadores da guild
+    são descartadas, e as fora do formato esperado vão para a quarentena
+    (ver battle_schema).
+    """
+    summaries = [summary[PROCESSED_COLUMNS]
+                 for summary, _, _ in summarize_in_batches(battles_data, GUILD_ID)]
+    return pd.concat(summaries, ignore_index=True)
 
 def get_battle_data(days=None, force_refresh=False):
     """
@@ -105,11 +49,13 @@ def get_battle_data(days=None, force_refresh=False):
         if force_refresh:
             logging.info(f"Forçando atualização de dados da API para os últimos {days if days else 30} dias")
             api_days = days if days is not None else 30
-            battles_df = refresh_battle_data(GUILD_NAME, days=api_days)
+            new_battles_df = refresh_battle_data(GUILD_NAME, days=api_days)
+            logging.info(f"Atualização via API concluída: {len(new_battles_df)} batalhas novas")
             
+            # refresh_battle_data retorna apenas as batalhas novas e já atualiza o histórico,
+            # então os dados completos vêm do histórico
+            battles_df = get_battles_by_timeframe(api_days)
             if not battles_df.empty:
-                logging.info(f"Dados atualizados com sucesso via API: {len(battles_df)} batalhas")
-                # Já que refresh_battle_data já atualiza o histórico, apenas retornamos os dados
                 return battles_df
             else:
                 logging.warning("Não foi possível atualizar dados via API, usando dados locais")
@@ -118,11 +64,8 @@ def get_battle_data(days=None, force_refresh=False):
         if os.path.exists(DATA_FILE):
             logging.info(f"Lendo dados de batalhas do arquivo local: {DATA_FILE}")
             
-            # Abrir o arquivo JSON
-            with open(DATA_FILE, 'r') as f:
-                battles_data = json.load(f)
-            
-            logging.info(f"Encontrados dados de {len(battles_data)} batalhas no arquivo")
+            # Ler as batalhas do arquivo uma a uma, sem carregar o JSON inteiro
+            battles_data = iter_json_file(DATA_FILE)
             
             # Processar os dados brutos
             new_battles_df = process_raw_battle_data(battles_data)
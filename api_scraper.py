@@ -3,44 +3,101 @@ import numpy as np
 import requests
 import logging
 import json
-from datetime import datetime, timedelta
-import time
-from battle_history_manager import update_battle_history
+from datetime import datetime, timedelta, timezone
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from battle_history_manager import (update_battle_history, get_known_battle_ids,
+                                    get_guild_history_file, get_open_battle_ids)
+from gameinfo_client import get_client
+from rate_limiter import wait_before_retry, fetch_priority, PRIORITY_INTERACTIVE
+from json_stream import iter_response_items
+from resilience import CircuitOpenError, Deadline
+from battle_store import get_battle_store
+from response_cache import battle_is_finished
+from guild_directory import get_guild_directory, MISS
+from regions import DEFAULT_REGION, current_region, submit_in_context
+from html_fallback import fetch_guild_battles_html
+from player_profiles import queue_guild_players
+from battle_time import parse_time
+from battle_schema import battle_error, get_quarantine
+from battle_normalizer import (details_for_battle, normalize_battles, build_details,
+                               guild_battle_summary, summarize_guild_battles,
+                               summarize_in_batches, NORMALIZE_BATCH_SIZE)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
-# API URLs for Albion Online official API
-SEARCH_URL = "https://gameinfo.albiononline.com/api/gameinfo/search"
-GUILD_URL = "https://gameinfo.albiononline.com/api/gameinfo/guilds"
-BATTLES_URL = "https://gameinfo.albiononline.com/api/gameinfo/battles?range=week&offset=0&limit=51&sort=totalfame&guildId=gUFLG-kcRFC1iOJDdwW2BQ"
-BATTLE_DETAIL_URL = "https://gameinfo.albiononline.com/api/gameinfo/battles"  # Para buscar uma batalha específica, adicione /{battleId}
+# As URLs, headers e timeouts da API oficial ficam em gameinfo_client
 
 # Lista de IDs de batalhas conhecidas (para quando a API de listagem falhar)
-# Estas são batalhas reais que já aconteceram e têm dados disponíveis
+# Estas são batalhas reais que já aconteceram e têm dados disponíveis (servidor Americas)
 KNOWN_BATTLE_IDS = [
     "173256294", "173255407", "173254919", "173254596", "173254088",
     "173252884", "173252638", "173252169", "173251840", "173251429",
     "173251008", "173250742", "173250291", "173249971", "173248899"
 ]
 
+# Busca concorrente de detalhes de batalhas
+DETAIL_FETCH_CONCURRENCY = 8  # Máximo de requisições simultâneas
+DETAIL_REQUEST_TIMEOUT = 15  # Timeout (segundos) de cada tentativa individual
+DETAIL_REQUEST_DEADLINE = 40  # Prazo total (segundos) de cada batalha, somando tentativas
 
-def get_guild_id(guild_name, max_attempts=3, delay=2):
+# Paginação da listagem de batalhas
+BATTLES_PAGE_LIMIT = 51  # Máximo aceito pela API por página
+INCREMENTAL_FIRST_PAGE = 2  # Primeira página da busca incremental (cresce até BATTLES_PAGE_LIMIT)
+INCREMENTAL_MAX_PAGES = 20  # Limite de segurança de páginas por busca incremental
+
+# Ingestão de várias guilds
+MULTI_GUILD_CONCURRENCY = 4  # Listagens de guilds buscadas em paralelo
+
+# Orçamento de tempo de uma atualização completa (listagem + detalhes)
+REFRESH_BUDGET = 90  # Segundos; ao esgotar, a atualização devolve o que já obteve
+INTERACTIVE_BUDGET = 5  # Segundos para buscar os detalhes de uma batalha aberta na interface
+FALLBACK_SLOW_SECONDS = 10  # Latência mediana da listagem acima da qual o HTML do albionbattles.com é usado
+FALLBACK_MIN_SAMPLES = 5  # Amostras de latência necessárias para considerar a API lenta
+FALLBACK_SAMPLE_MAX_AGE = 30 * 60  # Amostras mais antigas (segundos) não contam: sem novas listagens, a API volta a ser testada
+
+
+def get_guild_id(guild_name, max_attempts=3, delay=1, deadline=None, use_cache=True):
     """
     Get the guild ID from the Albion Online API by searching for a guild name
+
+    O resultado (inclusive "não encontrada") fica no guild_directory, e as
+    próximas chamadas para o mesmo nome não acessam a API.
+
+    deadline: resilience.Deadline que limita tentativas e timeouts; None = sem limite
+    use_cache: False para ignorar o guild_directory e buscar na API
     """
+    directory = get_guild_directory()
+    if use_cache:
+        cached = directory.lookup(guild_name)
+        if cached is not MISS:
+            logging.info(f"Guild ID de {guild_name} obtido do cache: {cached}")
+            return cached
+
+    deadline = deadline or Deadline()
+    client = get_client()
+    searched = False
+
     for attempt in range(max_attempts):
+        if deadline.expired():
+            logging.warning(f"Orçamento de tempo esgotado ao buscar a guild {guild_name}")
+            return None
+
         try:
             # Prepare search parameters
             params = {"q": guild_name}
 
-            # Make the API request with a longer timeout
-            response = requests.get(SEARCH_URL, params=params, timeout=10)
+            # Make the API request through the shared client
+            timeout = deadline.cap_timeout(client.timeouts['search'])
+            response = client.get('search', '/search', params=params, timeout=timeout,
+                                  deadline=deadline.expires_at)
             response.raise_for_status()
 
             # Parse the JSON response
             data = response.json()
+            searched = True
 
             # Look for guilds in the search results
             if 'guilds' in data and data['guilds']:
@@ -50,6 +107,8 @@ def get_guild_id(guild_name, max_attempts=3, delay=2):
                         guild_id = guild['Id']
                         logging.info(
                             f"Found guild ID for {guild_name}: {guild_id}")
+                        directory.remember(guild_name, guild_id, guild['Name'])
+                        directory.flush()
                         return guild_id
 
             # If we didn't find a match in this attempt
@@ -59,296 +118,606 @@ def get_guild_id(guild_name, max_attempts=3, delay=2):
 
             # Wait before retrying (except on the last attempt)
             if attempt < max_attempts - 1:
-                time.sleep(delay)
+                wait_before_retry(attempt, delay, deadline.expires_at)
+
+        except CircuitOpenError as e:
+            # API fora do ar: não insistir
+            logging.warning(f"Busca da guild {guild_name} cancelada: {e}")
+            return None
 
         except requests.exceptions.Timeout:
             logging.warning(
                 f"Request timed out in attempt {attempt+1}/{max_attempts}")
             if attempt < max_attempts - 1:
-                time.sleep(delay)
+                wait_before_retry(attempt, delay, deadline.expires_at)
 
         except requests.exceptions.RequestException as e:
             logging.error(f"Error searching for guild: {e}")
             if attempt < max_attempts - 1:
-                time.sleep(delay)
+                wait_before_retry(attempt, delay, deadline.expires_at)
 
     # If we reach here, we couldn't find the guild after all attempts
     logging.warning(
         f"Guild {guild_name} not found after {max_attempts} attempts")
+    if searched:
+        # A busca respondeu sem a guild: evitar repetir a busca por um tempo
+        directory.remember(guild_name, None)
+        directory.flush()
     return None
 
 
-def get_guild_battles(guild_id, days=7, max_attempts=8, delay=5):
+def resolve_guild_ids(guild_names, max_workers=MULTI_GUILD_CONCURRENCY, deadline=None):
     """
-    Get battles for a specific guild from the Albion Online API
+    Resolve vários nomes de guilds de uma vez.
+
+    Os nomes já presentes no guild_directory são resolvidos localmente; os
+    demais são buscados na API em paralelo.
+
+    Returns:
+        Dicionário {nome: ID ou None}
     """
-    if not guild_id:
-        return pd.DataFrame()
+    directory = get_guild_directory()
+    results = {}
+    missing = []
+    for name in dict.fromkeys(guild_names):
+        cached = directory.lookup(name)
+        if cached is MISS:
+            missing.append(name)
+        else:
+            results[name] = cached
+
+    if missing:
+        logging.info(f"Buscando {len(missing)} guild(s) fora do cache: {missing}")
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(missing))),
+                                thread_name_prefix="guild-search") as executor:
+            futures = [submit_in_context(executor, get_guild_id, name, deadline=deadline)
+                       for name in missing]
+            results.update(zip(missing, (future.result() for future in futures)))
+
+    return results
+
+
+def _api_unavailable():
+    """
+    Indica se o circuit breaker do cliente está aberto (API considerada fora do ar)
+    """
+    breaker = get_client().breaker
+    return breaker is not None and breaker.is_open()
+
+
+def _api_degraded():
+    """
+    Indica se a API está fora do ar ou com a listagem de batalhas lenta demais,
+    casos em que a atualização usa a fonte HTML (html_fallback)
+    """
+    if _api_unavailable():
+        return True
+    hedging = get_client().hedging
+    if hedging is None:
+        return False
+    # Enquanto a fonte HTML é usada, a listagem da API não gera novas amostras:
+    # as antigas expiram e a atualização seguinte volta a testar a API
+    median = hedging.tracker.percentile('battles', 50, min_samples=FALLBACK_MIN_SAMPLES,
+                                        max_age=FALLBACK_SAMPLE_MAX_AGE)
+    return median is not None and median > FALLBACK_SLOW_SECONDS
+
+
+def _battles_range(days):
+    """
+    Converte o número de dias no parâmetro 'range' aceito pela API
+    """
+    if days > 14:
+        return "month"
+    if days > 7:
+        return "2weeks"
+    return "week"
+
+
+def _parse_battle_time(battle):
+    """
+    Converte o 'startTime' de uma batalha bruta para pd.Timestamp UTC
+    """
+    return parse_time(battle.get('startTime'))
+
+
+def _guild_battles_frame(raw_battles, guild_id):
+    """
+    Resume a participação de uma guild nas batalhas brutas da API (uma linha
+    por batalha em que ela participou, já com 'details'), normalizando as
+    batalhas em lotes conforme são lidas (ver battle_normalizer.summarize_in_batches).
+    Os jogadores da guild vão para a fila de perfis (player_profiles) e as
+    batalhas fora do formato esperado para a quarentena (battle_schema).
+
+    Returns:
+        (DataFrame, número de batalhas brutas lidas)
+    """
+    frames = []
+    received = 0
+    for summary, approved, count in summarize_in_batches(raw_battles, guild_id):
+        frames.append(summary.drop(columns=['guild_fame']))
+        queue_guild_players(approved, guild_id)
+        received += count
+    return pd.concat(frames, ignore_index=True), received
+
+
+def _chain_battles(first_battle, battles_iter):
+    """
+    Gera a primeira batalha já lida seguida das demais, fechando a resposta ao final.
+    As batalhas encerradas da listagem são guardadas no battle_store, para
+    que buscas posteriores pelo ID não precisem da API, e os nomes das guilds
+    participantes alimentam o guild_directory.
+    """
+    store = get_battle_store()
+    directory = get_guild_directory()
+    try:
+        if first_battle is not None:
+            store.put(first_battle)
+            directory.learn_from_battle(first_battle)
+            yield first_battle
+        for battle in battles_iter:
+            store.put(battle)
+            directory.learn_from_battle(battle)
+            yield battle
+    finally:
+        battles_iter.close()
+        directory.flush()
+
+
+def _battle_result(battle_data):
+    """
+    Formato devolvido por get_battle_by_id a partir dos dados brutos da batalha
+    """
+    return {
+        'battle_id': battle_data.get('id'),
+        'time': _parse_battle_time(battle_data),
+        'raw_data': battle_data
+    }
+
+
+def _fetch_battles_page(guild_id, range_param, offset, limit, sort,
+                        max_attempts, delay, retry_empty=True, deadline=None):
+    """
+    Busca uma página da listagem de batalhas de uma guild.
+
+    A resposta é lida em streaming: retorna um gerador que produz as batalhas
+    brutas uma a uma conforme o corpo é recebido, ou None se todas as
+    tentativas falharem. Erros de rede no meio da leitura são propagados
+    pelo gerador. Com o circuito aberto ou o orçamento de tempo esgotado,
+    desiste sem novas tentativas.
+    """
+    deadline = deadline or Deadline()
+    client = get_client()
+    params = {
+        'range': range_param,
+        'offset': offset,
+        'limit': limit,
+        'sort': sort,
+        'guildId': guild_id
+    }
 
-    battles = []
     for attempt in range(max_attempts):
-        try:
-            # Usar o formato exato da URL fornecido pelo usuário
-            # URL exata fornecida pelo usuário
-            url = f"https://gameinfo.albiononline.com/api/gameinfo/battles?range=week&offset=0&limit=51&sort=totalfame&guildId={guild_id}"
-
-            # Se precisar de mais dias, modifique o parâmetro range
-            if days > 14:
-                url = url.replace("range=week", "range=month")
-            elif days > 7:
-                url = url.replace("range=week", "range=2weeks")
-
-            # Adicionar headers para simular um navegador
-            headers = {
-                'User-Agent':
-                'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'application/json',
-                'Accept-Language': 'pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7',
-                'Referer': 'https://albiononline.com/'
-            }
+        if deadline.expired():
+            logging.warning(f"Orçamento de tempo esgotado antes da página (offset {offset})")
+            return None
 
+        try:
             logging.info(
-                f"Tentativa {attempt+1}/{max_attempts} de obter dados de batalhas usando a URL direta: {url}"
+                f"Tentativa {attempt+1}/{max_attempts} de obter dados de batalhas "
+                f"(guild {guild_id}, offset {offset}, limit {limit}, sort {sort})"
             )
-            response = requests.get(url, headers=headers, timeout=30)
+            timeout = deadline.cap_timeout(client.timeouts['battles'])
+            response = client.get('battles', '/battles', params=params, timeout=timeout,
+                                  stream=True, deadline=deadline.expires_at)
             response.raise_for_status()
 
-            # Parse the battles data and ensure it's a list
-            battles_data = response.json()
-
-            # Log para debug
-            logging.info(f"Resposta da API: {battles_data}")
-
-            if isinstance(battles_data, dict):
-                if 'error' in battles_data:
-                    logging.error(f"Erro da API: {battles_data['error']}")
-                    if attempt < max_attempts - 1:
-                        time.sleep(delay)
-                    continue
+            # Ler a primeira batalha para detectar objetos de erro da API; batalhas
+            # fora do formato esperado seguem e vão para a quarentena na normalização
+            battles_iter = iter_response_items(response)
+            first_battle = next(battles_iter, None)
 
-            if not isinstance(battles_data, list):
-                if isinstance(battles_data, dict):
-                    # Se for um dicionário, pode estar em outro formato
-                    logging.info("Convertendo formato da resposta")
-                    battles_data = [battles_data]
-                else:
-                    logging.error(f"Resposta da API em formato inesperado: {type(battles_data)}")
-                    if attempt < max_attempts - 1:
-                        time.sleep(delay)
-                    continue
+            if isinstance(first_battle, dict) and 'error' in first_battle:
+                battles_iter.close()
+                logging.error(f"Erro da API: {first_battle['error']}")
+                if attempt < max_attempts - 1:
+                    wait_before_retry(attempt, delay, deadline.expires_at)
+                continue
 
-            if not battles_data:
+            if first_battle is None and retry_empty:
                 logging.warning("Lista de batalhas vazia")
                 if attempt < max_attempts - 1:
-                    time.sleep(delay)
+                    wait_before_retry(attempt, delay, deadline.expires_at)
                 continue
 
-            logging.info(f"Recebidas {len(battles_data)} batalhas da API")
+            logging.debug(f"Recebendo batalhas da API em streaming (offset {offset})")
+            return _chain_battles(first_battle, battles_iter)
 
-            # Process each battle
-            for battle in battles_data:
-                # Basic battle info
-                battle_id = battle.get('id')
-                battle_time = datetime.fromisoformat(
-                    battle.get('startTime').replace('Z', '+00:00'))
-                total_kills = battle.get('totalKills', 0)
-                total_fame = battle.get('totalFame', 0)
-
-                # Process players from this guild in the battle
-                players_count = 0
-                guild_kills = 0
-                guild_deaths = 0
-
-                # Look through all players in the battle
-                guild_players = [
-                    player for player in battle.get('players', [])
-                    if player.get('guildId') == guild_id
-                ]
-
-                if guild_players:
-                    players_count = len(guild_players)
-                    guild_kills = sum(
-                        player.get('kills', 0) for player in guild_players)
-                    guild_deaths = sum(
-                        player.get('deaths', 0) for player in guild_players)
-
-                    battles.append({
-                        'battle_id': battle_id,
-                        'time': battle_time,
-                        'players': players_count,
-                        'kills': guild_kills,
-                        'deaths': guild_deaths,
-                        'fame': total_fame,
-                        'raw_data': battle
-                    })
-
-            # Convert to DataFrame
-            battles_df = pd.DataFrame(battles)
-            logging.info(
-                f"Retrieved {len(battles_df)} battles for guild ID {guild_id}")
-
-            if not battles_df.empty:
-                return battles_df
-            else:
-                logging.warning(f"No battles found for guild ID {guild_id}")
-                # Try again if no battles found
-                if attempt < max_attempts - 1:
-                    time.sleep(delay)
+        except CircuitOpenError as e:
+            logging.warning(f"Listagem de batalhas cancelada: {e}")
+            return None
 
         except requests.exceptions.Timeout:
             logging.warning(
                 f"Request timed out in attempt {attempt+1}/{max_attempts}")
             if attempt < max_attempts - 1:
-                time.sleep(delay)
+                wait_before_retry(attempt, delay, deadline.expires_at)
 
         except requests.exceptions.RequestException as e:
             logging.error(f"Error getting battles: {e}")
             if attempt < max_attempts - 1:
-                time.sleep(delay)
+                wait_before_retry(attempt, delay, deadline.expires_at)
 
         except Exception as e:
             logging.error(f"Unexpected error processing battles: {e}")
             if attempt < max_attempts - 1:
-                time.sleep(delay)
+                wait_before_retry(attempt, delay, deadline.expires_at)
+
+    return None
+
+
+def get_guild_battles(guild_id, days=7, max_attempts=5, delay=1, deadline=None):
+    """
+    Get battles for a specific guild from the Albion Online API
+    """
+    if not guild_id:
+        return pd.DataFrame()
+
+    deadline = deadline or Deadline()
+    range_param = _battles_range(days)
+
+    for attempt in range(max_attempts):
+        if deadline.expired():
+            logging.warning(f"Orçamento de tempo esgotado ao buscar batalhas da guild {guild_id}")
+            break
+
+        # Mesma consulta da URL original: primeira página ordenada por fama total
+        battles_data = _fetch_battles_page(guild_id, range_param, 0, BATTLES_PAGE_LIMIT,
+                                           "totalfame", 1, delay, deadline=deadline)
+        if battles_data is None:
+            if _api_unavailable():
+                break
+            if attempt < max_attempts - 1:
+                wait_before_retry(attempt, delay, deadline.expires_at)
+            continue
+
+        # As batalhas são normalizadas em lotes conforme a resposta chega; batalhas
+        # com formato inválido vão para a quarentena, sem nova busca
+        try:
+            battles_df, received = _guild_battles_frame(battles_data, guild_id)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            # Apenas falhas de leitura da resposta justificam uma nova tentativa
+            logging.error(f"Erro ao ler a listagem de batalhas: {e}")
+            if attempt < max_attempts - 1:
+                wait_before_retry(attempt, delay, deadline.expires_at)
+            continue
+        finally:
+            battles_data.close()
+
+        logging.info(f"Recebidas {received} batalhas da API")
+        logging.info(
+            f"Retrieved {len(battles_df)} battles for guild ID {guild_id}")
+
+        # Uma listagem recebida não é buscada de novo, mesmo que todas as
+        # batalhas tenham ido para a quarentena
+        if received:
+            return battles_df
+
+        logging.warning(f"No battles found for guild ID {guild_id}")
+        # Try again if no battles found
+        if attempt < max_attempts - 1:
+            wait_before_retry(attempt, delay, deadline.expires_at)
 
     # If we reach here, we couldn't get battles after all attempts
     return pd.DataFrame()
 
 
+def _crawl_new_battles(guild_id, known_ids, days, on_battle, max_pages, max_attempts, delay,
+                       deadline=None):
+    """
+    Núcleo da busca incremental: percorre as páginas da listagem de uma guild
+    (mais recentes primeiro) e chama on_battle(battle) para cada batalha bruta
+    nova dentro do período, parando na primeira batalha de known_ids.
+    Se o orçamento de tempo (deadline) acabar, para na página atual e mantém
+    as batalhas já entregues a on_battle.
+
+    Returns:
+        Número de batalhas novas encontradas, ou None se a primeira página
+        não pôde ser obtida.
+    """
+    deadline = deadline or Deadline()
+    known_ids = {str(battle_id) for battle_id in (known_ids or ())}
+    range_param = _battles_range(days)
+    cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
+
+    new_count = 0
+    offset = 0
+    limit = INCREMENTAL_FIRST_PAGE if known_ids else BATTLES_PAGE_LIMIT
+    stop_reason = f"limite de {max_pages} páginas"
+
+    for page in range(max_pages):
+        if page > 0 and deadline.expired():
+            stop_reason = "orçamento de tempo esgotado"
+            break
+
+        battles_data = _fetch_battles_page(guild_id, range_param, offset, limit, "recent",
+                                           max_attempts, delay, retry_empty=False,
+                                           deadline=deadline)
+        if battles_data is None:
+            if page == 0:
+                return None
+            stop_reason = f"falha ao obter a página {page+1}"
+            break
+
+        reached_known = False
+        reached_cutoff = False
+        received = 0
+        try:
+            # As batalhas são processadas conforme chegam; ao encontrar uma já
+            # conhecida, o restante da página nem chega a ser baixado
+            for battle in battles_data:
+                received += 1
+                error = battle_error(battle)
+                if error is not None:
+                    # Não conta como batalha nova nem interrompe a página
+                    get_quarantine().add([(battle, error)])
+                    continue
+                if str(battle.get('id')) in known_ids:
+                    reached_known = True
+                    break
+                try:
+                    if _parse_battle_time(battle) < cutoff_date:
+                        reached_cutoff = True
+                        break
+                    new_count += 1
+                    on_battle(battle)
+                except Exception as e:
+                    logging.error(f"Erro ao processar batalha {battle.get('id', 'unknown')}: {e}")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logging.error(f"Erro ao ler a página {page+1} de batalhas: {e}")
+            if page == 0 and not new_count:
+                return None
+            stop_reason = f"falha ao ler a página {page+1}"
+            break
+        finally:
+            battles_data.close()
+
+        if reached_known:
+            stop_reason = "batalha já existente no histórico"
+            break
+        if reached_cutoff:
+            stop_reason = f"batalhas com mais de {days} dias"
+            break
+        if received < limit:
+            stop_reason = "fim da listagem"
+            break
+
+        offset += received
+        limit = min(limit * 2, BATTLES_PAGE_LIMIT)
+
+    logging.info(
+        f"Busca incremental da guild {guild_id}: {new_count} batalhas novas "
+        f"em {page+1} página(s) (parada: {stop_reason})")
+
+    return new_count
+
+
+def crawl_guild_battles(guild_id, known_ids, days=7, max_pages=INCREMENTAL_MAX_PAGES,
+                        max_attempts=3, delay=1, deadline=None):
+    """
+    Busca incremental de batalhas de uma guild.
+
+    Percorre a listagem da API ordenada das mais recentes para as mais antigas,
+    paginando por 'offset', e para na primeira batalha que já existe em
+    known_ids (o "high-water mark" do histórico). Apenas as batalhas novas
+    são processadas.
+
+    A primeira página é pequena (INCREMENTAL_FIRST_PAGE batalhas) e o tamanho
+    dobra a cada página até BATTLES_PAGE_LIMIT, para que atualizações sem
+    batalhas novas transfiram o mínimo possível.
+
+    Returns:
+        DataFrame com as batalhas novas da guild (pode estar vazio), ou None
+        se a primeira página não pôde ser obtida.
+    """
+    if not guild_id:
+        return None
+
+    # As batalhas novas são normalizadas a cada NORMALIZE_BATCH_SIZE, sem
+    # acumular as batalhas brutas de todas as páginas
+    pending = []
+    frames = []
+
+    def on_battle(battle):
+        pending.append(battle)
+        if len(pending) >= NORMALIZE_BATCH_SIZE:
+            frames.append(_guild_battles_frame(pending, guild_id)[0])
+            pending.clear()
+
+    if _crawl_new_battles(guild_id, known_ids, days, on_battle,
+                          max_pages, max_attempts, delay, deadline) is None:
+        return None
+
+    frames.append(_guild_battles_frame(pending, guild_id)[0])
+    return pd.concat(frames, ignore_index=True)
+
+
 def process_battle_details(battle_data, guild_name):
     """
     Extract detailed information from battle data
+
+    Para várias batalhas de uma vez, use battle_normalizer.details_by_battle.
     """
-    if not battle_data or 'raw_data' not in battle_data:
+    if battle_data is None or 'raw_data' not in battle_data:
         return None
 
     # Debug log para verificar o formato dos dados recebidos
     logging.info(
         f"Processando detalhes da batalha: {battle_data['battle_id']}")
 
-    # Verificar se raw_data é uma string (resposta da API) ou um dicionário
-    raw_battle = battle_data['raw_data']
-    if isinstance(raw_battle, str):
-        try:
-            raw_battle = json.loads(raw_battle)
-        except Exception as e:
-            logging.error(f"Erro ao converter raw_data para JSON: {e}")
-            return None
-
-    battle_id = battle_data['battle_id']
-    battle_time = battle_data['time']
-
-    # Prepare the guild stats dictionary
-    guilds_stats = {}
-
-    # Group players by guild
-    guilds = {}
-    for player in raw_battle.get('players', []):
-        guild_id = player.get('guildId')
-        guild_name_api = player.get('guildName', 'Unknown')
-
-        if guild_id not in guilds:
-            guilds[guild_id] = {
-                'name': guild_name_api,
-                'players': [],
-                'total_kills': 0,
-                'total_deaths': 0,
-                'total_fame': 0
-            }
-
-        # Add player data
-        player_stats = {
-            'name': player.get('name', 'Unknown'),
-            'kills': player.get('kills', 0),
-            'deaths': player.get('deaths', 0),
-            'fame': player.get('killFame', 0)
-        }
-
-        guilds[guild_id]['players'].append(player_stats)
-        guilds[guild_id]['total_kills'] += player_stats['kills']
-        guilds[guild_id]['total_deaths'] += player_stats['deaths']
-        guilds[guild_id]['total_fame'] += player_stats['fame']
-
-    # Format guilds for the return structure
-    for guild_id, stats in guilds.items():
-        guilds_stats[stats['name']] = {
-            'players': stats['players'],
-            'total_kills': stats['total_kills'],
-            'total_deaths': stats['total_deaths'],
-            'total_fame': stats['total_fame']
-        }
-
-    battle_details = {
-        'id': battle_id,
-        'time': battle_time,
-        'guilds': guilds_stats
-    }
-
-    return battle_details
+    # raw_data pode ser o dicionário da API ou o texto JSON da resposta
+    details = details_for_battle(battle_data['raw_data'])
+    if details is None:
+        logging.error(f"Dados brutos inválidos na batalha {battle_data['battle_id']}")
+    return details
 
 
-def get_battle_by_id(battle_id, max_attempts=3, delay=2):
+def get_battle_by_id(battle_id, max_attempts=3, delay=1, timeout=30, deadline=None):
     """
     Get a specific battle by ID directly from the API
+
+    timeout: timeout (segundos) de cada tentativa
+    deadline: resilience.Deadline que limita tentativas e timeouts; None = sem limite
+
+    Batalhas encerradas já guardadas no battle_store são devolvidas sem acessar a API.
     """
-    url = f"{BATTLE_DETAIL_URL}/{battle_id}"
+    store = get_battle_store()
+    stored = store.get(battle_id)
+    if stored is not None:
+        return _battle_result(stored)
 
-    headers = {
-        'User-Agent':
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'application/json',
-        'Accept-Language': 'pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7',
-    }
+    client = get_client()
+    deadline = deadline or Deadline()
 
     for attempt in range(max_attempts):
+        # Não iniciar uma nova tentativa depois do prazo desta batalha
+        if deadline.expired():
+            logging.warning(f"Prazo esgotado ao buscar batalha ID {battle_id}")
+            break
+
         try:
             logging.info(
                 f"Buscando batalha ID {battle_id}, tentativa {attempt+1}/{max_attempts}"
             )
-            response = requests.get(url, headers=headers, timeout=30)
+            response = client.get('battle', f"/battles/{battle_id}",
+                                  timeout=deadline.cap_timeout(timeout),
+                                  deadline=deadline.expires_at)
             response.raise_for_status()
 
             battle_data = response.json()
 
-            # Verificar se a resposta possui o formato esperado
-            if 'id' not in battle_data:
-                logging.warning(
-                    f"Resposta para batalha ID {battle_id} não possui o formato esperado"
-                )
-                if attempt < max_attempts - 1:
-                    time.sleep(delay)
-                continue
+            # Uma resposta fora do formato esperado não muda ao buscar de novo:
+            # vai para a quarentena, sem novas tentativas
+            error = battle_error(battle_data)
+            if error is not None:
+                get_quarantine().add([(battle_data, error)])
+                logging.warning(f"Batalha ID {battle_id} com formato inesperado: {error}")
+                return None
 
-            battle_id = battle_data.get('id')
-            battle_time = datetime.fromisoformat(
-                battle_data.get('startTime').replace('Z', '+00:00'))
+            store.put(battle_data)
+            return _battle_result(battle_data)
 
-            return {
-                'battle_id': battle_id,
-                'time': battle_time,
-                'raw_data': battle_data
-            }
+        except CircuitOpenError as e:
+            logging.warning(f"Busca da batalha ID {battle_id} cancelada: {e}")
+            break
 
         except requests.exceptions.Timeout:
             logging.warning(
                 f"Timeout ao buscar batalha ID {battle_id}, tentativa {attempt+1}/{max_attempts}"
             )
             if attempt < max_attempts - 1:
-                time.sleep(delay)
+                wait_before_retry(attempt, delay, deadline.expires_at)
 
         except requests.exceptions.RequestException as e:
             logging.error(f"Erro ao buscar batalha ID {battle_id}: {e}")
             if attempt < max_attempts - 1:
-                time.sleep(delay)
+                wait_before_retry(attempt, delay, deadline.expires_at)
 
     return None
 
 
-def refresh_battle_data(guild_name, days=30):
+def fetch_battle_details(battle_id, guild_name, budget=INTERACTIVE_BUDGET):
+    """
+    Busca os detalhes completos (todas as guilds) de uma batalha aberta na interface.
+
+    A requisição tem prioridade interativa: passa na frente das atualizações
+    agendadas e do backfill no limitador de taxa. Retorna o mesmo formato de
+    process_battle_details, ou None se a batalha não puder ser obtida no prazo.
+    """
+    with fetch_priority(PRIORITY_INTERACTIVE):
+        battle = get_battle_by_id(battle_id, max_attempts=2, delay=0.2, timeout=budget,
+                                  deadline=Deadline(budget))
+    if battle is None:
+        return None
+    return process_battle_details(battle, guild_name)
+
+
+def fetch_battles_by_ids(battle_ids,
+                         max_workers=DETAIL_FETCH_CONCURRENCY,
+                         request_timeout=DETAIL_REQUEST_TIMEOUT,
+                         request_deadline=DETAIL_REQUEST_DEADLINE,
+                         deadline=None,
+                         max_attempts=2,
+                         delay=1):
+    """
+    Busca várias batalhas por ID em paralelo, usando um pool limitado de threads.
+
+    Gera tuplas (battle_id, battle) conforme cada busca termina, onde battle é o
+    mesmo dicionário retornado por get_battle_by_id (ou None em caso de falha).
+
+    Args:
+        battle_ids: IDs das batalhas (duplicados são ignorados)
+        max_workers: número máximo de requisições simultâneas
+        request_timeout: timeout (segundos) de cada tentativa
+        request_deadline: prazo total (segundos) de cada batalha, incluindo tentativas
+        deadline: resilience.Deadline do lote inteiro; batalhas não
+            concluídas a tempo são abandonadas. None = sem limite
+    """
+    deadline = deadline or Deadline()
+    unique_ids = list(dict.fromkeys(str(battle_id) for battle_id in battle_ids))
+    if not unique_ids:
+        return
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(unique_ids))),
+                                  thread_name_prefix="battle-fetch")
+
+    def fetch(battle_id):
+        # O prazo de cada batalha começa a contar quando ela sai da fila, sem passar do prazo do lote
+        remaining = deadline.remaining()
+        seconds = request_deadline if remaining is None else min(request_deadline, remaining)
+        return get_battle_by_id(battle_id,
+                                max_attempts=max_attempts,
+                                delay=delay,
+                                timeout=request_timeout,
+                                deadline=Deadline(seconds))
+
+    # As threads do pool herdam a região e a prioridade de quem pediu o lote
+    futures = {submit_in_context(executor, fetch, battle_id): battle_id
+               for battle_id in unique_ids}
+    completed = 0
+    try:
+        for future in as_completed(futures, timeout=deadline.remaining()):
+            battle_id = futures[future]
+            completed += 1
+            try:
+                yield battle_id, future.result()
+            except Exception as e:
+                logging.error(f"Erro inesperado ao buscar batalha ID {battle_id}: {e}")
+                yield battle_id, None
+    except FuturesTimeoutError:
+        logging.warning(
+            f"Prazo do lote esgotado: {len(unique_ids) - completed} de "
+            f"{len(unique_ids)} batalhas não foram concluídas")
+    finally:
+        # Não esperar por requisições pendentes; apenas descartar as que não começaram
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def refresh_battle_data(guild_name, days=30, incremental=True, budget=REFRESH_BUDGET):
     """
     Refresh all battle data for a guild using the Albion Online API
+
+    Com incremental=True, apenas as batalhas que ainda não estão no histórico
+    são buscadas e processadas (ver crawl_guild_battles). O retorno contém só
+    as batalhas obtidas nesta atualização; o histórico completo fica em
+    battle_history_manager.
+
+    budget: tempo máximo (segundos) da atualização inteira; None = sem limite.
+    Ao esgotar, as batalhas obtidas até ali são salvas e devolvidas.
+
+    Com a API fora do ar, lenta (ver _api_degraded) ou falhando na listagem,
+    as batalhas são buscadas no HTML do albionbattles.com (html_fallback).
     """
     logging.info(f"Refreshing battle data for {guild_name}")
+    deadline = Deadline(budget)
 
     # O ID da guild "We Profit" nos foi fornecido diretamente pelo usuário
     if guild_name == "We Profit":
@@ -356,67 +725,223 @@ def refresh_battle_data(guild_name, days=30):
         logging.info(f"Usando ID fixo para guild We Profit: {guild_id}")
     else:
         # Para outras guilds, tentamos procurar pelo nome
-        guild_id = get_guild_id(guild_name)
+        guild_id = get_guild_id(guild_name, deadline=deadline)
 
     if not guild_id:
         logging.warning(
             f"Guild ID não encontrado para {guild_name}, tentando usar batalhas conhecidas"
         )
-        return get_known_battles(guild_name)
+        return get_known_battles(guild_name, deadline)
+
+    history_file = get_guild_history_file(guild_id)
+
+    if _api_degraded():
+        logging.warning("API gameinfo lenta ou fora do ar, usando o HTML do albionbattles.com")
+        battles_df = None
+    else:
+        # Batalhas que estavam em andamento na última atualização
+        refresh_open_battles(guild_id, guild_name, history_file, deadline)
+
+        # Get basic battle information
+        if incremental:
+            # Registros provisórios do HTML não contam como conhecidos: a API os traz de novo
+            known_ids = get_known_battle_ids(history_file, include_html=False)
+            battles_df = crawl_guild_battles(guild_id, known_ids, days, deadline=deadline)
+            if battles_df is not None and battles_df.empty:
+                logging.info(f"Nenhuma batalha nova para {guild_name}")
+                return battles_df
+        else:
+            battles_df = get_guild_battles(guild_id, days, deadline=deadline)
 
-    # Get basic battle information
-    battles_df = get_guild_battles(guild_id, days)
+    # Sem a listagem da API, tentar a fonte HTML, que já traz as batalhas detalhadas
+    if battles_df is None:
+        html_df = fetch_guild_battles_html(guild_id, days, get_known_battle_ids(history_file),
+                                           deadline)
+        if html_df is not None:
+            _save_detailed_battles(html_df, history_file)
+            return html_df
 
     # Se não conseguir obter batalhas pela API normal, tentar com IDs conhecidos
-    if battles_df.empty:
+    if battles_df is None or battles_df.empty:
         logging.warning(
             "Não foi possível obter batalhas pela API padrão, tentando com batalhas conhecidas"
         )
-        return get_known_battles(guild_name)
+        return get_known_battles(guild_name, deadline, guild_id)
 
-    # Process battle details
-    detailed_battles = []
+    # Os detalhes já vêm da normalização em lotes, e os perfis dos membros que
+    # aparecem nas batalhas novas já estão na fila (ver _guild_battles_frame)
+    logging.info(f"Retrieved detailed data for {len(battles_df)} battles")
 
-    for _, battle in battles_df.iterrows():
-        battle_details = process_battle_details(battle, guild_name)
+    _save_detailed_battles(battles_df, history_file)
+    return battles_df
 
-        if battle_details:
-            detailed_battles.append({
-                'battle_id': battle['battle_id'],
-                'time': battle['time'],
-                'players': battle['players'],
-                'kills': battle['kills'],
-                'deaths': battle['deaths'],
-                'fame': battle['fame'],
-                'details': battle_details
-            })
-
-    # Create detailed DataFrame
-    detailed_df = pd.DataFrame(detailed_battles)
-    logging.info(f"Retrieved detailed data for {len(detailed_df)} battles")
 
-    # Atualizar o histórico de batalhas com os novos dados
-    if not detailed_df.empty:
+def _save_detailed_battles(detailed_df, history_file):
+    """
+    Atualiza o histórico de batalhas com os novos dados
+    """
+    if detailed_df.empty:
+        return
+    try:
+        update_battle_history(detailed_df, history_file)
+        logging.info(
+            f"Histórico de batalhas atualizado com {len(detailed_df)} novas batalhas"
+        )
+    except Exception as e:
+        logging.error(f"Erro ao atualizar histórico de batalhas: {e}")
+
+
+def refresh_open_battles(guild_id, guild_name=None, history_file=None, deadline=None):
+    """
+    Busca de novo as batalhas do histórico que ainda estavam em andamento e
+    substitui a versão salva pela atual. Batalhas encerradas nunca são
+    buscadas de novo; uma batalha deixa de ser buscada assim que encerra.
+
+    Returns:
+        DataFrame com as novas versões das batalhas (pode estar vazio)
+    """
+    deadline = deadline or Deadline()
+    history_file = history_file or get_guild_history_file(guild_id)
+    # Batalhas em quarentena não são buscadas de novo
+    quarantine = get_quarantine()
+    open_ids = [battle_id for battle_id in get_open_battle_ids(history_file)
+                if not quarantine.contains(battle_id)]
+    if not open_ids or deadline.expired():
+        return pd.DataFrame()
+
+    raw_battles = [battle['raw_data'] for _, battle
+                   in fetch_battles_by_ids(open_ids, deadline=deadline)
+                   if battle is not None]
+    refreshed_df, _ = summarize_guild_battles(raw_battles, guild_id)
+    refreshed_df = refreshed_df.drop(columns=['guild_fame'])
+    if not refreshed_df.empty:
         try:
-            update_battle_history(detailed_df)
-            logging.info(
-                f"Histórico de batalhas atualizado com {len(detailed_df)} novas batalhas"
-            )
+            update_battle_history(refreshed_df, history_file)
         except Exception as e:
-            logging.error(f"Erro ao atualizar histórico de batalhas: {e}")
+            logging.error(f"Erro ao atualizar batalhas em andamento no histórico: {e}")
+
+    finished = int(refreshed_df['finished'].sum()) if not refreshed_df.empty else 0
+    logging.info(
+        f"Batalhas em andamento da guild {guild_id}: {len(refreshed_df)} de {len(open_ids)} "
+        f"atualizadas, {finished} encerradas")
+    return refreshed_df
+
+
+def refresh_tracked_guilds(guild_ids, days=30, max_workers=MULTI_GUILD_CONCURRENCY,
+                           budget=REFRESH_BUDGET):
+    """
+    Atualiza o histórico de várias guilds (nossa guild, aliados, rivais) de uma vez.
 
-    return detailed_df
+    As listagens de cada guild são percorridas em paralelo com a busca
+    incremental. Uma batalha que aparece em mais de uma listagem é processada
+    uma única vez e atribuída a todas as guilds acompanhadas que participaram
+    dela, inclusive às que ainda não tinham chegado a ela na própria listagem.
 
+    budget: tempo máximo (segundos) das listagens; ao esgotar, cada guild
+    fica com as batalhas encontradas até ali. None = sem limite.
 
-def get_known_battles(guild_name):
+    Returns:
+        Dicionário {guild_id: DataFrame com as batalhas novas da guild}
+    """
+    deadline = Deadline(budget)
+    guild_ids = list(dict.fromkeys(guild_id for guild_id in guild_ids if guild_id))
+    if not guild_ids:
+        return {}
+
+    tracked = set(guild_ids)
+    history_files = {guild_id: get_guild_history_file(guild_id) for guild_id in guild_ids}
+    known_ids = {guild_id: get_known_battle_ids(history_files[guild_id], include_html=False)
+                 for guild_id in guild_ids}
+
+    # Batalhas novas de todas as listagens, indexadas por ID
+    unique_battles = {}
+    duplicates = 0
+    lock = threading.Lock()
+
+    def register(battle):
+        nonlocal duplicates
+        battle_id = str(battle.get('id'))
+        with lock:
+            if battle_id in unique_battles:
+                duplicates += 1
+            else:
+                unique_battles[battle_id] = battle
+
+    def crawl(guild_id):
+        return _crawl_new_battles(guild_id, known_ids[guild_id], days, register,
+                                  INCREMENTAL_MAX_PAGES, 3, 1, deadline)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(guild_ids))),
+                            thread_name_prefix="guild-crawl") as executor:
+        futures = [submit_in_context(executor, crawl, guild_id) for guild_id in guild_ids]
+        crawl_results = dict(zip(guild_ids, (future.result() for future in futures)))
+
+    failed = [guild_id for guild_id, result in crawl_results.items() if result is None]
+    if failed:
+        logging.warning(f"Não foi possível obter a listagem de {len(failed)} guild(s): {failed}")
+
+    # Normalizar todas as batalhas únicas de uma só vez e atribuí-las às guilds participantes
+    battles, players = normalize_battles(unique_battles.values())
+    tracked_battle_ids = players.loc[players['guild_id'].isin(tracked), 'battle_id'].unique()
+    details = build_details(battles[battles['battle_id'].isin(tracked_battle_ids)],
+                            players[players['battle_id'].isin(tracked_battle_ids)])
+    new_battles = {}
+    for guild_id in guild_ids:
+        guild_df = guild_battle_summary(battles, players, guild_id).drop(columns=['guild_fame'])
+        guild_df = guild_df[~guild_df['battle_id'].astype(str).isin(known_ids[guild_id])]
+        guild_df['details'] = guild_df['battle_id'].map(details)
+        new_battles[guild_id] = guild_df.reset_index(drop=True)
+
+    logging.info(
+        f"Ingestão de {len(guild_ids)} guilds: {len(unique_battles)} batalhas únicas, "
+        f"{duplicates} repetições entre listagens evitadas")
+
+    results = {}
+    for guild_id in guild_ids:
+        guild_df = new_battles[guild_id]
+        if not guild_df.empty:
+            try:
+                update_battle_history(guild_df, history_files[guild_id])
+            except Exception as e:
+                logging.error(f"Erro ao atualizar histórico da guild {guild_id}: {e}")
+        results[guild_id] = guild_df
+
+    # Batalhas em andamento: as encerradas já buscadas para uma guild saem do battle_store
+    for guild_id in guild_ids:
+        refresh_open_battles(guild_id, None, history_files[guild_id], deadline)
+
+    return results
+
+
+def get_known_battles(guild_name, deadline=None, guild_id=None):
     """
     Use known battle IDs to get battle data when the regular API fails
+
+    deadline: resilience.Deadline da atualização; as buscas usam apenas o tempo restante
+    guild_id: guild cujo histórico (na região atual) recebe as batalhas encontradas
+
+    Os IDs conhecidos são do servidor Americas: nas demais regiões nada é buscado.
     """
+    deadline = deadline or Deadline()
     detailed_battles = []
 
-    # Buscar até 5 batalhas conhecidas
-    for battle_id in KNOWN_BATTLE_IDS[:5]:
-        battle = get_battle_by_id(battle_id)
+    if current_region() != DEFAULT_REGION:
+        logging.warning(
+            f"Batalhas conhecidas são do servidor {DEFAULT_REGION}; ignoradas na região "
+            f"{current_region()}")
+        return pd.DataFrame()
+
+    if deadline.expired():
+        logging.warning("Orçamento de tempo esgotado; batalhas conhecidas não serão buscadas")
+        return pd.DataFrame()
+
+    # Buscar até 5 batalhas conhecidas, todas em paralelo
+    candidate_ids = KNOWN_BATTLE_IDS[:5]
+    fetched = dict(fetch_battles_by_ids(candidate_ids, deadline=deadline))
+
+    # Processar na ordem original da lista
+    for battle_id in candidate_ids:
+        battle = fetched.get(battle_id)
         if not battle:
             continue
 
@@ -440,6 +965,7 @@ def get_known_battles(guild_name):
                         'kills': guild_kills,
                         'deaths': guild_deaths,
                         'fame': stats['total_fame'],
+                        'finished': battle_is_finished(battle['raw_data']),
                         'details': battle_details
                     })
                     break
@@ -457,7 +983,7 @@ def get_known_battles(guild_name):
     # Atualizar o histórico de batalhas com os novos dados
     if not detailed_df.empty:
         try:
-            update_battle_history(detailed_df)
+            update_battle_history(detailed_df, get_guild_history_file(guild_id))
             logging.info(
                 f"Histórico de batalhas atualizado com {len(detailed_df)} batalhas conhecidas"
             )
@@ -5,11 +5,16 @@ import plotly.express as px
 import plotly.graph_objects as go
 import json
 import logging
-from apscheduler.schedulers.background import BackgroundScheduler
+import os
 import time
 
 # Importar nossos módulos
-from direct_scraper import get_battle_data # Updated import statement
+# O app apenas lê os dados gravados pelo serviço de ingestão (ingestion_daemon.py)
+from direct_scraper import load_battle_data, DATA_FILE
+from detail_requests import request_battle_details
+from ingestion_daemon import read_status, REFRESH_INTERVAL_MINUTES
+from battle_time import parse_times, within_days, server_day
+from battle_tables import player_totals
 import utils
 
 # Importar componentes
@@ -36,29 +41,54 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Função para configurar o agendador de tarefas
-def setup_scheduler():
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(refresh_data, 'interval', minutes=10)
-    scheduler.start()
-    logging.info("Agendador iniciado - atualizações a cada 10 minutos")
+# Função para carregar os dados gravados pelo serviço de ingestão
+# O cache é indexado pela data de modificação do arquivo: só relê quando o serviço grava de novo
+@st.cache_data(show_spinner=False)
+def _load_battles(data_mtime):
+    return load_battle_data()
 
-# Função para atualizar os dados
-def refresh_data(force_refresh=False):
+def load_data():
     try:
-        logging.info(f"Iniciando atualização {'via scraper' if force_refresh else 'automática'} dos dados")
-        # Forçar atualização do scraper
-        battles_df = get_battle_data(force_refresh=True)
-        logging.info(f"Dados obtidos do scraper: {len(battles_df)} batalhas")
-        # Salvar no estado da sessão
-        st.session_state['battles_data'] = battles_df
-        from datetime import timezone
-        st.session_state['last_update'] = datetime.now(timezone.utc)
-        logging.info(f"Dados atualizados com sucesso - {len(battles_df)} batalhas")
-        return True
-    except Exception as e:
-        logging.error(f"Erro na atualização {'via scraper' if force_refresh else 'automática'}: {e}")
-        return False
+        data_mtime = os.path.getmtime(DATA_FILE)
+    except OSError:
+        data_mtime = None
+    return _load_battles(data_mtime)
+
+# Função para pedir ao serviço de ingestão os detalhes completos (todas as guilds) da batalha aberta
+# O serviço faz a busca com prioridade interativa, na frente das atualizações em andamento
+# Falhas viram exceção, que o st.cache_data não guarda: a próxima abertura da batalha pede de novo
+@st.cache_data(show_spinner=False, ttl=300)
+def _request_details(battle_id):
+    details = request_battle_details(battle_id, GUILD_NAME)
+    if details is None:
+        raise LookupError(f"Detalhes da batalha {battle_id} indisponíveis")
+    return details
+
+def load_battle_details(battle_id):
+    try:
+        return _request_details(battle_id)
+    except LookupError:
+        return None
+
+# Função para obter os horários da última e da próxima atualização do serviço de ingestão
+def get_update_times():
+    from datetime import timezone
+    status = read_status()
+    interval = timedelta(minutes=status.get('interval_minutes', REFRESH_INTERVAL_MINUTES))
+
+    if status.get('last_success'):
+        last_update = datetime.fromisoformat(status['last_success'])
+    elif os.path.exists(DATA_FILE):
+        last_update = datetime.fromtimestamp(os.path.getmtime(DATA_FILE), timezone.utc)
+    else:
+        last_update = datetime.now(timezone.utc)
+
+    if status.get('next_run'):
+        next_update = datetime.fromisoformat(status['next_run'])
+    else:
+        next_update = last_update + interval
+
+    return last_update, next_update, interval, status
 
 # Função para filtrar batalhas por número mínimo de jogadores
 def filter_battles_by_players(battles_df, min_players=20):
@@ -108,17 +138,9 @@ def get_recent_battles(battles_df, days=7):
     if battles_df.empty:
         return pd.DataFrame()
 
-    # Utilizando timezone UTC para garantir compatibilidade com datetime64[ns, UTC]
-    from datetime import timezone
-    cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
-
-    # Converter para o mesmo tipo se necessário
-    if 'time' in battles_df.columns and battles_df['time'].dtype.name.startswith('datetime64'):
-        # Se 'time' já é um datetime64, devemos garantir que cutoff_date também seja
-        recent_battles = battles_df[battles_df['time'] >= pd.Timestamp(cutoff_date)].copy()
-    else:
-        # Abordagem padrão
-        recent_battles = battles_df[battles_df['time'] >= cutoff_date].copy()
+    # Horários em UTC, qualquer que seja a origem dos dados (ver battle_time)
+    recent_battles = battles_df.assign(time=parse_times(battles_df['time']))
+    recent_battles = recent_battles[within_days(recent_battles['time'], days)]
 
     # Ordenar por data (mais recentes primeiro)
     return recent_battles.sort_values('time', ascending=False)
@@ -136,19 +158,15 @@ def get_daily_stats(battles_df, days=7):
     # Copiar o dataframe para evitar avisos SettingWithCopyWarning
     recent_battles = recent_battles.copy()
 
-    # Converter para data (sem hora) com tratamento correto para timezone
-    try:
-        # Usar pandas .dt para garantir compatibilidade com datetime64[ns, UTC]
-        recent_battles['date'] = recent_battles['time'].dt.date
-    except AttributeError:
-        # Caso não seja possível usar .dt.date, tentar método alternativo
-        recent_battles['date'] = recent_battles['time'].apply(lambda x: x.date())
+    # Converter para data (o dia no horário do servidor)
+    recent_battles['date'] = server_day(recent_battles['time'])
 
     # Agrupar por data
     daily_stats = recent_battles.groupby('date').agg({
         'kills': 'sum',
         'deaths': 'sum'
     }).reset_index()
+    daily_stats['date'] = daily_stats['date'].dt.date
 
     # Calcular K/D ratio
     daily_stats['kd_ratio'] = daily_stats['kills'] / daily_stats['deaths'].apply(lambda x: max(x, 1))
@@ -160,31 +178,13 @@ def get_top_players(battles_df, metric='kills', limit=3):
     if battles_df.empty:
         return []
 
-    # Extrair jogadores de todas as batalhas
-    players_data = []
-
-    for _, battle in battles_df.iterrows():
-        details = battle['details']
-        if GUILD_NAME in details['guilds']:
-            guild_data = details['guilds'][GUILD_NAME]
-            for player in guild_data['players']:
-                players_data.append(player)
-
-    if not players_data:
-        return []
-
-    # Converter para DataFrame
-    players_df = pd.DataFrame(players_data)
-
     # Agrupar por jogador e somar métricas
-    if players_df.empty:
+    player_stats = player_totals(battles_df['details'], lambda guild: guild == GUILD_NAME)
+
+    if player_stats.empty:
         return []
 
-    player_stats = players_df.groupby('name').agg({
-        'kills': 'sum',
-        'deaths': 'sum',
-        'fame': 'sum'
-    }).reset_index()
+    player_stats = player_stats.drop(columns=['battles']).sort_values('name').reset_index(drop=True)
 
     # Calcular K/D ratio
     player_stats['kd_ratio'] = player_stats['kills'] / player_stats['deaths'].apply(lambda x: max(x, 1))
@@ -215,14 +215,8 @@ def main():
     # Carregar CSS customizado
     utils.load_css()
 
-    # Configurar o agendador de tarefas para atualizações automáticas
-    setup_scheduler()
-
     # Inicializar o estado da sessão se não existir
-    if 'battles_data' not in st.session_state:
-        st.session_state['battles_data'] = get_battle_data()
-        from datetime import timezone
-        st.session_state['last_update'] = datetime.now(timezone.utc)
+    if 'selected_battle' not in st.session_state:
         st.session_state['selected_battle'] = None
 
     # Cabeçalho - Logo e título 
@@ -247,15 +241,14 @@ def main():
     col1, col2 = st.columns([2, 1])
 
     with col1:
-        # Calcular próxima atualização automática (10 minutos após a última)
+        # Horários informados pelo serviço de ingestão
         from datetime import timezone
-        last_update = st.session_state['last_update']
-        next_update = last_update + timedelta(minutes=10)
+        last_update, next_update, interval, ingestion_status = get_update_times()
         current_time = datetime.now(timezone.utc)
 
         # Mostrar progresso até a próxima atualização
         time_diff = (next_update - current_time).total_seconds()
-        total_interval = 10 * 60  # 10 minutos em segundos
+        total_interval = interval.total_seconds()
         progress = max(0, min(1.0, 1.0 - (time_diff / total_interval)))
 
         # Informação de tempo mais visível com um estilo personalizado
@@ -269,21 +262,14 @@ def main():
         </div>
         """, unsafe_allow_html=True)
 
+        if ingestion_status.get('ok') is False:
+            st.warning(f"A última atualização do serviço de ingestão falhou: {ingestion_status.get('error')}")
+
     with col2:
+        # Os dados são atualizados pelo serviço de ingestão; o botão apenas relê o que ele gravou
         if st.button("🔄 Atualizar Dados Agora", type="primary"):
-            with st.spinner("Buscando dados do scraper..."):
-                try:
-                    # Usar force_refresh=True para buscar dados diretamente do scraper
-                    st.session_state['battles_data'] = get_battle_data(force_refresh=True)
-                    from datetime import timezone
-                    st.session_state['last_update'] = datetime.now(timezone.utc)
-                    st.success("Dados atualizados com sucesso do scraper!")
-                except Exception as e:
-                    st.error(f"Falha ao atualizar dados: {str(e)}")
-                    logging.error(f"Erro na atualização manual: {e}")
-                    # Se houver erro, tenta carregar dados existentes
-                    st.session_state['battles_data'] = get_battle_data()
-                    st.warning("Usando dados locais devido a erro no scraper.")
+            _load_battles.clear()
+            st.rerun()
 
     # Container para filtros com estilo dourado da guild
     with st.container():
@@ -316,7 +302,7 @@ def main():
             )
 
     # Filtrar batalhas
-    battles_df = st.session_state['battles_data']
+    battles_df = load_data()
     filtered_battles = filter_battles_by_players(battles_df, min_players)
     recent_battles = get_recent_battles(filtered_battles, days)
 
@@ -345,6 +331,11 @@ def main():
             # Se uma batalha foi selecionada anteriormente
             if st.session_state['selected_battle'] is not None:
                 battle = st.session_state['selected_battle']
+                with st.spinner("Carregando detalhes da batalha..."):
+                    details = load_battle_details(str(battle['battle_id']))
+                if details and details.get('guilds'):
+                    battle = battle.copy()
+                    battle['details'] = details
                 show_battle_details(battle, GUILD_NAME, ALLIANCE_NAME)
 
                 if st.button("← Voltar para a lista de batalhas"):
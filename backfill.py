@@ -0,0 +1,383 @@
+"""
+Backfill retomável do histórico de batalhas de uma guild.
+
+A listagem da API só alcança o período 'range=month' e devolve no máximo 51
+batalhas por página. O backfill divide essa listagem em faixas de offset
+(shards) buscadas em paralelo e grava um checkpoint após cada página: se o
+processo cair ou for reiniciado, cada shard continua da página seguinte à
+última concluída, sem buscar de novo as páginas já feitas.
+
+As batalhas de cada página são guardadas em um arquivo temporário (JSON
+Lines) junto com o checkpoint e só entram no histórico no final, de uma vez.
+A listagem é ordenada das mais recentes para as mais antigas: batalhas novas
+que surgem durante o backfill apenas deslocam as demais para offsets maiores,
+o que gera repetições (descartadas pelo ID) e não lacunas.
+
+Uso:
+    python backfill.py --guild-id gUFLG-kcRFC1iOJDdwW2BQ
+    python backfill.py --guild-name "We Profit" --shards 6
+    python backfill.py --guild-id ... --restart   # descarta o checkpoint e recomeça
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from api_scraper import BATTLES_PAGE_LIMIT, _fetch_battles_page, get_guild_id
+from battle_history_manager import (update_battle_history, get_guild_history_file,
+                                    get_known_battle_ids, datetime_converter)
+from battle_normalizer import summarize_guild_battles
+from battle_time import parse_times
+from player_profiles import queue_guild_players
+from regions import REGIONS, region_path, submit_in_context, use_region
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Constantes
+BACKFILL_DIR = "backfill"  # Checkpoints e batalhas já obtidas de backfills em andamento
+BACKFILL_RANGE = "month"  # Maior período aceito pela listagem da API
+SHARD_PAGES = 4  # Páginas de BATTLES_PAGE_LIMIT batalhas em cada shard
+BACKFILL_CONCURRENCY = 4  # Shards buscados em paralelo
+MAX_OFFSET = 10000  # Limite de segurança para o offset da listagem
+
+
+def _checkpoint_path(guild_id):
+    return os.path.join(region_path(BACKFILL_DIR), f"checkpoint_{guild_id}.json")
+
+
+def _spool_path(guild_id):
+    return os.path.join(region_path(BACKFILL_DIR), f"battles_{guild_id}.jsonl")
+
+
+def _done_path(guild_id):
+    return os.path.join(region_path(BACKFILL_DIR), f"done_{guild_id}.json")
+
+
+class BackfillCheckpoint:
+    """
+    Estado de um backfill em disco: próxima página de cada shard e as
+    batalhas já obtidas. Thread-safe; cada página concluída é gravada
+    antes de o checkpoint avançar.
+    """
+
+    def __init__(self, guild_id, shard_size):
+        self.guild_id = guild_id
+        self.path = _checkpoint_path(guild_id)
+        self.spool_path = _spool_path(guild_id)
+        self._lock = threading.Lock()
+        self.state = {
+            'guild_id': guild_id,
+            'range': BACKFILL_RANGE,
+            'shard_size': shard_size,
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'shards': {},
+            'end_offset': None
+        }
+
+    @classmethod
+    def load(cls, guild_id, shard_size):
+        """
+        Retoma o checkpoint salvo da guild, ou cria um novo.
+        Um checkpoint feito com outro tamanho de shard é descartado.
+        """
+        checkpoint = cls(guild_id, shard_size)
+        if not os.path.exists(checkpoint.path):
+            return checkpoint
+        try:
+            with open(checkpoint.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Checkpoint inválido {checkpoint.path}, recomeçando: {e}")
+            return checkpoint
+
+        if state.get('shard_size') != shard_size:
+            logging.warning("Checkpoint com outro tamanho de shard, recomeçando o backfill")
+            checkpoint.discard()
+            return checkpoint
+
+        checkpoint.state = state
+        done = sum(1 for shard in state['shards'].values() if shard['done'])
+        logging.info(
+            f"Retomando backfill da guild {guild_id} iniciado em {state['started_at']} "
+            f"({done}/{len(state['shards'])} shards concluídos)")
+        return checkpoint
+
+    def shard(self, index):
+        """
+        Retorna o estado do shard (criando-o se ainda não existir)
+        """
+        with self._lock:
+            key = str(index)
+            if key not in self.state['shards']:
+                start = index * self.state['shard_size']
+                self.state['shards'][key] = {
+                    'start': start,
+                    'end': start + self.state['shard_size'],
+                    'next_offset': start,
+                    'done': False
+                }
+            return dict(self.state['shards'][key])
+
+    def known_shards(self):
+        with self._lock:
+            return sorted(int(key) for key in self.state['shards'])
+
+    def end_offset(self):
+        with self._lock:
+            return self.state['end_offset']
+
+    def page_done(self, index, next_offset, rows, reached_end):
+        """
+        Registra uma página concluída: grava as batalhas e depois avança o checkpoint.
+        """
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            if rows:
+                with open(self.spool_path, 'a', encoding='utf-8') as f:
+                    for row in rows:
+                        f.write(json.dumps(row, default=datetime_converter) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            shard = self.state['shards'][str(index)]
+            shard['next_offset'] = next_offset
+            shard['done'] = reached_end or next_offset >= shard['end']
+            if reached_end:
+                end_offset = self.state['end_offset']
+                self.state['end_offset'] = next_offset if end_offset is None else min(end_offset, next_offset)
+            self._write()
+
+    def _write(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def read_rows(self):
+        """
+        Lê as batalhas já obtidas, sem repetições
+        """
+        rows = {}
+        if not os.path.exists(self.spool_path):
+            return []
+        with open(self.spool_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    # Última linha incompleta de uma gravação interrompida
+                    logging.warning("Linha incompleta ignorada no arquivo de backfill")
+                    continue
+                rows.setdefault(str(row['battle_id']), row)
+        return list(rows.values())
+
+    def discard(self):
+        for path in (self.path, self.spool_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def has_pending_backfill(guild_id):
+    """
+    Indica se a guild tem um backfill interrompido esperando para ser retomado.
+    """
+    return os.path.exists(_checkpoint_path(guild_id))
+
+
+def has_completed_backfill(guild_id):
+    """
+    Indica se um backfill da guild já foi concluído (ver backfill_guild).
+    """
+    return os.path.exists(_done_path(guild_id))
+
+
+def needs_backfill(guild_id):
+    """
+    Indica se a guild precisa de um backfill: há um interrompido, ou nenhum
+    foi concluído e a guild ainda não tem histórico.
+
+    Decide pelo marcador de conclusão, e não só pelo arquivo de histórico:
+    uma guild sem batalhas no período nunca ganha o arquivo, e seria buscada
+    por inteiro de novo a cada atualização. O histórico existente só conta
+    para guilds cujo backfill é anterior ao marcador.
+    """
+    if has_pending_backfill(guild_id):
+        return True
+    return not has_completed_backfill(guild_id) \
+        and not os.path.exists(get_guild_history_file(guild_id))
+
+
+def _mark_completed(guild_id, battles, end_offset):
+    path = _done_path(guild_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'guild_id': guild_id, 'completed_at': datetime.now(timezone.utc).isoformat(),
+                   'battles': battles, 'end_offset': end_offset}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _backfill_shard(checkpoint, index, guild_id, known_ids, max_attempts, delay):
+    """
+    Busca as páginas pendentes de um shard.
+
+    Returns:
+        'full' se o shard foi até o fim da sua faixa (pode haver mais batalhas
+        depois dele), 'end' se a listagem acabou dentro dele, ou 'failed'.
+    """
+    shard = checkpoint.shard(index)
+    offset = shard['next_offset']
+    if shard['done']:
+        end_offset = checkpoint.end_offset()
+        return 'end' if end_offset is not None and end_offset < shard['end'] else 'full'
+
+    while offset < shard['end']:
+        end_offset = checkpoint.end_offset()
+        if offset >= MAX_OFFSET or (end_offset is not None and offset >= end_offset):
+            checkpoint.page_done(index, offset, [], True)
+            return 'end'
+
+        limit = min(BATTLES_PAGE_LIMIT, shard['end'] - offset)
+        battles_data = _fetch_battles_page(guild_id, BACKFILL_RANGE, offset, limit, "recent",
+                                           max_attempts, delay, retry_empty=False)
+        if battles_data is None:
+            logging.error(f"Shard {index}: falha ao obter a página no offset {offset}")
+            return 'failed'
+
+        page_battles = []
+        received = 0
+        try:
+            for battle in battles_data:
+                received += 1
+                if str(battle.get('id')) not in known_ids:
+                    page_battles.append(battle)
+        except Exception as e:
+            logging.error(f"Shard {index}: erro ao ler a página no offset {offset}: {e}")
+            return 'failed'
+        finally:
+            battles_data.close()
+
+        # A página inteira é normalizada de uma vez (ver battle_normalizer)
+        summary, approved = summarize_guild_battles(page_battles, guild_id)
+        rows = summary.drop(columns=['guild_fame']).to_dict('records')
+
+        reached_end = received < limit
+        offset += received
+        checkpoint.page_done(index, offset, rows, reached_end)
+        queue_guild_players(approved, guild_id)
+        logging.info(
+            f"Shard {index}: página até o offset {offset} concluída "
+            f"({len(rows)} batalhas novas)")
+        if reached_end:
+            return 'end'
+
+    return 'full'
+
+
+def backfill_guild(guild_id, shards=BACKFILL_CONCURRENCY, shard_pages=SHARD_PAGES,
+                   restart=False, max_attempts=3, delay=1):
+    """
+    Executa (ou retoma) o backfill completo de uma guild e grava o resultado no histórico.
+
+    Os shards iniciais são buscados em paralelo; sempre que um shard chega ao
+    fim da sua faixa sem a listagem acabar, o próximo shard é iniciado.
+
+    Returns:
+        DataFrame com as batalhas adicionadas pelo backfill, ou None se algum
+        shard falhou (o checkpoint é mantido para uma nova execução).
+    """
+    shard_size = shard_pages * BATTLES_PAGE_LIMIT
+    history_file = get_guild_history_file(guild_id)
+    known_ids = get_known_battle_ids(history_file, include_html=False)
+
+    if restart:
+        BackfillCheckpoint(guild_id, shard_size).discard()
+    checkpoint = BackfillCheckpoint.load(guild_id, shard_size)
+
+    # Retomar os shards já conhecidos e completar os iniciais
+    pending = checkpoint.known_shards()
+    next_index = max(pending, default=-1) + 1
+    while len(pending) < shards:
+        pending.append(next_index)
+        next_index += 1
+
+    failed = False
+    with ThreadPoolExecutor(max_workers=max(1, shards), thread_name_prefix="backfill") as executor:
+        futures = {
+            submit_in_context(executor, _backfill_shard, checkpoint, index, guild_id,
+                              known_ids, max_attempts, delay): index
+            for index in pending
+        }
+        while futures:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logging.error(f"Shard {index}: erro inesperado: {e}")
+                    result = 'failed'
+
+                if result == 'failed':
+                    failed = True
+                elif result == 'full' and not failed:
+                    end_offset = checkpoint.end_offset()
+                    start = next_index * shard_size
+                    # Iniciar o próximo shard, se a listagem ainda não acabou antes dele
+                    if start < MAX_OFFSET and (end_offset is None or start < end_offset):
+                        futures[submit_in_context(executor, _backfill_shard, checkpoint, next_index,
+                                                  guild_id, known_ids, max_attempts,
+                                                  delay)] = next_index
+                        next_index += 1
+
+    if failed:
+        logging.warning(
+            f"Backfill da guild {guild_id} interrompido; execute novamente para continuar "
+            f"a partir de {checkpoint.path}")
+        return None
+
+    rows = checkpoint.read_rows()
+    backfill_df = pd.DataFrame(rows)
+    if not backfill_df.empty:
+        backfill_df['time'] = parse_times(backfill_df['time'])
+        update_battle_history(backfill_df, history_file)
+
+    logging.info(
+        f"Backfill da guild {guild_id} concluído: {len(backfill_df)} batalhas novas "
+        f"até o offset {checkpoint.end_offset()}")
+    _mark_completed(guild_id, len(backfill_df), checkpoint.end_offset())
+    checkpoint.discard()
+    return backfill_df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill retomável do histórico de batalhas de uma guild")
+    parser.add_argument('--guild-id', help="ID da guild")
+    parser.add_argument('--guild-name', help="nome da guild (o ID é buscado na API)")
+    parser.add_argument('--shards', type=int, default=BACKFILL_CONCURRENCY, help="shards buscados em paralelo")
+    parser.add_argument('--shard-pages', type=int, default=SHARD_PAGES, help="páginas por shard")
+    parser.add_argument('--restart', action='store_true', help="descartar o checkpoint e recomeçar")
+    parser.add_argument('--region', choices=list(REGIONS), default=None, help="servidor da guild")
+    args = parser.parse_args()
+
+    with use_region(args.region):
+        guild_id = args.guild_id or (get_guild_id(args.guild_name) if args.guild_name else None)
+        if not guild_id:
+            parser.error("informe --guild-id ou um --guild-name existente")
+
+        result = backfill_guild(guild_id, args.shards, args.shard_pages, args.restart)
+    raise SystemExit(0 if result is not None else 1)
+
+
+if __name__ == "__main__":
+    main()
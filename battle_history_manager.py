@@ -1,14 +1,21 @@
 """
 Módulo para gerenciar o armazenamento e recuperação de histórico de batalhas.
 Provê funções para salvar batalhas novas, evitar duplicação e recuperar dados históricos.
+Os históricos são separados por região (ver regions): os arquivos das demais
+regiões ficam em regions/<região>/, com os mesmos nomes.
 """
 
 import pandas as pd
 import json
 import os
+import re
 import logging
 from datetime import datetime, timedelta
 
+from battle_tables import BattleDetails, compact_details
+from battle_time import parse_times, within_days, server_day
+from regions import DEFAULT_REGION, current_region, region_path
+
 # Configuração de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -16,23 +23,42 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 HISTORY_FILE = "battle_history.json"  # Arquivo principal de histórico
 BACKUP_DIR = "backups"  # Diretório para backups regulares
 MAX_HISTORY_DAYS = 90  # Armazenar até 90 dias de histórico
+GUILD_HISTORY_DIR = "history"  # Históricos das demais guilds acompanhadas, um arquivo por guild
+PRIMARY_GUILD_ID = "gUFLG-kcRFC1iOJDdwW2BQ"  # Guild principal (We Profit), cujo histórico fica em HISTORY_FILE
+OPEN_BATTLE_MAX_AGE = timedelta(hours=24)  # Batalhas "em andamento" mais antigas que isso não são mais buscadas
+HTML_OPEN_BATTLE_MAX_AGE = timedelta(days=7)  # Idem para os registros provisórios do HTML, à espera da API
+HTML_SOURCE = 'html'  # Coluna 'source' dos registros provisórios obtidos do albionbattles.com (html_fallback)
 
-def load_battle_history():
+def get_guild_history_file(guild_id, region=None):
+    """
+    Retorna o arquivo de histórico de uma guild na região (por padrão, a do contexto atual).
+    A guild principal continua usando HISTORY_FILE.
+    """
+    region = region or current_region()
+    if region == DEFAULT_REGION and (not guild_id or guild_id == PRIMARY_GUILD_ID):
+        return HISTORY_FILE
+    return region_path(os.path.join(GUILD_HISTORY_DIR, f"battle_history_{guild_id}.json"), region)
+
+def load_battle_history(history_file=HISTORY_FILE):
     """
     Carrega o histórico de batalhas do arquivo.
     Retorna um DataFrame vazio se o arquivo não existir.
     """
     try:
-        if os.path.exists(HISTORY_FILE):
-            with open(HISTORY_FILE, 'r') as f:
+        if os.path.exists(history_file):
+            with open(history_file, 'r') as f:
                 history_data = json.load(f)
             
             # Converter para DataFrame
             df = pd.DataFrame(history_data)
             
-            # Converter coluna de tempo para datetime
+            # Converter coluna de tempo para datetime64[ns, UTC] (ver battle_time)
             if not df.empty and 'time' in df.columns:
-                df['time'] = pd.to_datetime(df['time'])
+                df['time'] = parse_times(df['time'])
+            
+            # Detalhes compactos em memória: nomes codificados na tabela de textos (ver battle_tables)
+            if not df.empty and 'details' in df.columns:
+                df['details'] = compact_details(df['details'])
             
             logging.info(f"Carregado histórico com {len(df)} batalhas")
             return df
@@ -49,25 +75,29 @@ def datetime_converter(obj):
     """
     if isinstance(obj, datetime):
         return obj.isoformat()
+    if isinstance(obj, BattleDetails):
+        return obj.to_dict()
     raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
 
-def save_battle_history(history_df):
+def save_battle_history(history_df, history_file=HISTORY_FILE):
     """
-    Salva o histórico de batalhas no arquivo principal.
+    Salva o histórico de batalhas no arquivo (por padrão, o arquivo principal).
     Faz um backup se o arquivo já existir.
     """
     try:
-        # Garantir que o diretório de backup exista
-        if not os.path.exists(BACKUP_DIR):
-            os.makedirs(BACKUP_DIR)
+        # Garantir que o diretório de backup (da região atual) exista
+        backup_dir = region_path(BACKUP_DIR)
+        if not os.path.exists(backup_dir):
+            os.makedirs(backup_dir)
             
         # Backup do arquivo atual se existir
-        if os.path.exists(HISTORY_FILE):
+        backup_prefix = _backup_prefix(history_file)
+        if os.path.exists(history_file):
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = os.path.join(BACKUP_DIR, f"battle_history_{timestamp}.json")
+            backup_file = os.path.join(backup_dir, f"{backup_prefix}{timestamp}.json")
             
             # Copiar arquivo atual para backup
-            with open(HISTORY_FILE, 'r') as src:
+            with open(history_file, 'r') as src:
                 with open(backup_file, 'w') as dst:
                     dst.write(src.read())
             
@@ -78,6 +108,11 @@ def save_battle_history(history_df):
         for _, row in history_df.iterrows():
             # Converter campos problemáticos explicitamente
             battle_record = row.to_dict()
+            if isinstance(battle_record.get('details'), BattleDetails):
+                battle_record['details'] = battle_record['details'].to_dict()
+            # Só os registros provisórios do HTML têm origem gravada
+            if not isinstance(battle_record.get('source'), str):
+                battle_record.pop('source', None)
             
             # Converter o campo time para string ISO
             if 'time' in battle_record and isinstance(battle_record['time'], datetime):
@@ -97,149 +132,239 @@ def save_battle_history(history_df):
             
             history_data.append(battle_record)
         
-        # Salvar arquivo principal com conversor personalizado
-        with open(HISTORY_FILE, 'w') as f:
+        # Salvar arquivo com conversor personalizado
+        history_dir = os.path.dirname(history_file)
+        if history_dir and not os.path.exists(history_dir):
+            os.makedirs(history_dir)
+        with open(history_file, 'w') as f:
             json.dump(history_data, f, default=datetime_converter, indent=2)
         
-        logging.info(f"Histórico salvo com {len(history_df)} batalhas")
+        logging.info(f"Histórico salvo com {len(history_df)} batalhas em {history_file}")
         
         # Limpar backups antigos
-        cleanup_old_backups()
+        cleanup_old_backups(prefix=backup_prefix)
         
         return True
     except Exception as e:
         logging.error(f"Erro ao salvar histórico: {e}")
         return False
 
-def update_battle_history(new_battles_df):
+def _open_battles_mask(battles_df):
+    """
+    Indica as batalhas ainda em andamento (coluna 'finished' igual a False).
+    Registros sem essa informação são considerados encerrados.
+    """
+    if 'finished' not in battles_df.columns:
+        return pd.Series(False, index=battles_df.index)
+    return battles_df['finished'].eq(False)
+
+def _html_sourced_mask(battles_df):
+    """
+    Indica os registros provisórios obtidos do HTML (source igual a HTML_SOURCE),
+    que devem ser substituídos pela versão da API.
+    """
+    if 'source' not in battles_df.columns:
+        return pd.Series(False, index=battles_df.index)
+    return battles_df['source'].eq(HTML_SOURCE)
+
+def update_battle_history(new_battles_df, history_file=HISTORY_FILE):
     """
     Atualiza o histórico com novas batalhas, evitando duplicação.
+    Batalhas que estavam em andamento (finished=False) são substituídas pela
+    versão recebida, com o número da versão incrementado; batalhas já
+    encerradas nunca são alteradas.
     Retorna o histórico atualizado.
     """
     if new_battles_df.empty:
         logging.info("Nenhuma nova batalha para adicionar ao histórico")
-        return load_battle_history()
+        return load_battle_history(history_file)
     
     # Garantir que o DataFrame tem o formato esperado
     required_columns = ['battle_id', 'time', 'players', 'kills', 'deaths', 'fame', 'details']
     for col in required_columns:
         if col not in new_battles_df.columns:
             logging.error(f"Coluna obrigatória ausente nas novas batalhas: {col}")
-            return load_battle_history()
+            return load_battle_history(history_file)
     
     # Carregar histórico atual
-    history_df = load_battle_history()
+    history_df = load_battle_history(history_file)
     
+    # Uma única versão de cada batalha recebida (a última)
+    new_battles_df = new_battles_df[~new_battles_df['battle_id'].astype(str).duplicated(keep='last')]
+
     # Se não houver histórico, simplesmente usar as novas batalhas
     if history_df.empty:
         logging.info(f"Iniciando novo histórico com {len(new_battles_df)} batalhas")
-        save_battle_history(new_battles_df)
+        new_battles_df = new_battles_df.assign(version=1)
+        save_battle_history(new_battles_df, history_file)
         return new_battles_df
     
     # Verificar batalhas duplicadas
     if 'battle_id' in history_df.columns:
-        existing_ids = set(history_df['battle_id'].astype(str))
-        new_battles_ids = set(new_battles_df['battle_id'].astype(str))
+        existing_ids = history_df['battle_id'].astype(str)
+        incoming_ids = new_battles_df['battle_id'].astype(str)
+        open_ids = set(existing_ids[_open_battles_mask(history_df)])
         
-        # Filtrar apenas batalhas que não existem no histórico
-        unique_battles = new_battles_df[~new_battles_df['battle_id'].astype(str).isin(existing_ids)]
+        # Batalhas que não existem no histórico e novas versões das que ainda estavam em andamento
+        is_new = ~incoming_ids.isin(set(existing_ids))
+        is_update = incoming_ids.isin(open_ids)
+        unique_battles = new_battles_df[is_new | is_update].copy()
         
         if len(unique_battles) == 0:
             logging.info("Todas as batalhas já existem no histórico")
             return history_df
         
-        logging.info(f"Adicionando {len(unique_battles)} novas batalhas ao histórico")
+        # Versão de cada batalha: 1 para novas, anterior + 1 para substituições
+        if 'version' in history_df.columns:
+            old_versions = history_df['version'].fillna(1).astype(int)
+        else:
+            old_versions = pd.Series(1, index=history_df.index)
+        old_versions.index = existing_ids
+        old_versions = old_versions[~old_versions.index.duplicated(keep='last')]
+        unique_ids = unique_battles['battle_id'].astype(str)
+        unique_battles['version'] = unique_ids.map(old_versions).add(1).fillna(1).astype(int).values
+        
+        updated_ids = set(unique_ids[is_update[is_new | is_update]])
+        if updated_ids:
+            history_df = history_df[~existing_ids.isin(updated_ids)]
+        
+        logging.info(
+            f"Adicionando {len(unique_battles) - len(updated_ids)} novas batalhas ao histórico"
+            f" e atualizando {len(updated_ids)} batalhas em andamento")
         
         # Combinar histórico com novas batalhas
         updated_df = pd.concat([history_df, unique_battles], ignore_index=True)
         
-        # Ordenar por data, mais recentes primeiro
+        # Ordenar por data, mais recentes primeiro (horários de todas as origens em UTC)
+        updated_df['time'] = parse_times(updated_df['time'])
         updated_df = updated_df.sort_values('time', ascending=False).reset_index(drop=True)
         
         # Limitar histórico a MAX_HISTORY_DAYS
-        cutoff_date = datetime.now() - timedelta(days=MAX_HISTORY_DAYS)
-        updated_df = updated_df[updated_df['time'] >= cutoff_date]
+        updated_df = updated_df[within_days(updated_df['time'], MAX_HISTORY_DAYS)]
         
         # Salvar histórico atualizado
-        save_battle_history(updated_df)
+        save_battle_history(updated_df, history_file)
         
         return updated_df
     else:
         # Se o histórico não tiver a coluna battle_id, iniciar novo histórico
         logging.warning("Histórico existente com formato inválido. Criando novo histórico.")
-        save_battle_history(new_battles_df)
+        save_battle_history(new_battles_df, history_file)
         return new_battles_df
 
-def get_battles_by_timeframe(days=7):
+def get_known_battle_ids(history_file=HISTORY_FILE, include_html=True):
+    """
+    Retorna o conjunto de IDs (como string) das batalhas já salvas no histórico.
+    Usado pela busca incremental para saber onde parar.
+    include_html=False deixa de fora os registros provisórios do HTML, para
+    que as buscas na API os encontrem de novo.
+    """
+    history_df = load_battle_history(history_file)
+
+    if history_df.empty or 'battle_id' not in history_df.columns:
+        return set()
+
+    if not include_html:
+        history_df = history_df[~_html_sourced_mask(history_df)]
+    return set(history_df['battle_id'].astype(str))
+
+def get_open_battle_ids(history_file=HISTORY_FILE, max_age=OPEN_BATTLE_MAX_AGE,
+                        html_max_age=HTML_OPEN_BATTLE_MAX_AGE):
+    """
+    Retorna os IDs (como string) das batalhas do histórico ainda em andamento,
+    que precisam ser buscadas de novo até encerrarem.
+    Batalhas que começaram há mais de max_age são ignoradas. Os registros
+    provisórios do HTML têm um prazo maior, html_max_age, para serem
+    substituídos pela API; depois disso ficam como estão.
+    """
+    history_df = load_battle_history(history_file)
+
+    if history_df.empty or 'battle_id' not in history_df.columns:
+        return []
+
+    open_battles = history_df[_open_battles_mask(history_df)]
+    if open_battles.empty:
+        return []
+
+    recent = within_days(open_battles['time'], max_age / timedelta(days=1))
+    html_recent = within_days(open_battles['time'], html_max_age / timedelta(days=1))
+    refetch = open_battles[recent | (_html_sourced_mask(open_battles) & html_recent)]
+    return refetch['battle_id'].astype(str).tolist()
+
+def get_battles_by_timeframe(days=7, history_file=HISTORY_FILE):
     """
     Retorna batalhas dentro de um período específico.
     Por padrão, retorna as batalhas dos últimos 7 dias.
     """
-    history_df = load_battle_history()
+    history_df = load_battle_history(history_file)
     
     if history_df.empty:
         return pd.DataFrame()
     
-    cutoff_date = datetime.now() - timedelta(days=days)
-    return history_df[history_df['time'] >= cutoff_date].reset_index(drop=True)
+    return history_df[within_days(history_df['time'], days)].reset_index(drop=True)
 
-def get_daily_stats(days=30):
+def get_daily_stats(days=30, history_file=HISTORY_FILE):
     """
     Calcula estatísticas diárias a partir do histórico.
     Retorna DataFrame com estatísticas por dia.
     """
-    history_df = load_battle_history()
+    history_df = load_battle_history(history_file)
     
     if history_df.empty:
         return pd.DataFrame()
     
     # Filtrar pelo período solicitado
-    cutoff_date = datetime.now() - timedelta(days=days)
-    filtered_df = history_df[history_df['time'] >= cutoff_date]
+    filtered_df = history_df[within_days(history_df['time'], days)].copy()
     
     if filtered_df.empty:
         return pd.DataFrame()
     
-    # Criar coluna de data (apenas o dia)
-    filtered_df['date'] = filtered_df['time'].dt.date
+    # Criar coluna de data (o dia no horário do servidor)
+    filtered_df['date'] = server_day(filtered_df['time'])
     
-    # Agrupar por dia
-    daily_stats = filtered_df.groupby('date').agg({
-        'battle_id': 'count',
-        'kills': 'sum',
-        'deaths': 'sum',
-        'fame': 'sum'
-    }).reset_index()
+    # Vitória: kills > deaths
+    filtered_df['win'] = filtered_df['kills'] > filtered_df['deaths']
     
-    # Renomear colunas
-    daily_stats.rename(columns={'battle_id': 'battles'}, inplace=True)
+    # Agrupar por dia
+    daily_stats = filtered_df.groupby('date').agg(
+        battles=('battle_id', 'count'),
+        kills=('kills', 'sum'),
+        deaths=('deaths', 'sum'),
+        fame=('fame', 'sum'),
+        wins=('win', 'sum')
+    ).reset_index()
     
     # Calcular K/D ratio
     daily_stats['kd_ratio'] = daily_stats['kills'] / daily_stats['deaths'].replace(0, 1)
     
-    # Calcular vitórias (assumindo que kills > deaths é vitória)
-    def count_wins(day_battles):
-        return sum(day_battles['kills'] > day_battles['deaths'])
-    
-    daily_stats['wins'] = [count_wins(filtered_df[filtered_df['date'] == date]) for date in daily_stats['date']]
-    
     # Calcular taxa de vitórias
     daily_stats['win_rate'] = (daily_stats['wins'] / daily_stats['battles']) * 100
     
     # Ordenar por data
     daily_stats = daily_stats.sort_values('date').reset_index(drop=True)
+    daily_stats['date'] = daily_stats['date'].dt.date
+    daily_stats = daily_stats[['date', 'battles', 'kills', 'deaths', 'fame', 'kd_ratio', 'wins', 'win_rate']]
     
     return daily_stats
 
-def cleanup_old_backups(max_backups=10):
+def _backup_prefix(history_file):
+    """
+    Prefixo dos backups de um arquivo de histórico (ex.: 'battle_history_')
+    """
+    return os.path.splitext(os.path.basename(history_file))[0] + "_"
+
+def cleanup_old_backups(max_backups=10, prefix="battle_history_"):
     """
-    Remove backups antigos, mantendo apenas os mais recentes.
+    Remove backups antigos, mantendo apenas os mais recentes de cada arquivo de histórico.
     """
-    if not os.path.exists(BACKUP_DIR):
+    backup_dir = region_path(BACKUP_DIR)
+    if not os.path.exists(backup_dir):
         return
         
-    backup_files = [os.path.join(BACKUP_DIR, f) for f in os.listdir(BACKUP_DIR) 
-                   if f.startswith("battle_history_") and f.endswith(".json")]
+    # Apenas backups deste arquivo: prefixo seguido do timestamp (YYYYmmdd_HHMMSS)
+    backup_pattern = re.compile(re.escape(prefix) + r"\d{8}_\d{6}\.json$")
+    backup_files = [os.path.join(backup_dir, f) for f in os.listdir(backup_dir) 
+                   if backup_pattern.match(f)]
     
     if len(backup_files) <= max_backups:
         return
@@ -0,0 +1,227 @@
+"""
+Normalização das batalhas brutas da API gameinfo em tabelas colunares.
+
+normalize_battles transforma uma lista de batalhas brutas, em uma única
+passada, em duas tabelas:
+
+- battles: uma linha por batalha (ID, horários, fama e kills totais, situação)
+- players: uma linha por jogador em cada batalha (formato longo), com
+  battle_id, player_id, nome, guild, aliança, kills, mortes e fama de kill
+
+Os resumos por guild e o dicionário 'details' usado pelo app
+(details['guilds'][nome]['players']) são montados a partir dessas tabelas,
+com agregações do pandas em vez de um laço por jogador. Todos os caminhos
+de ingestão (api_scraper, api_data_processor, local_data_fetcher,
+direct_scraper, backfill) usam este módulo.
+
+As leituras em streaming (json_stream) usam summarize_in_batches, que
+normaliza NORMALIZE_BATCH_SIZE batalhas por vez: só um lote de batalhas
+brutas fica em memória, e não a listagem ou o arquivo inteiro.
+"""
+
+import json
+import logging
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from battle_schema import validate_battles
+from battle_tables import DetailsTable, battle_fields
+from battle_time import parse_times
+from response_cache import battle_is_finished
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Constantes
+# Campos do jogador na API → colunas da tabela players
+PLAYER_FIELDS = {
+    'id': 'player_id',
+    'name': 'name',
+    'guildId': 'guild_id',
+    'guildName': 'guild_name',
+    'allianceId': 'alliance_id',
+    'allianceName': 'alliance_name',
+    'kills': 'kills',
+    'deaths': 'deaths',
+    'killFame': 'kill_fame',
+}
+PLAYER_COLUMNS = ['battle_id'] + list(PLAYER_FIELDS.values())
+PLAYER_STAT_COLUMNS = ['kills', 'deaths', 'kill_fame']
+BATTLE_COLUMNS = ['battle_id', 'time', 'end_time', 'total_fame', 'total_kills',
+                  'total_players', 'finished']
+UNKNOWN_NAME = 'Unknown'  # Nome usado quando a API não informa o nome do jogador ou da guild
+NORMALIZE_BATCH_SIZE = 200  # Batalhas brutas normalizadas por vez nas leituras em streaming
+
+
+def _int_column(values):
+    """
+    Coluna de inteiros já validada (battle_schema) como int64; ausentes viram 0.
+    """
+    try:
+        return values.astype(np.int64)
+    except TypeError:
+        return np.where(pd.isna(values), 0, values).astype(np.int64)
+
+
+def _decode(battle):
+    """
+    Aceita a batalha bruta como dicionário ou texto JSON (texto inválido é
+    devolvido como está e reprovado na validação).
+    """
+    if isinstance(battle, str):
+        try:
+            return json.loads(battle)
+        except ValueError:
+            return battle
+    return battle
+
+
+def normalize_battles(raw_battles):
+    """
+    Normaliza batalhas brutas da API (iterável de dicionários ou textos JSON).
+
+    As batalhas passam antes por battle_schema.validate_battles: as que não
+    têm o formato esperado vão para a quarentena e ficam fora das tabelas.
+
+    Returns:
+        (battles, players): DataFrames com as colunas BATTLE_COLUMNS e
+        PLAYER_COLUMNS. Os jogadores ficam na ordem em que aparecem em cada
+        batalha, e as batalhas na ordem recebida.
+    """
+    return _normalize_approved(*validate_battles(map(_decode, raw_battles)))
+
+
+def _normalize_approved(battles, columns, counts):
+    """
+    Tabelas de normalize_battles a partir do resultado de validate_battles.
+    """
+    battle_ids = np.array([battle['id'] for battle in battles], dtype=np.int64)
+
+    battles_df = pd.DataFrame({
+        'battle_id': battle_ids,
+        'time': parse_times([battle.get('startTime') for battle in battles]),
+        'end_time': parse_times([battle.get('endTime') for battle in battles]),
+        'total_fame': np.array([battle.get('totalFame') or 0 for battle in battles],
+                               dtype=np.int64),
+        'total_kills': np.array([battle.get('totalKills') or 0 for battle in battles],
+                                dtype=np.int64),
+        'total_players': counts,
+        'finished': np.array([battle_is_finished(battle) for battle in battles], dtype=bool),
+    }, columns=BATTLE_COLUMNS)
+
+    # Todos os jogadores de todas as batalhas em uma única tabela, a partir
+    # das colunas já extraídas na validação
+    player_columns = {'battle_id': np.repeat(battle_ids, counts)}
+    for field, column in PLAYER_FIELDS.items():
+        values = columns[field]
+        if column in PLAYER_STAT_COLUMNS:
+            values = _int_column(values)
+        elif (column in ('name', 'guild_name')
+              and pd.api.types.infer_dtype(values, skipna=False) != 'string'):
+            values = np.where(pd.isna(values), UNKNOWN_NAME, values)
+        player_columns[column] = values
+    players = pd.DataFrame(player_columns, columns=PLAYER_COLUMNS)
+
+    return battles_df, players
+
+
+def guild_battle_summary(battles, players, guild_id):
+    """
+    Participação da guild em cada batalha: uma linha por batalha em que ela
+    tem jogadores, com battle_id, time, players, kills, deaths, guild_fame,
+    fame (fama total da batalha) e finished.
+    """
+    guild_players = players[players['guild_id'] == guild_id]
+    totals = guild_players.groupby('battle_id', sort=False).agg(
+        players=('battle_id', 'size'), kills=('kills', 'sum'),
+        deaths=('deaths', 'sum'), guild_fame=('kill_fame', 'sum'))
+    summary = battles[battles['battle_id'].isin(totals.index)]
+    summary = summary.join(totals, on='battle_id')
+    return pd.DataFrame({
+        'battle_id': summary['battle_id'],
+        'time': summary['time'],
+        'players': summary['players'],
+        'kills': summary['kills'],
+        'deaths': summary['deaths'],
+        'guild_fame': summary['guild_fame'],
+        'fame': summary['total_fame'],
+        'finished': summary['finished'],
+    }).reset_index(drop=True)
+
+
+def build_details(battles, players, guild_ids=None):
+    """
+    Monta o dicionário 'details' de cada batalha (formato de
+    api_scraper.process_battle_details): {'id', 'time', 'guilds': {nome: {
+    'players': [...], 'total_kills', 'total_deaths', 'total_fame'}}}.
+
+    Os jogadores são agrupados por guild_id; com guild_ids, só essas guilds
+    entram em 'guilds'. Os grupos são montados em uma DetailsTable
+    (battle_tables) e convertidos em dicionários comuns de uma só vez; para
+    manter os detalhes compactos em memória, use battle_tables.details_views.
+
+    Returns:
+        Dicionário battle_id → details, com uma entrada para cada batalha de battles.
+    """
+    table = DetailsTable.from_frames(battles, players, guild_ids)
+    return dict(zip(battles['battle_id'].tolist(), table.to_dicts(battle_fields(battles))))
+
+
+def summarize_guild_battles(raw_battles, guild_id, details_guild_ids=None):
+    """
+    Batalhas brutas → DataFrame no formato do histórico (battle_id, time,
+    players, kills, deaths, fame, guild_fame, finished, details), apenas com
+    as batalhas em que a guild participou.
+
+    details_guild_ids: guilds incluídas em 'details' (None = todas).
+
+    Returns:
+        (resumo, batalhas brutas aprovadas na validação): as aprovadas servem
+        para quem ainda lê os dados brutos (ex.: player_profiles.queue_guild_players)
+        sem validá-las de novo.
+    """
+    approved, columns, counts = validate_battles(map(_decode, raw_battles))
+    battles, players = _normalize_approved(approved, columns, counts)
+    summary = guild_battle_summary(battles, players, guild_id)
+    participating = battles[battles['battle_id'].isin(summary['battle_id'])]
+    details = build_details(participating, players[players['battle_id'].isin(summary['battle_id'])],
+                            details_guild_ids)
+    summary['details'] = [details[battle_id] for battle_id in summary['battle_id'].tolist()]
+    return summary, approved
+
+
+def summarize_in_batches(raw_battles, guild_id, details_guild_ids=None,
+                         batch_size=NORMALIZE_BATCH_SIZE):
+    """
+    summarize_guild_battles em lotes de até batch_size batalhas, lidas de
+    raw_battles conforme são consumidas (por exemplo, de json_stream).
+
+    Gera (resumo, batalhas aprovadas, batalhas lidas) de cada lote; gera ao
+    menos um lote, vazio se não houver batalhas.
+    """
+    raw_battles = iter(raw_battles)
+    batch = list(islice(raw_battles, batch_size))
+    while True:
+        summary, approved = summarize_guild_battles(batch, guild_id, details_guild_ids)
+        yield summary, approved, len(batch)
+        batch = list(islice(raw_battles, batch_size))
+        if not batch:
+            return
+
+
+def details_by_battle(raw_battles, guild_ids=None):
+    """
+    Dicionário 'details' de cada batalha bruta válida, indexado pelo ID da batalha.
+    """
+    battles, players = normalize_battles(raw_battles)
+    return build_details(battles, players, guild_ids)
+
+
+def details_for_battle(raw_battle, guild_ids=None):
+    """
+    Dicionário 'details' de uma única batalha bruta, ou None se ela for inválida.
+    """
+    details = details_by_battle([raw_battle], guild_ids)
+    return next(iter(details.values()), None)
@@ -0,0 +1,301 @@
+"""
+Validação do formato das batalhas brutas da API gameinfo, com quarentena.
+
+O formato esperado fica declarado nas constantes abaixo e é verificado em
+lote: cada batalha passa por poucas comparações de tipo, e os jogadores
+(milhares por lote) são verificados coluna a coluna com numpy e pandas, sem
+um laço por campo. validate_battles é a primeira etapa de
+battle_normalizer.normalize_battles, por onde passam todos os caminhos de
+ingestão.
+
+Uma batalha reprovada não interrompe o lote nem provoca uma nova busca: ela
+vai para a quarentena (um arquivo JSON Lines por região) com o motivo, e as
+demais seguem sem nenhuma alteração.
+
+Uso:
+    python battle_schema.py                  # resumo da quarentena por motivo
+    python battle_schema.py --region europe
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+from battle_time import parse_times, utc_now
+from regions import current_region, region_path, use_region
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Constantes
+QUARANTINE_FILE = os.path.join("cache", "quarantine.jsonl")  # Batalhas reprovadas, uma por linha
+BATTLE_COUNT_FIELDS = ('totalFame', 'totalKills')  # Inteiros não negativos da batalha (ou ausentes)
+PLAYER_ID_FIELD = 'id'  # Texto obrigatório do jogador
+PLAYER_TEXT_FIELDS = ('name', 'guildId', 'guildName', 'allianceId', 'allianceName')  # Textos (ou ausentes)
+PLAYER_COUNT_FIELDS = ('kills', 'deaths', 'killFame')  # Inteiros não negativos do jogador (ou ausentes)
+PLAYER_SCHEMA_FIELDS = (PLAYER_ID_FIELD,) + PLAYER_TEXT_FIELDS + PLAYER_COUNT_FIELDS
+
+
+def _is_count(value):
+    return value is None or (type(value) is int and value >= 0)
+
+
+def battle_error(battle):
+    """
+    Motivo pelo qual a batalha bruta não tem o formato esperado, considerando
+    apenas os campos da própria batalha (os jogadores são verificados em
+    lote por validate_battles), ou None se ela estiver correta.
+    """
+    if isinstance(battle, str):
+        return "texto que não é JSON válido"
+    if not isinstance(battle, dict):
+        return f"batalha não é um objeto JSON ({type(battle).__name__})"
+    battle_id = battle.get('id')
+    if type(battle_id) is not int or battle_id <= 0:
+        return f"'id' inválido: {battle_id!r}"
+    if not isinstance(battle.get('startTime'), str):
+        return "'startTime' ausente ou não é texto"
+    if not isinstance(battle.get('players'), (dict, list)):
+        return "'players' ausente ou não é lista/objeto"
+    for field in BATTLE_COUNT_FIELDS:
+        if not _is_count(battle.get(field)):
+            return f"'{field}' não é um inteiro não negativo: {battle.get(field)!r}"
+    return None
+
+
+# Cada verificação de coluna devolve a máscara dos valores inválidos, ou None
+# quando a coluna inteira está correta (o caso comum, decidido por
+# infer_dtype sem percorrer os valores em Python)
+
+def _id_errors(values):
+    if pd.api.types.infer_dtype(values, skipna=False) == 'string':
+        empty = values == ''
+        return empty if empty.any() else None
+    return np.fromiter((type(value) is not str or not value for value in values),
+                       dtype=bool, count=len(values))
+
+
+def _text_errors(values):
+    if pd.api.types.infer_dtype(values, skipna=True) in ('string', 'empty'):
+        return None
+    return np.fromiter((value is not None and type(value) is not str for value in values),
+                       dtype=bool, count=len(values))
+
+
+def _count_errors(values):
+    if pd.api.types.infer_dtype(values, skipna=False) == 'integer':
+        try:
+            negative = values.astype(np.int64) < 0
+            return negative if negative.any() else None
+        except OverflowError:
+            pass
+    return np.fromiter((not _is_count(value) for value in values), dtype=bool, count=len(values))
+
+
+# Verificações das colunas dos jogadores (campo, verificação, motivo), na ordem em que definem o motivo
+COLUMN_CHECKS = (
+    (PLAYER_ID_FIELD, _id_errors, f"jogador sem '{PLAYER_ID_FIELD}' de texto"),
+    *((field, _text_errors, f"'{field}' de jogador não é texto") for field in PLAYER_TEXT_FIELDS),
+    *((field, _count_errors, f"'{field}' de jogador não é um inteiro não negativo")
+      for field in PLAYER_COUNT_FIELDS),
+)
+
+
+def player_columns(battles):
+    """
+    Jogadores de todas as batalhas em colunas (campo da API → array de
+    objetos, na ordem das batalhas), com o número de jogadores de cada
+    batalha e a máscara dos jogadores que não são objetos JSON.
+    """
+    player_lists = [battle['players'] for battle in battles]
+    player_lists = [list(players.values()) if isinstance(players, dict) else players
+                    for players in player_lists]
+    counts = np.fromiter(map(len, player_lists), dtype=np.int64, count=len(player_lists))
+    records = list(chain.from_iterable(player_lists))
+    not_dict = np.fromiter((type(player) is not dict for player in records), dtype=bool,
+                           count=len(records))
+    if not_dict.any():
+        records = [{} if invalid else player for player, invalid in zip(records, not_dict)]
+    columns = {
+        field: np.fromiter((player.get(field) for player in records), dtype=object,
+                           count=len(records))
+        for field in PLAYER_SCHEMA_FIELDS
+    }
+    return columns, counts, not_dict
+
+
+def validate_battles(raw_battles):
+    """
+    Etapa de validação da ingestão: separa as batalhas brutas que têm o
+    formato esperado das demais, que vão para a quarentena da região atual
+    com o motivo.
+
+    Os jogadores são extraídos em colunas uma única vez (player_columns) e
+    verificados coluna a coluna; as colunas das batalhas aprovadas são
+    devolvidas para a normalização.
+
+    Returns:
+        (batalhas aprovadas, na ordem recebida e sem alterações,
+         colunas dos seus jogadores, número de jogadores de cada uma)
+    """
+    candidates = []
+    rejected = []
+    for battle in raw_battles:
+        error = battle_error(battle)
+        if error is None:
+            candidates.append(battle)
+        else:
+            rejected.append((battle, error))
+
+    columns, counts, not_dict = player_columns(candidates)
+    reasons = [None] * len(candidates)
+    if candidates:
+        checks = [(not_dict if not_dict.any() else None, "jogador não é um objeto JSON")]
+        checks.extend((check(columns[field]), reason) for field, check, reason in COLUMN_CHECKS)
+        owners = np.repeat(np.arange(len(candidates)), counts)
+        # A primeira verificação que reprova cada batalha define o motivo
+        for mask, reason in checks:
+            if mask is None:
+                continue
+            for position in np.unique(owners[mask]).tolist():
+                reasons[position] = reasons[position] or reason
+        times = parse_times([battle['startTime'] for battle in candidates])
+        for position in np.flatnonzero(times.isna().to_numpy()).tolist():
+            reasons[position] = reasons[position] or "'startTime' não é um horário válido"
+
+    if any(reasons):
+        approved = np.array([reason is None for reason in reasons], dtype=bool)
+        rejected.extend((battle, reason) for battle, reason in zip(candidates, reasons)
+                        if reason is not None)
+        candidates = [battle for battle, reason in zip(candidates, reasons) if reason is None]
+        rows = np.repeat(approved, counts)
+        columns = {field: values[rows] for field, values in columns.items()}
+        counts = counts[approved]
+
+    if rejected:
+        get_quarantine().add(rejected)
+    return candidates, columns, counts
+
+
+class Quarantine:
+    """
+    Batalhas reprovadas na validação, gravadas em JSON Lines com o motivo. Thread-safe.
+
+    Cada batalha (pelo ID, ou pelo conteúdo quando não há ID) é registrada
+    uma única vez, mesmo que volte a aparecer em outras listagens.
+    """
+
+    def __init__(self, path=QUARANTINE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._keys = set()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        self._keys.add(json.loads(line)['key'])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except OSError as e:
+            logging.warning(f"Não foi possível ler a quarentena {self.path}: {e}")
+
+    @staticmethod
+    def _key(battle):
+        if isinstance(battle, dict) and battle.get('id') is not None:
+            return str(battle['id'])
+        text = json.dumps(battle, sort_keys=True, default=str)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def contains(self, battle_id):
+        with self._lock:
+            return str(battle_id) in self._keys
+
+    def add(self, rejected):
+        """
+        Registra as batalhas reprovadas (pares (batalha, motivo)). Retorna quantas eram novas.
+        """
+        quarantined_at = utc_now().isoformat()
+        lines = []
+        with self._lock:
+            for battle, reason in rejected:
+                key = self._key(battle)
+                if key in self._keys:
+                    continue
+                self._keys.add(key)
+                battle_id = battle.get('id') if isinstance(battle, dict) else None
+                lines.append(json.dumps({'key': key, 'battle_id': battle_id, 'reason': reason,
+                                         'quarantined_at': quarantined_at, 'battle': battle},
+                                        default=str))
+                logging.warning(f"Batalha {battle_id} em quarentena: {reason}")
+            if not lines:
+                return 0
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write('\n'.join(lines) + '\n')
+            except OSError as e:
+                logging.error(f"Erro ao gravar a quarentena: {e}")
+        return len(lines)
+
+    def entries(self):
+        """
+        Registros gravados na quarentena ({'battle_id', 'reason', 'quarantined_at', 'battle'}).
+        """
+        entries = []
+        with self._lock:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entries.append(json.loads(line))
+                        except ValueError:
+                            continue
+            except FileNotFoundError:
+                pass
+        return entries
+
+
+_quarantines = {}
+_quarantine_lock = threading.Lock()
+
+
+def get_quarantine(region=None):
+    """
+    Retorna a quarentena compartilhada do processo para a região
+    (por padrão, a do contexto atual).
+    """
+    region = region or current_region()
+    with _quarantine_lock:
+        quarantine = _quarantines.get(region)
+        if quarantine is None:
+            quarantine = _quarantines[region] = Quarantine(region_path(QUARANTINE_FILE, region))
+    return quarantine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumo das batalhas em quarentena")
+    parser.add_argument('--region', default=None, help="Região (americas, europe, asia)")
+    args = parser.parse_args()
+
+    with use_region(args.region):
+        entries = get_quarantine().entries()
+    print(f"{len(entries)} batalhas em quarentena")
+    for reason, count in Counter(entry['reason'] for entry in entries).most_common():
+        print(f"{count:6d}  {reason}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Armazenamento permanente dos dados completos de batalhas encerradas.
+
+Depois que uma batalha termina, o conteúdo de /battles/{id} nunca mais muda.
+Cada batalha encerrada é gravada uma única vez em disco, compactada com gzip
+e indexada pelo battle_id. Na frente do disco fica um cache LRU em memória
+com as batalhas mais consultadas, que são devolvidas já decodificadas.
+
+Batalhas ainda em andamento não são guardadas aqui (ver response_cache).
+Cada região tem seu próprio armazenamento (IDs de batalhas se repetem entre servidores).
+"""
+
+import gzip
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from response_cache import battle_is_finished
+from regions import current_region, region_path
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Constantes
+BATTLE_STORE_DIR = os.path.join("cache", "battles")  # Batalhas encerradas, uma por arquivo .json.gz
+MEMORY_CACHE_SIZE = 512  # Batalhas mantidas decodificadas em memória
+COMPRESSION_LEVEL = 6  # Nível do gzip (equilíbrio entre tamanho e tempo de gravação)
+
+
+class BattleStore:
+    """
+    Cache de conteúdo imutável de batalhas: LRU em memória + arquivos gzip em disco.
+    Os dicionários devolvidos são compartilhados e não devem ser alterados.
+    """
+
+    def __init__(self, store_dir=BATTLE_STORE_DIR, memory_size=MEMORY_CACHE_SIZE):
+        self.store_dir = store_dir
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, battle_id):
+        battle_id = str(battle_id)
+        # Subdiretórios pelos últimos dígitos para não acumular milhares de arquivos em um só
+        return os.path.join(self.store_dir, battle_id[-2:].zfill(2), f"{battle_id}.json.gz")
+
+    def _remember(self, battle_id, battle):
+        with self._lock:
+            self._memory[battle_id] = battle
+            self._memory.move_to_end(battle_id)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def get(self, battle_id):
+        """
+        Retorna os dados brutos da batalha, ou None se ela não estiver guardada.
+        """
+        battle_id = str(battle_id)
+        with self._lock:
+            battle = self._memory.get(battle_id)
+            if battle is not None:
+                self._memory.move_to_end(battle_id)
+                self.hits += 1
+                return battle
+
+        path = self._path(battle_id)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                battle = json.load(f)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Arquivo de batalha inválido {path}, descartando: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+        self._remember(battle_id, battle)
+        return battle
+
+    def contains(self, battle_id):
+        battle_id = str(battle_id)
+        with self._lock:
+            if battle_id in self._memory:
+                return True
+        return os.path.exists(self._path(battle_id))
+
+    def put(self, battle):
+        """
+        Guarda uma batalha bruta da API se ela já tiver sido encerrada.
+        Retorna True se a batalha está (ou já estava) guardada.
+        """
+        if not isinstance(battle, dict) or battle.get('id') is None:
+            return False
+        if not battle_is_finished(battle):
+            return False
+
+        battle_id = str(battle['id'])
+        if self.contains(battle_id):
+            self._remember(battle_id, battle)
+            return True
+
+        path = self._path(battle_id)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=COMPRESSION_LEVEL) as f:
+                json.dump(battle, f, separators=(',', ':'))
+            # O conteúdo nunca muda: se outra thread gravou antes, a substituição é inofensiva
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.error(f"Erro ao guardar batalha {battle_id}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+        self._remember(battle_id, battle)
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'memory_hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'in_memory': len(self._memory)
+            }
+
+
+_stores = {}
+_store_lock = threading.Lock()
+
+
+def get_battle_store(region=None):
+    """
+    Retorna o armazenamento de batalhas compartilhado do processo para a região
+    (por padrão, a do contexto atual).
+    """
+    region = region or current_region()
+    with _store_lock:
+        store = _stores.get(region)
+        if store is None:
+            store = _stores[region] = BattleStore(region_path(BATTLE_STORE_DIR, region))
+    return store
@@ -0,0 +1,491 @@
+"""
+Representação compacta dos detalhes das batalhas em memória.
+
+No formato original, cada batalha guarda em details['guilds'][nome]['players']
+um dicionário por jogador, e os mesmos nomes de jogadores e guilds se
+repetem como textos em todas as batalhas. Aqui os detalhes de um conjunto de
+batalhas (o histórico carregado, a listagem lida pelo app) ficam em uma
+única DetailsTable: uma linha por jogador em cada batalha, agrupadas por
+batalha e guild, com estatísticas em arrays numpy e nomes e IDs de
+jogadores codificados como inteiros na lista de textos da própria tabela,
+onde cada texto distinto existe uma única vez. Os textos vivem enquanto a
+tabela for usada; não há
+uma tabela de textos do processo que só cresce (o serviço de ingestão roda
+por dias e cria tabelas a cada atualização).
+
+Cada batalha recebe em 'details' um BattleDetails, que se comporta como o
+dicionário antigo e monta as listas de jogadores apenas quando elas são
+acessadas. Os agrupamentos por jogador ou guild (player_totals,
+guild_totals) são feitos sobre os códigos inteiros (colunas categóricas),
+sem percorrer os dicionários.
+
+Cada jogador guarda também o ID da API ('id'), quando conhecido: detalhes
+antigos do histórico e os registros do HTML (html_fallback) não o têm.
+"""
+
+from collections.abc import Mapping, MutableMapping
+
+import numpy as np
+import pandas as pd
+
+# Estatísticas de cada jogador e dos totais de cada guild, na ordem das colunas dos arrays
+PLAYER_STATS = ('kills', 'deaths', 'fame')
+GUILD_TOTALS = ('total_kills', 'total_deaths', 'total_fame')
+
+
+def _encode_names(*columns):
+    """
+    Codifica as colunas de nomes juntas: (lista dos textos distintos, códigos
+    int32 de cada coluna). Valores ausentes recebem -1.
+    """
+    columns = [np.asarray(column, dtype=object) for column in columns]
+    codes, uniques = pd.factorize(np.concatenate(columns) if columns else [])
+    codes = codes.astype(np.int32)
+    bounds = np.cumsum([len(column) for column in columns])[:-1]
+    return uniques.tolist(), np.split(codes, bounds)
+
+
+def _player_records(ids, names, stats):
+    """
+    Dicionários dos jogadores; 'id' só entra quando é conhecido.
+    """
+    return [{'id': player_id, 'name': name, 'kills': kills, 'deaths': deaths, 'fame': fame}
+            if player_id is not None else
+            {'name': name, 'kills': kills, 'deaths': deaths, 'fame': fame}
+            for player_id, name, (kills, deaths, fame) in zip(ids, names, stats)]
+
+
+def _concat_ranges(starts, ends):
+    """
+    Índices de todas as faixas [start, end) concatenados, sem laço em Python.
+    """
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    range_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    return np.repeat(starts - range_starts, lengths) + np.arange(total)
+
+
+class DetailsTable:
+    """
+    Jogadores de um conjunto de batalhas, em grupos contíguos por batalha e
+    guild (na ordem em que aparecem), com os nomes e IDs codificados como
+    posições em strings (-1 para ausentes).
+
+    Os grupos da batalha na posição i são group_offsets[i]:group_offsets[i+1];
+    os jogadores do grupo g são player_offsets[g]:player_offsets[g+1].
+    """
+
+    def __init__(self, strings, group_offsets, group_guilds, group_totals, player_offsets,
+                 player_names, player_stats, player_ids):
+        self.strings = strings
+        self.group_offsets = group_offsets
+        self.group_guilds = group_guilds
+        self.group_totals = group_totals
+        self.player_offsets = player_offsets
+        self.player_names = player_names
+        self.player_stats = player_stats
+        self.player_ids = player_ids
+
+    @classmethod
+    def from_groups(cls, battle_count, group_battles, group_guild_names, group_totals,
+                    group_sizes, player_names, player_stats, player_ids=None):
+        """
+        Monta a tabela a partir dos grupos já ordenados por batalha (posição 0..battle_count-1).
+        player_ids: IDs dos jogadores, na ordem de player_names (None = desconhecidos).
+        """
+        if player_ids is None:
+            player_ids = [None] * len(player_names)
+        strings, (group_guilds, player_name_codes, player_id_codes) = _encode_names(
+            group_guild_names, player_names, player_ids)
+        group_battles = np.asarray(group_battles, dtype=np.int64)
+        group_sizes = np.asarray(group_sizes, dtype=np.int64)
+        return cls(
+            strings=strings,
+            group_offsets=np.concatenate(
+                ([0], np.cumsum(np.bincount(group_battles, minlength=battle_count)))),
+            group_guilds=group_guilds,
+            group_totals=np.asarray(group_totals, dtype=np.int64).reshape(-1, len(GUILD_TOTALS)),
+            player_offsets=np.concatenate(([0], np.cumsum(group_sizes))),
+            player_names=player_name_codes,
+            player_stats=np.asarray(player_stats, dtype=np.int64).reshape(-1, len(PLAYER_STATS)),
+            player_ids=player_id_codes,
+        )
+
+    @classmethod
+    def from_frames(cls, battles, players, guild_ids=None):
+        """
+        Tabela das batalhas normalizadas (battle_normalizer.normalize_battles),
+        na ordem de battles. Os jogadores são agrupados por guild_id; com
+        guild_ids, só essas guilds entram.
+        """
+        if guild_ids is not None:
+            players = players[players['guild_id'].isin(list(guild_ids))]
+        # Posição de cada jogador em battles (um ID repetido fica com a última posição)
+        positions = pd.Series(np.arange(len(battles)), index=battles['battle_id'].to_numpy())
+        positions = positions[~positions.index.duplicated(keep='last')]
+        battle_positions = positions.reindex(players['battle_id'].to_numpy()).fillna(-1) \
+            .to_numpy().astype(np.int64)
+        if (battle_positions < 0).any():
+            players = players[battle_positions >= 0]
+            battle_positions = battle_positions[battle_positions >= 0]
+        if players.empty:
+            return cls.from_groups(len(battles), [], [], [], [], [], [])
+
+        # Grupo = (batalha, guild), numerado na ordem em que aparece
+        guild_codes, _ = pd.factorize(players['guild_id'].fillna(''), sort=False)
+        groups, _ = pd.factorize(
+            battle_positions.astype(np.int64) * (guild_codes.max() + 1) + guild_codes, sort=False)
+        first_rows = np.unique(groups, return_index=True)[1]
+        group_battles = battle_positions[first_rows]
+        order = np.lexsort((groups, group_battles[groups]))
+        sorted_players = players.iloc[order]
+        sorted_groups = groups[order]
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_groups)) + 1))
+
+        stats = sorted_players[['kills', 'deaths', 'kill_fame']].to_numpy(dtype=np.int64)
+        return cls.from_groups(
+            len(battles),
+            group_battles=group_battles[sorted_groups[starts]],
+            group_guild_names=sorted_players['guild_name'].to_numpy()[starts],
+            group_totals=np.add.reduceat(stats, starts, axis=0),
+            group_sizes=np.diff(np.append(starts, len(order))),
+            player_names=sorted_players['name'].to_numpy(),
+            player_stats=stats,
+            player_ids=sorted_players['player_id'].to_numpy(),
+        )
+
+    @classmethod
+    def from_details(cls, details_list):
+        """
+        Tabela a partir de detalhes no formato de dicionário (por exemplo, os
+        lidos do histórico em JSON); valores que não são detalhes ficam sem grupos.
+        """
+        group_battles = []
+        group_guild_names = []
+        group_totals = []
+        group_sizes = []
+        players = []
+        for position, details in enumerate(details_list):
+            if not isinstance(details, Mapping):
+                continue
+            for guild_name, stats in (details.get('guilds') or {}).items():
+                guild_players = stats.get('players') or []
+                group_battles.append(position)
+                group_guild_names.append(guild_name)
+                group_totals.append([stats.get(field) or 0 for field in GUILD_TOTALS])
+                group_sizes.append(len(guild_players))
+                players.extend(guild_players)
+
+        # Jogadores de todas as batalhas extraídos coluna a coluna
+        player_stats = np.column_stack([
+            np.fromiter((player.get(field) or 0 for player in players), dtype=np.int64,
+                        count=len(players))
+            for field in PLAYER_STATS
+        ])
+        return cls.from_groups(len(details_list), group_battles, group_guild_names, group_totals,
+                               group_sizes, [player.get('name') for player in players], player_stats,
+                               [player.get('id') for player in players])
+
+    def decode(self, codes):
+        """
+        Textos dos códigos; -1 vira None.
+        """
+        strings = self.strings
+        return [strings[code] if code >= 0 else None for code in np.asarray(codes).tolist()]
+
+    def names(self, codes):
+        """
+        Coluna categórica dos textos dos códigos (as categorias são os textos da tabela).
+        """
+        return pd.Categorical.from_codes(codes, categories=pd.Index(self.strings, dtype=object))
+
+    def guild_stats(self, group):
+        """
+        Jogadores e totais de um grupo, no formato de details['guilds'][nome].
+        """
+        start, end = self.player_offsets[group], self.player_offsets[group + 1]
+        return {
+            'players': _player_records(self.decode(self.player_ids[start:end]),
+                                       self.decode(self.player_names[start:end]),
+                                       self.player_stats[start:end].tolist()),
+            **dict(zip(GUILD_TOTALS, self.group_totals[group].tolist())),
+        }
+
+    def guilds(self, position):
+        """
+        details['guilds'] da batalha na posição informada (guild → GuildStats).
+        """
+        groups = range(self.group_offsets[position], self.group_offsets[position + 1])
+        names = self.decode(self.group_guilds[groups.start:groups.stop])
+        return {name: GuildStats(self, group) for name, group in zip(names, groups)}
+
+    def to_dicts(self, fields):
+        """
+        Detalhes de todas as batalhas como dicionários comuns, de uma só vez.
+        fields: campos de cada batalha ({'id', 'time', ...}), na ordem das posições.
+        """
+        records = _player_records(self.decode(self.player_ids), self.decode(self.player_names),
+                                  self.player_stats.tolist())
+        guild_names = self.decode(self.group_guilds)
+        offsets = self.player_offsets.tolist()
+        totals = self.group_totals.tolist()
+        group_offsets = self.group_offsets.tolist()
+
+        details = []
+        for position, battle_fields in enumerate(fields):
+            guilds = {}
+            for group in range(group_offsets[position], group_offsets[position + 1]):
+                guilds[guild_names[group]] = {
+                    'players': records[offsets[group]:offsets[group + 1]],
+                    **dict(zip(GUILD_TOTALS, totals[group])),
+                }
+            details.append({**battle_fields, 'guilds': guilds})
+        return details
+
+
+class GuildStats(Mapping):
+    """
+    details['guilds'][nome] de uma batalha compacta: totais e lista de
+    jogadores (montada a cada acesso a 'players').
+    """
+
+    __slots__ = ('table', 'group')
+
+    def __init__(self, table, group):
+        self.table = table
+        self.group = group
+
+    def __getitem__(self, key):
+        if key == 'players':
+            return self.table.guild_stats(self.group)['players']
+        try:
+            column = GUILD_TOTALS.index(key)
+        except ValueError:
+            raise KeyError(key) from None
+        return int(self.table.group_totals[self.group, column])
+
+    def __iter__(self):
+        return iter(('players',) + GUILD_TOTALS)
+
+    def __len__(self):
+        return 1 + len(GUILD_TOTALS)
+
+    def to_dict(self):
+        return self.table.guild_stats(self.group)
+
+
+class BattleDetails(MutableMapping):
+    """
+    'details' de uma batalha sobre uma DetailsTable. Os campos da batalha
+    ('id', 'time', ...) ficam em um dicionário próprio; 'guilds' é montado
+    da tabela a cada acesso.
+    """
+
+    __slots__ = ('table', 'position', '_fields')
+
+    def __init__(self, table, position, fields):
+        self.table = table
+        self.position = position
+        self._fields = fields
+
+    def __getitem__(self, key):
+        if key == 'guilds' and 'guilds' not in self._fields:
+            return self.table.guilds(self.position)
+        return self._fields[key]
+
+    def __setitem__(self, key, value):
+        self._fields[key] = value
+
+    def __delitem__(self, key):
+        del self._fields[key]
+
+    def __iter__(self):
+        yield from self._fields
+        if 'guilds' not in self._fields:
+            yield 'guilds'
+
+    def __len__(self):
+        return len(self._fields) + ('guilds' not in self._fields)
+
+    def __repr__(self):
+        return f"BattleDetails(id={self._fields.get('id')!r})"
+
+    def to_dict(self):
+        """
+        Os mesmos detalhes como dicionários comuns (para gravar em JSON).
+        """
+        guilds = self['guilds']
+        return {**self._fields, 'guilds': {
+            name: stats.to_dict() if isinstance(stats, GuildStats) else stats
+            for name, stats in guilds.items()
+        }}
+
+
+def details_views(battles, players, guild_ids=None, fields=None):
+    """
+    BattleDetails de cada batalha normalizada, indexados pelo ID da batalha
+    (mesmo conteúdo de battle_normalizer.build_details).
+
+    fields: campos de cada batalha, na ordem de battles (padrão: 'id' e 'time').
+    """
+    table = DetailsTable.from_frames(battles, players, guild_ids)
+    fields = fields if fields is not None else battle_fields(battles)
+    return {battle_id: BattleDetails(table, position, battle_fields)
+            for position, (battle_id, battle_fields)
+            in enumerate(zip(battles['battle_id'].tolist(), fields))}
+
+
+def battle_fields(battles):
+    """
+    Campos {'id', 'time'} de cada batalha normalizada (time como datetime, ou None).
+    """
+    times = battles['time'].dt.floor('us').dt.to_pydatetime()
+    return [{'id': battle_id, 'time': None if time is pd.NaT else time}
+            for battle_id, time in zip(battles['battle_id'].tolist(), times)]
+
+
+def compact_details(details_list):
+    """
+    Converte uma coluna de detalhes em dicionário (como a lida do histórico)
+    para BattleDetails sobre uma única DetailsTable. Valores que não são
+    detalhes (batalhas sem 'details') são mantidos.
+    """
+    details_list = list(details_list)
+    table = DetailsTable.from_details(details_list)
+    return [
+        BattleDetails(table, position, {key: value for key, value in details.items()
+                                        if key != 'guilds'})
+        if isinstance(details, Mapping) else details
+        for position, details in enumerate(details_list)
+    ]
+
+
+def _details_table(details):
+    """
+    (DetailsTable, posições) de uma coluna 'details'. Se os detalhes não
+    forem todos BattleDetails da mesma tabela, são compactados antes.
+    """
+    details = list(details)
+    if details and all(isinstance(value, BattleDetails) for value in details) \
+            and len({id(value.table) for value in details}) == 1:
+        return details[0].table, np.array([value.position for value in details], dtype=np.int64)
+    table = DetailsTable.from_details(
+        [value.to_dict() if isinstance(value, BattleDetails) else value for value in details])
+    return table, np.arange(len(details), dtype=np.int64)
+
+
+def guild_rows(details):
+    """
+    Uma linha por guild em cada batalha da coluna 'details': battle (posição
+    na coluna), guild (categórica), players, kills, deaths e fame.
+    """
+    table, positions = _details_table(details)
+    starts, ends = table.group_offsets[positions], table.group_offsets[positions + 1]
+    groups = _concat_ranges(starts, ends)
+    totals = table.group_totals[groups]
+    return pd.DataFrame({
+        'battle': np.repeat(np.arange(len(positions)), ends - starts),
+        'guild': table.names(table.group_guilds[groups]),
+        'players': np.diff(table.player_offsets)[groups],
+        'kills': totals[:, 0],
+        'deaths': totals[:, 1],
+        'fame': totals[:, 2],
+    })
+
+
+def player_rows(details):
+    """
+    Uma linha por jogador em cada batalha da coluna 'details': battle
+    (posição na coluna), guild, name e player_id (categóricas), kills, deaths e fame.
+    """
+    table, positions = _details_table(details)
+    starts, ends = table.group_offsets[positions], table.group_offsets[positions + 1]
+    groups = _concat_ranges(starts, ends)
+    group_battles = np.repeat(np.arange(len(positions)), ends - starts)
+    player_starts, player_ends = table.player_offsets[groups], table.player_offsets[groups + 1]
+    rows = _concat_ranges(player_starts, player_ends)
+    sizes = player_ends - player_starts
+    stats = table.player_stats[rows]
+    return pd.DataFrame({
+        'battle': np.repeat(group_battles, sizes),
+        'guild': table.names(np.repeat(table.group_guilds[groups], sizes)),
+        'name': table.names(table.player_names[rows]),
+        'player_id': table.names(table.player_ids[rows]),
+        'kills': stats[:, 0],
+        'deaths': stats[:, 1],
+        'fame': stats[:, 2],
+    })
+
+
+def guild_matcher(guild_name):
+    """
+    Critério usado pelo app para reconhecer uma guild: o nome informado
+    contido no nome da guild, sem diferenciar maiúsculas.
+    """
+    guild_name = guild_name.lower()
+    return lambda name: guild_name in name.lower()
+
+
+def matching_codes(names, predicate):
+    """
+    Máscara das linhas de uma coluna categórica de nomes (guild_rows,
+    player_rows) cujo texto atende ao critério, avaliando cada texto
+    distinto uma única vez.
+    """
+    names = pd.Series(names).cat
+    accepted = np.array([predicate(name) for name in names.categories] + [False], dtype=bool)
+    # O código -1 (ausente) cai na última posição, que é False
+    return accepted[names.codes.to_numpy()]
+
+
+def _totals_by(rows, column):
+    totals = rows.groupby(column, sort=False, observed=True, dropna=False).agg(
+        kills=('kills', 'sum'), deaths=('deaths', 'sum'), fame=('fame', 'sum'),
+        battles=('battle', 'size'))
+    totals.insert(0, 'name', [None if pd.isna(name) else name for name in totals.index])
+    return totals.reset_index(drop=True)
+
+
+def player_totals(details, guild_filter):
+    """
+    Totais por jogador (name, player_id, kills, deaths, fame, battles) nas
+    guilds que atendem a guild_filter (função nome → bool), na ordem em que
+    os jogadores aparecem.
+
+    Agrupa pelos códigos dos IDs. Linhas sem ID (histórico antigo, registros
+    do HTML) vão para o ID já visto com o mesmo nome ou, se não houver, ficam
+    agrupadas pelo nome, com player_id None. O nome de cada jogador é o da
+    primeira linha em que aparece.
+    """
+    rows = player_rows(details)
+    rows = rows[matching_codes(rows['guild'], guild_filter)]
+    ids = rows['player_id'].cat.codes.to_numpy().astype(np.int64)
+    names = rows['name'].cat.codes.to_numpy().astype(np.int64)
+
+    # Nome → primeiro ID visto com esse nome, para as linhas sem ID
+    known = ids >= 0
+    name_ids = pd.Series(ids[known], index=names[known])
+    name_ids = name_ids[~name_ids.index.duplicated()]
+    ids[~known] = name_ids.reindex(names[~known]).fillna(-1).to_numpy().astype(np.int64)
+    # Sem ID: chave pelo nome, fora da faixa dos códigos dos IDs
+    keys = np.where(ids >= 0, ids, names + len(rows['name'].cat.categories) + 1)
+
+    totals = rows.groupby(keys, sort=False).agg(
+        name=('name', 'first'), player_id=('player_id', 'first'),
+        kills=('kills', 'sum'), deaths=('deaths', 'sum'), fame=('fame', 'sum'),
+        battles=('battle', 'size'))
+    for column in ('name', 'player_id'):
+        totals[column] = pd.Series([None if pd.isna(value) else value for value in totals[column]],
+                                   index=totals.index, dtype=object)
+    return totals.reset_index(drop=True)
+
+
+def guild_totals(details, guild_filter):
+    """
+    Totais por guild (name, kills, deaths, fame, battles) das guilds que
+    atendem a guild_filter, na ordem em que aparecem. Agrupa pelos códigos dos nomes.
+    """
+    rows = guild_rows(details)
+    return _totals_by(rows[matching_codes(rows['guild'], guild_filter)], 'guild')
@@ -0,0 +1,93 @@
+"""
+Horários das batalhas: conversão e filtros com um único fuso.
+
+Todos os horários são guardados como datetime64[ns, UTC] (inteiros de
+nanossegundos desde 1970, com fuso). parse_times converte uma coluna
+inteira de uma vez, aceitando os textos ISO 8601 da API (com 'Z' e até
+9 casas decimais), os textos gravados no histórico e objetos datetime;
+horários sem fuso são considerados UTC.
+
+Os filtros por período (within_days) comparam os inteiros diretamente, e os
+agrupamentos por dia (server_day) usam o horário do servidor do jogo.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Constantes
+TIME_DTYPE = "datetime64[ns, UTC]"  # Tipo das colunas de horário
+SERVER_TIMEZONE = "UTC"  # Horário do servidor do Albion (o mesmo em todas as regiões)
+
+
+def parse_times(values):
+    """
+    Converte uma coluna (Series, lista ou array) de horários para datetime64[ns, UTC].
+    Valores inválidos ou ausentes viram NaT.
+    """
+    if isinstance(values, pd.Series):
+        index = values.index
+    else:
+        index = None
+        values = pd.Series(values, dtype=object)
+
+    if isinstance(values.dtype, pd.DatetimeTZDtype):
+        times = values.dt.tz_convert('UTC')
+    elif pd.api.types.is_datetime64_dtype(values.dtype):
+        times = values.dt.tz_localize('UTC')
+    else:
+        times = pd.to_datetime(values.astype(object), utc=True, format='ISO8601', errors='coerce')
+    times = times.astype(TIME_DTYPE)
+    if index is not None:
+        times.index = index
+    return times
+
+
+def parse_time(value):
+    """
+    Converte um único horário para pd.Timestamp UTC (NaT se inválido).
+    Para colunas inteiras, use parse_times.
+    """
+    try:
+        timestamp = pd.Timestamp(value)
+    except (TypeError, ValueError):
+        return pd.NaT
+    if timestamp is pd.NaT:
+        return pd.NaT
+    if timestamp.tzinfo is None:
+        return timestamp.tz_localize('UTC')
+    return timestamp.tz_convert('UTC')
+
+
+def utc_now():
+    return pd.Timestamp.now(tz='UTC')
+
+
+def cutoff(days, now=None):
+    """
+    Instante de days dias atrás (UTC).
+    """
+    return (now or utc_now()) - pd.Timedelta(days=days)
+
+
+def within_days(times, days, now=None):
+    """
+    Máscara booleana dos horários dos últimos days dias (NaT fica de fora).
+    """
+    times = parse_times(times)
+    nanos = times.to_numpy(dtype='datetime64[ns]').view(np.int64)
+    limit = cutoff(days, now).value
+    return pd.Series(nanos >= limit, index=times.index) & times.notna()
+
+
+def server_time(times):
+    """
+    Os mesmos horários no fuso do servidor do jogo.
+    """
+    return parse_times(times).dt.tz_convert(SERVER_TIMEZONE)
+
+
+def server_day(times):
+    """
+    Dia (no horário do servidor) de cada horário, como datetime64 à meia-noite, para agrupamentos.
+    """
+    return server_time(times).dt.tz_localize(None).dt.floor('D')
@@ -0,0 +1,199 @@
+"""
+Importação em lote de arquivos grandes de batalhas brutas (dumps da API,
+backfills antigos, fixtures multiplicadas pelo gameinfo_stub_server).
+
+Os arquivos são divididos em blocos e cada bloco é lido e normalizado
+(battle_normalizer) em um processo separado; o processo principal apenas
+junta os resumos e grava o histórico da guild uma única vez. Arquivos JSON
+Lines (.jsonl / .ndjson, uma batalha por linha) são divididos em faixas de
+bytes, de modo que mesmo um único arquivo grande usa todos os núcleos.
+Arrays JSON (formato de data.json) e arquivos .gz são lidos inteiros, um
+arquivo por bloco.
+
+Uso:
+    python bulk_ingest.py dumps/*.jsonl
+    python bulk_ingest.py raw_battles_data.json --guild-id <ID> --workers 8 --region europe
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from battle_history_manager import PRIMARY_GUILD_ID, get_guild_history_file, update_battle_history
+from battle_normalizer import summarize_guild_battles
+from json_stream import iter_json_array, iter_json_file, CHUNK_SIZE
+from player_profiles import get_profile_cache, guild_player_ids
+from regions import current_region, use_region
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Constantes
+CHUNK_BYTES = 8 * 1024 * 1024  # Tamanho de cada bloco de um arquivo JSON Lines
+JSONL_SUFFIXES = ('.jsonl', '.ndjson')  # Arquivos com uma batalha por linha
+
+
+def _is_jsonl(path):
+    return path.lower().removesuffix('.gz').endswith(JSONL_SUFFIXES)
+
+
+def plan_chunks(paths, chunk_bytes=CHUNK_BYTES):
+    """
+    Divide os arquivos em blocos (path, início, fim) em bytes; fim=None indica o arquivo inteiro.
+    """
+    chunks = []
+    for path in paths:
+        size = os.path.getsize(path)
+        if not _is_jsonl(path) or path.lower().endswith('.gz') or size <= chunk_bytes:
+            chunks.append((path, 0, None))
+            continue
+        chunks.extend((path, start, min(start + chunk_bytes, size))
+                      for start in range(0, size, chunk_bytes))
+    return chunks
+
+
+def _iter_lines(lines):
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # O texto segue para a validação, que o coloca na quarentena
+            yield line if isinstance(line, str) else line.decode('utf-8', 'replace')
+
+
+def _iter_jsonl_range(path, start, end):
+    """
+    Batalhas das linhas que começam entre os bytes start e end do arquivo.
+    """
+    with open(path, 'rb') as f:
+        if start:
+            # A linha que atravessa o início do bloco pertence ao bloco anterior
+            f.seek(start - 1)
+            f.readline()
+
+        def lines():
+            while f.tell() < end:
+                line = f.readline()
+                if not line:
+                    return
+                yield line
+
+        yield from _iter_lines(lines())
+
+
+def read_chunk(path, start=0, end=None):
+    """
+    Gera as batalhas brutas de um bloco de arquivo (ver plan_chunks).
+    """
+    if end is not None:
+        yield from _iter_jsonl_range(path, start, end)
+    elif path.lower().endswith('.gz'):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            if _is_jsonl(path):
+                yield from _iter_lines(f)
+            else:
+                yield from iter_json_array(iter(lambda: f.read(CHUNK_SIZE), ''))
+    elif _is_jsonl(path):
+        with open(path, 'rb') as f:
+            yield from _iter_lines(f)
+    else:
+        yield from iter_json_file(path)
+
+
+def _normalize_chunk(task):
+    """
+    Lê e normaliza um bloco (roda nos processos do pool, na região de quem
+    criou a tarefa, que não é herdada pelos processos).
+
+    Returns:
+        (resumo das batalhas da guild, IDs dos jogadores da guild, batalhas lidas)
+    """
+    path, start, end, guild_id, region = task
+    with use_region(region):
+        # Batalhas fora do formato esperado vão para a quarentena na normalização
+        battles = list(read_chunk(path, start, end))
+        summary, approved = summarize_guild_battles(battles, guild_id)
+        summary = summary.drop(columns=['guild_fame'])
+        # Jogadores apenas das batalhas aprovadas (inclusive na verificação dos jogadores)
+        player_ids = {player_id for battle in approved
+                      for player_id in guild_player_ids(battle, guild_id)}
+    return summary, player_ids, len(battles)
+
+
+def bulk_ingest(paths, guild_id=PRIMARY_GUILD_ID, workers=None, chunk_bytes=CHUNK_BYTES):
+    """
+    Importa as batalhas dos arquivos para o histórico da guild (na região do
+    contexto atual) e coloca os jogadores da guild na fila de perfis.
+
+    workers: processos usados (None = um por núcleo; 1 = no próprio processo).
+
+    Returns:
+        DataFrame com as batalhas da guild encontradas nos arquivos.
+    """
+    started = time.monotonic()
+    chunks = plan_chunks(paths, chunk_bytes)
+    region = current_region()
+    tasks = [(path, start, end, guild_id, region) for path, start, end in chunks]
+    workers = min(workers or os.cpu_count() or 1, max(1, len(tasks)))
+    logging.info(f"Importando {len(paths)} arquivo(s) em {len(tasks)} bloco(s) com {workers} processo(s)")
+
+    frames = []
+    player_ids = set()
+    total = 0
+    # Com um único processo, os blocos são lidos aqui mesmo, sem o custo do pool
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        results = executor.map(_normalize_chunk, tasks) if executor else map(_normalize_chunk, tasks)
+        for summary, chunk_player_ids, count in results:
+            frames.append(summary)
+            player_ids.update(chunk_player_ids)
+            total += count
+    finally:
+        if executor:
+            executor.shutdown()
+    parsed = time.monotonic()
+
+    battles_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if not battles_df.empty:
+        battles_df = battles_df.drop_duplicates('battle_id', keep='last').reset_index(drop=True)
+        update_battle_history(battles_df, get_guild_history_file(guild_id))
+
+    if player_ids:
+        cache = get_profile_cache()
+        cache.queue(player_ids)
+        cache.flush()
+
+    logging.info(
+        f"Importação concluída: {total} batalhas lidas, {len(battles_df)} da guild {guild_id}; "
+        f"leitura e normalização em {parsed - started:.1f}s, "
+        f"gravação em {time.monotonic() - parsed:.1f}s")
+    return battles_df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importação em lote de arquivos de batalhas brutas")
+    parser.add_argument('paths', nargs='+', help="Arquivos .json (array), .jsonl ou .gz")
+    parser.add_argument('--guild-id', default=PRIMARY_GUILD_ID, help="Guild cujo histórico é atualizado")
+    parser.add_argument('--workers', type=int, default=None, help="Processos (padrão: um por núcleo)")
+    parser.add_argument('--chunk-mb', type=float, default=CHUNK_BYTES / (1024 * 1024),
+                        help="Tamanho dos blocos de arquivos JSON Lines, em MB")
+    parser.add_argument('--region', default=None, help="Região (americas, europe, asia)")
+    args = parser.parse_args()
+
+    with use_region(args.region):
+        battles_df = bulk_ingest(args.paths, args.guild_id, args.workers,
+                                 int(args.chunk_mb * 1024 * 1024))
+    print(f"{len(battles_df)} batalhas da guild importadas")
+
+
+if __name__ == "__main__":
+    main()
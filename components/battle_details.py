@@ -1,4 +1,5 @@
 import streamlit as st
+from collections.abc import Mapping
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
@@ -13,7 +14,7 @@ def show_battle_details(battle_data, guild_name, alliance_name):
     st.subheader(f"Batalha em {battle_time}")
     
     # Verificar se os detalhes da batalha contêm as informações necessárias
-    if 'details' not in battle_data or not isinstance(battle_data['details'], dict):
+    if 'details' not in battle_data or not isinstance(battle_data['details'], Mapping):
         st.error("Detalhes da batalha não encontrados ou em formato inválido")
         return
         
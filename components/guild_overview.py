@@ -4,6 +4,7 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from datetime import datetime, timedelta
+from battle_tables import guild_matcher, player_totals
 from utils import (
     create_kd_gauge,
     create_win_rate_gauge,
@@ -37,7 +38,6 @@ def show_guild_overview(battles_df, guild_name, alliance_name):
     total_deaths = 0
     total_fame = 0
     battles_won = 0
-    total_players = set()
     
     # Process each battle
     for _, battle in battles_df.iterrows():
@@ -49,9 +49,6 @@ def show_guild_overview(battles_df, guild_name, alliance_name):
         for guild, stats in details['guilds'].items():
             if guild_name.lower() in guild.lower():
                 guild_stats = stats
-                # Add players to the set
-                for player in stats['players']:
-                    total_players.add(player['name'])
             elif alliance_name and alliance_name.lower() in guild.lower():
                 # This is an alliance guild
                 pass
@@ -134,7 +131,8 @@ def show_guild_overview(battles_df, guild_name, alliance_name):
     total_kills_formatted = format_number(total_kills)
     total_deaths_formatted = format_number(total_deaths)
     total_fame_formatted = format_number(total_fame)
-    active_players = len(total_players)
+    # Members who fought in at least one of these battles
+    active_players = len(player_totals(battles_df['details'], guild_matcher(guild_name)))
     
     # Usando colunas do Streamlit para criar um layout de métricas mais confiável
     # Primeira linha
@@ -539,31 +537,7 @@ def show_guild_overview(battles_df, guild_name, alliance_name):
     """, unsafe_allow_html=True)
     
     # Process player data
-    players_data = {}
-    
-    for _, battle in battles_df.iterrows():
-        details = battle['details']
-        
-        for guild, stats in details['guilds'].items():
-            if guild_name.lower() in guild.lower():
-                for player in stats['players']:
-                    name = player['name']
-                    if name not in players_data:
-                        players_data[name] = {
-                            'kills': 0,
-                            'deaths': 0,
-                            'fame': 0,
-                            'battles': 0
-                        }
-                    
-                    players_data[name]['kills'] += player['kills']
-                    players_data[name]['deaths'] += player['deaths']
-                    players_data[name]['fame'] += player['fame']
-                    players_data[name]['battles'] += 1
-    
-    # Convert to DataFrame
-    players_df = pd.DataFrame.from_dict(players_data, orient='index')
-    players_df['name'] = players_df.index
+    players_df = player_totals(battles_df['details'], guild_matcher(guild_name))
     
     # Add KD ratio
     players_df['kd_ratio'] = players_df['kills'] / players_df['deaths'].replace(0, 1)
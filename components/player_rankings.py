@@ -2,6 +2,15 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from utils import create_player_chart
+from battle_tables import guild_matcher, player_totals
+from player_profiles import load_profiles
+
+@st.cache_data(ttl=300)
+def load_lifetime_stats():
+    """Lifetime player stats from the profiles fetched by the ingestion service"""
+    profiles = load_profiles().set_index('player_id')
+    return profiles[['kill_fame', 'fame_ratio']].rename(
+        columns={'kill_fame': 'lifetime_kill_fame', 'fame_ratio': 'lifetime_fame_ratio'})
 
 def show_player_rankings(battles_df, guild_name):
     """Display player rankings with various metrics"""
@@ -31,44 +40,21 @@ def show_player_rankings(battles_df, guild_name):
         return
     
     # Process player data from battles
-    players_data = {}
-    
-    for _, battle in battles_df.iterrows():
-        details = battle['details']
-        
-        for guild, stats in details['guilds'].items():
-            if guild_name.lower() in guild.lower():
-                for player in stats['players']:
-                    name = player['name']
-                    if name not in players_data:
-                        players_data[name] = {
-                            'name': name,
-                            'kills': 0,
-                            'deaths': 0,
-                            'fame': 0,
-                            'battles': 0,
-                            'avg_kills': 0,
-                            'avg_deaths': 0
-                        }
-                    
-                    players_data[name]['kills'] += player['kills']
-                    players_data[name]['deaths'] += player['deaths']
-                    players_data[name]['fame'] += player['fame']
-                    players_data[name]['battles'] += 1
+    players_df = player_totals(battles_df['details'], guild_matcher(guild_name))
     
     # Calculate derived metrics
-    for name, data in players_data.items():
-        battles = max(1, data['battles'])
-        data['avg_kills'] = data['kills'] / battles
-        data['avg_deaths'] = data['deaths'] / battles
-        data['kd_ratio'] = data['kills'] / max(1, data['deaths'])
-    
-    # Convert to DataFrame
-    players_df = pd.DataFrame(list(players_data.values()))
+    battles = players_df['battles'].clip(lower=1)
+    players_df['avg_kills'] = players_df['kills'] / battles
+    players_df['avg_deaths'] = players_df['deaths'] / battles
+    players_df['kd_ratio'] = players_df['kills'] / players_df['deaths'].clip(lower=1)
     
     if players_df.empty:
         st.warning("No player data available.")
         return
+
+    # Lifetime stats of each player whose profile has already been fetched
+    players_df = players_df.join(load_lifetime_stats(), on='player_id')
+    has_lifetime = players_df['lifetime_kill_fame'].notna().any()
     
     # Filters
     col1, col2 = st.columns(2)
@@ -110,7 +96,10 @@ def show_player_rankings(battles_df, guild_name):
     st.subheader("Detailed Player Statistics")
     
     # Format the DataFrame for display
-    display_df = filtered_players[['name', 'kills', 'deaths', 'kd_ratio', 'fame', 'battles', 'avg_kills', 'avg_deaths']].copy()
+    display_columns = ['name', 'kills', 'deaths', 'kd_ratio', 'fame', 'battles', 'avg_kills', 'avg_deaths']
+    if has_lifetime:
+        display_columns += ['lifetime_kill_fame', 'lifetime_fame_ratio']
+    display_df = filtered_players[display_columns].copy()
     
     # Format the columns
     display_df['kd_ratio'] = display_df['kd_ratio'].round(2)
@@ -127,7 +116,7 @@ def show_player_rankings(battles_df, guild_name):
         'Battles',
         'Avg Kills',
         'Avg Deaths'
-    ]
+    ] + (['Lifetime Kill Fame', 'Lifetime Fame Ratio'] if has_lifetime else [])
     
     # Display the table
     st.dataframe(
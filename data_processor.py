@@ -1,7 +1,8 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from battle_time import within_days, server_day
 from battle_history_manager import get_daily_stats as history_get_daily_stats
+from battle_tables import guild_matcher, guild_rows, guild_totals, matching_codes, player_totals
 
 def get_battles_with_min_members(battles_df, guild_name, min_members=20, days=7):
     """
@@ -12,29 +13,18 @@ def get_battles_with_min_members(battles_df, guild_name, min_members=20, days=7)
         return pd.DataFrame()
 
     # Filter by date
-    cutoff_date = datetime.now() - timedelta(days=days)
-    recent_battles = battles_df[battles_df['time'] >= cutoff_date].copy()
+    recent_battles = battles_df[within_days(battles_df['time'], days)].copy()
 
     if recent_battles.empty:
         return pd.DataFrame()
 
-    # Filter by guild member count
-    filtered_battles = []
+    # Filter by guild member count (first matching guild of each battle)
+    guilds = guild_rows(recent_battles['details'])
+    guilds = guilds[matching_codes(guilds['guild'], guild_matcher(guild_name))]
+    guilds = guilds.drop_duplicates('battle')
+    selected = guilds.loc[guilds['players'] >= min_members, 'battle']
 
-    for _, battle in recent_battles.iterrows():
-        details = battle['details']
-        guild_found = False
-
-        # Check each guild in the battle
-        for guild, stats in details['guilds'].items():
-            if guild_name.lower() in guild.lower():
-                guild_found = True
-                # Check if the guild has enough members
-                if len(stats['players']) >= min_members:
-                    filtered_battles.append(battle)
-                break
-
-    return pd.DataFrame(filtered_battles)
+    return recent_battles.iloc[selected.to_numpy()].reset_index(drop=True)
 
 def get_guild_stats(battles_df, guild_name, alliance_name=None):
     """Calculate overall statistics for a guild from battle data"""
@@ -46,7 +36,6 @@ def get_guild_stats(battles_df, guild_name, alliance_name=None):
     total_deaths = 0
     total_fame = 0
     battles_won = 0
-    players_data = {}
 
     for _, battle in battles_df.iterrows():
         details = battle['details']
@@ -57,21 +46,6 @@ def get_guild_stats(battles_df, guild_name, alliance_name=None):
         for guild, stats in details['guilds'].items():
             if guild_name.lower() in guild.lower():
                 guild_stats = stats
-                # Process player data
-                for player in stats['players']:
-                    name = player['name']
-                    if name not in players_data:
-                        players_data[name] = {
-                            'kills': 0,
-                            'deaths': 0,
-                            'fame': 0,
-                            'battles': 0
-                        }
-
-                    players_data[name]['kills'] += player['kills']
-                    players_data[name]['deaths'] += player['deaths']
-                    players_data[name]['fame'] += player['fame']
-                    players_data[name]['battles'] += 1
             elif alliance_name and alliance_name.lower() in guild.lower():
                 # This is an alliance guild
                 pass
@@ -93,6 +67,10 @@ def get_guild_stats(battles_df, guild_name, alliance_name=None):
             if guild_kd_ratio > enemy_kd_ratio:
                 battles_won += 1
 
+    # Per-player totals, keyed by name in the stats dict (first player of a repeated name)
+    players = player_totals(battles_df['details'], guild_matcher(guild_name))
+    players_data = players.drop_duplicates('name').set_index('name').to_dict('index')
+
     # Calculate win rate
     win_rate = (battles_won / total_battles) * 100 if total_battles > 0 else 0
 
@@ -117,8 +95,7 @@ def get_recent_battles(battles_df, days=7):
     if battles_df.empty:
         return pd.DataFrame()
 
-    cutoff_date = datetime.now() - timedelta(days=days)
-    recent_battles = battles_df[battles_df['time'] >= cutoff_date]
+    recent_battles = battles_df[within_days(battles_df['time'], days)]
 
     return recent_battles.sort_values('time', ascending=False).reset_index(drop=True)
 
@@ -139,31 +116,8 @@ def get_top_players(battles_df, guild_name, metric='kills', limit=3):
     if battles_df.empty:
         return []
 
-    players_data = {}
-
-    for _, battle in battles_df.iterrows():
-        details = battle['details']
-
-        for guild, stats in details['guilds'].items():
-            if guild_name.lower() in guild.lower():
-                for player in stats['players']:
-                    name = player['name']
-                    if name not in players_data:
-                        players_data[name] = {
-                            'name': name,
-                            'kills': 0,
-                            'deaths': 0,
-                            'fame': 0,
-                            'battles': 0
-                        }
-
-                    players_data[name]['kills'] += player['kills']
-                    players_data[name]['deaths'] += player['deaths']
-                    players_data[name]['fame'] += player['fame']
-                    players_data[name]['battles'] += 1
-
-    # Convert to DataFrame
-    players_df = pd.DataFrame.from_dict(players_data, orient='index')
+    # Totals of every guild member, ranked below by the metric
+    players_df = player_totals(battles_df['details'], guild_matcher(guild_name))
 
     # Calculate K/D ratio
     if not players_df.empty:
@@ -180,45 +134,34 @@ def get_daily_stats(battles_df, guild_name, days=7):
     if battles_df.empty:
         return pd.DataFrame()
 
-    from datetime import timezone
-    cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
-
-    # Converter datas para UTC se necessário
-    recent_battles = battles_df[battles_df['time'].dt.tz_convert('UTC') >= cutoff_date]
+    recent_battles = battles_df[within_days(battles_df['time'], days)]
 
     if recent_battles.empty:
         return pd.DataFrame()
 
-    # Criar coluna de data (apenas o dia)
-    recent_battles = recent_battles.copy()
-    recent_battles['date'] = recent_battles['time'].dt.date
+    # Criar coluna de data (o dia no horário do servidor) e de vitória (kills > deaths)
+    recent_battles = recent_battles.assign(
+        date=server_day(recent_battles['time']),
+        win=recent_battles['kills'] > recent_battles['deaths'])
 
     # Agrupar por dia
-    daily_stats = recent_battles.groupby('date').agg({
-        'battle_id': 'count',
-        'kills': 'sum',
-        'deaths': 'sum'
-    }).reset_index()
-
-    # Renomear a coluna battle_id para battles
-    daily_stats.rename(columns={'battle_id': 'battles'}, inplace=True)
+    daily_stats = recent_battles.groupby('date').agg(
+        battles=('battle_id', 'count'),
+        kills=('kills', 'sum'),
+        deaths=('deaths', 'sum'),
+        wins=('win', 'sum')
+    ).reset_index()
 
     # Calcular K/D ratio
     daily_stats['kd_ratio'] = daily_stats['kills'] / daily_stats['deaths'].replace(0, 1)
 
-    # Calcular vitórias (assumindo que kills > deaths é vitória)
-    daily_stats['wins'] = 0
-
-    for idx, row in daily_stats.iterrows():
-        date = row['date']
-        day_battles = recent_battles[recent_battles['date'] == date]
-        daily_stats.at[idx, 'wins'] = sum(day_battles['kills'] > day_battles['deaths'])
-
     # Calcular taxa de vitórias
     daily_stats['win_rate'] = (daily_stats['wins'] / daily_stats['battles']) * 100
 
     # Ordenar por data
     daily_stats = daily_stats.sort_values('date')
+    daily_stats['date'] = daily_stats['date'].dt.date
+    daily_stats = daily_stats[['date', 'battles', 'kills', 'deaths', 'kd_ratio', 'wins', 'win_rate']]
 
     return daily_stats
 
@@ -227,35 +170,14 @@ def get_enemy_guilds(battles_df, guild_name, alliance_name=None):
     if battles_df.empty:
         return {}
 
-    enemy_guilds = {}
+    # Skip our guild and alliance
+    is_ours = guild_matcher(guild_name)
+    is_ally = guild_matcher(alliance_name) if alliance_name else lambda guild: False
 
-    for _, battle in battles_df.iterrows():
-        details = battle['details']
-
-        for guild, stats in details['guilds'].items():
-            # Skip our guild and alliance
-            if guild_name.lower() in guild.lower():
-                continue
-            if alliance_name and alliance_name.lower() in guild.lower():
-                continue
-
-            if guild not in enemy_guilds:
-                enemy_guilds[guild] = {
-                    'name': guild,
-                    'kills': 0,
-                    'deaths': 0,
-                    'fame': 0,
-                    'battles': 0,
-                    'kd_ratio': 0
-                }
-
-            enemy_guilds[guild]['kills'] += stats['total_kills']
-            enemy_guilds[guild]['deaths'] += stats['total_deaths']
-            enemy_guilds[guild]['fame'] += stats['total_fame']
-            enemy_guilds[guild]['battles'] += 1
+    # Totals of each enemy guild over all battles
+    enemies = guild_totals(battles_df['details'], lambda guild: not is_ours(guild) and not is_ally(guild))
 
     # Calculate K/D ratio for each enemy guild
-    for guild in enemy_guilds:
-        enemy_guilds[guild]['kd_ratio'] = enemy_guilds[guild]['kills'] / max(1, enemy_guilds[guild]['deaths'])
+    enemies['kd_ratio'] = enemies['kills'] / enemies['deaths'].clip(lower=1)
 
-    return enemy_guilds
\ No newline at end of file
+    return {enemy['name']: enemy for enemy in enemies.to_dict('records')}
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""
+Pedidos de detalhes de batalha feitos pelo app e atendidos pelo serviço de ingestão.
+
+O app não acessa a API gameinfo (ver ingestion_daemon). Quando o usuário abre
+uma batalha, request_battle_details grava um pedido em detail_requests/ e
+aguarda a resposta. O serviço de ingestão verifica os pedidos a cada
+POLL_INTERVAL (DetailRequestServer) e busca as batalhas com prioridade
+interativa no seu limitador de taxa, passando na frente das atualizações
+agendadas e do backfill que ele estiver fazendo.
+
+Pedidos e respostas são arquivos JSON por batalha, gravados de forma atômica
+no diretório da região (ver regions.region_path).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from regions import REGIONS, current_region, region_path, use_region, validate_region
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Constantes
+REQUESTS_DIR = "detail_requests"  # Pedidos e respostas, por região
+POLL_INTERVAL = 0.1  # Intervalo (segundos) entre verificações de pedidos e de respostas
+APP_WAIT = 8  # Segundos que o app espera pela resposta (orçamento da busca + verificação)
+REQUEST_TTL = 60  # Pedidos mais antigos (ex.: gravados com o serviço parado) são descartados
+RESULT_TTL = 300  # Respostas mais antigas são apagadas pelo serviço
+PRUNE_INTERVAL = 60  # Intervalo (segundos) entre limpezas das respostas antigas
+SERVER_WORKERS = 4  # Pedidos atendidos ao mesmo tempo
+
+_REQUEST_SUFFIX = ".request.json"
+_CLAIMED_SUFFIX = ".claimed.json"
+
+
+def _request_path(directory, battle_id):
+    return os.path.join(directory, f"{battle_id}{_REQUEST_SUFFIX}")
+
+
+def _result_path(directory, battle_id):
+    return os.path.join(directory, f"{battle_id}.json")
+
+
+def _battle_key(battle_id):
+    """
+    ID da batalha como texto (também usado no nome dos arquivos); ValueError se inválido.
+    """
+    battle_id = str(battle_id).strip()
+    if not battle_id.isdigit():
+        raise ValueError(f"ID de batalha inválido: {battle_id!r}")
+    return battle_id
+
+
+def _json_default(obj):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
+
+
+def _write_json(path, data):
+    """
+    Grava o arquivo de forma atômica para que o outro processo nunca veja um arquivo incompleto.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, default=_json_default)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def request_battle_details(battle_id, guild_name, region=None, wait=APP_WAIT):
+    """
+    Pede ao serviço de ingestão os detalhes completos (todas as guilds) de uma
+    batalha e aguarda a resposta (usado pelo app).
+
+    Retorna o mesmo formato de api_scraper.process_battle_details, ou None se
+    a batalha não puder ser obtida ou o serviço não responder em 'wait' segundos.
+    """
+    battle_id = _battle_key(battle_id)
+    directory = region_path(REQUESTS_DIR, validate_region(region or current_region()))
+    os.makedirs(directory, exist_ok=True)
+
+    requested_at = time.time()
+    _write_json(_request_path(directory, battle_id),
+                {'battle_id': battle_id, 'guild_name': guild_name, 'requested_at': requested_at})
+
+    deadline = time.monotonic() + wait
+    while True:
+        # Vale uma resposta a este pedido ou a um pedido posterior (de outra instância do app)
+        result = _read_json(_result_path(directory, battle_id))
+        if result is not None and result.get('requested_at', 0) >= requested_at:
+            details = result.get('details')
+            if details and details.get('time'):
+                details['time'] = datetime.fromisoformat(details['time'])
+            return details
+        if time.monotonic() >= deadline:
+            logging.warning(f"Serviço de ingestão não respondeu ao pedido da batalha {battle_id}")
+            return None
+        time.sleep(POLL_INTERVAL)
+
+
+class DetailRequestServer:
+    """
+    Atende os pedidos de detalhes do app dentro do serviço de ingestão, em uma
+    thread de fundo, com prioridade interativa no limitador de cada região.
+    """
+
+    def __init__(self, regions=tuple(REGIONS), poll_interval=POLL_INTERVAL,
+                 max_workers=SERVER_WORKERS):
+        self.regions = [validate_region(region) for region in regions]
+        self.poll_interval = poll_interval
+        self.max_workers = max_workers
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+        self._last_prune = 0.0
+
+    def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix="detail-request")
+        self._thread = threading.Thread(target=self._run, name="detail-requests", daemon=True)
+        self._thread.start()
+        logging.info("Atendendo pedidos de detalhes de batalha do app")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            for region in self.regions:
+                try:
+                    self.poll(region)
+                except Exception as e:
+                    logging.error(f"[{region}] Erro ao verificar pedidos de detalhes: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def poll(self, region):
+        """
+        Encaminha os pedidos pendentes da região para o pool. Retorna quantos foram aceitos.
+        """
+        directory = region_path(REQUESTS_DIR, region)
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return 0
+
+        now = time.time()
+        if time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+            self._last_prune = time.monotonic()
+            self._prune(directory, names, now)
+
+        accepted = 0
+        for name in names:
+            if not name.endswith(_REQUEST_SUFFIX):
+                continue
+            # Renomear antes de ler: um pedido gravado depois disso fica para a próxima verificação
+            path = os.path.join(directory, name)
+            claimed = path[:-len(_REQUEST_SUFFIX)] + _CLAIMED_SUFFIX
+            try:
+                os.replace(path, claimed)
+            except FileNotFoundError:
+                continue
+            request = _read_json(claimed)
+            os.remove(claimed)
+            if not request or now - request.get('requested_at', 0) > REQUEST_TTL:
+                continue
+            self._executor.submit(self._serve, region, directory, request)
+            accepted += 1
+        return accepted
+
+    def _serve(self, region, directory, request):
+        # Importado aqui para que o app possa pedir detalhes sem carregar o cliente da API
+        from api_scraper import fetch_battle_details
+
+        battle_id = _battle_key(request['battle_id'])
+        try:
+            with use_region(region):
+                details = fetch_battle_details(battle_id, request.get('guild_name'))
+        except Exception as e:
+            logging.error(f"[{region}] Erro ao buscar detalhes da batalha {battle_id}: {e}")
+            details = None
+        _write_json(_result_path(directory, battle_id),
+                    {'requested_at': request['requested_at'], 'completed_at': time.time(),
+                     'details': details})
+
+    def _prune(self, directory, names, now):
+        for name in names:
+            if name.endswith(_REQUEST_SUFFIX) or not name.endswith('.json'):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                if now - os.path.getmtime(path) > RESULT_TTL:
+                    os.remove(path)
+            except OSError:
+                pass
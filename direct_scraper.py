@@ -1,86 +1,102 @@
-import requests
 import pandas as pd
-from datetime import datetime
 import logging
 import json
+import os
+import requests
+from gameinfo_client import get_client
+from regions import DEFAULT_REGION
+from battle_normalizer import normalize_battles, guild_battle_summary
+from battle_tables import battle_fields, details_views
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-BATTLES_URL = "https://gameinfo.albiononline.com/api/gameinfo/battles?range=week&offset=0&limit=51&sort=totalfame&guildId=gUFLG-kcRFC1iOJDdwW2BQ"
 GUILD_NAME = "We Profit"
 GUILD_ID = "gUFLG-kcRFC1iOJDdwW2BQ"
+DATA_FILE = "data.json"
+BATTLES_PARAMS = {'range': 'week', 'offset': 0, 'limit': 51, 'sort': 'totalfame', 'guildId': GUILD_ID}
+
+def fetch_battles():
+    """Busca a listagem de batalhas da guild pelo cliente gameinfo compartilhado"""
+    # A listagem usada pelo app é sempre a da guild principal, na região padrão
+    response = get_client(DEFAULT_REGION).get('battles', '/battles', params=BATTLES_PARAMS)
+    response.raise_for_status()
+    return response.json()
+
+def save_local_data(battles):
+    """Grava a listagem bruta em data.json de forma atômica (leitores nunca veem o arquivo pela metade)"""
+    tmp_path = f"{DATA_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(battles, f)
+    os.replace(tmp_path, DATA_FILE)
+
+def refresh_local_data():
+    """Busca a listagem na API e atualiza data.json; retorna as batalhas brutas"""
+    battles = fetch_battles()
+    save_local_data(battles)
+    logging.info(f"Arquivo {DATA_FILE} atualizado com {len(battles)} batalhas")
+    return battles
+
+def load_battle_data():
+    """
+    Lê e processa as batalhas salvas em data.json, sem acessar a API.
+    Usado pelo app, que apenas consome o que o ingestion_daemon grava.
+    """
+    try:
+        with open(DATA_FILE, 'r') as f:
+            response = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Não foi possível ler {DATA_FILE}: {e}")
+        return pd.DataFrame()
+    return process_battles(response)
 
 def get_battle_data(force_refresh=False):
     try:
         if not force_refresh:
             try:
-                with open('data.json', 'r') as f:
+                with open(DATA_FILE, 'r') as f:
                     response = json.load(f)
                 logging.info("Dados carregados do arquivo local")
             except:
                 logging.info("Arquivo local não encontrado, buscando da API")
-                response = requests.get(BATTLES_URL).json()
-                with open('data.json', 'w') as f:
-                    json.dump(response, f)
+                response = refresh_local_data()
         else:
-            response = requests.get(BATTLES_URL).json()
-            with open('data.json', 'w') as f:
-                json.dump(response, f)
-
-        processed_battles = []
-
-        for battle in response:
             try:
-                guild_players = []
-                guild_kills = 0
-                guild_deaths = 0
-                guild_fame = 0
+                response = refresh_local_data()
+            except requests.exceptions.RequestException as e:
+                # API fora do ar: mostrar os últimos dados salvos em vez de nada
+                logging.warning(f"API indisponível ({e}), usando dados do arquivo local")
+                with open(DATA_FILE, 'r') as f:
+                    response = json.load(f)
+
+        return process_battles(response)
 
-                # Processar jogadores
-                for player_id, player_data in battle.get('players', {}).items():
-                    if player_data.get('guildId') == GUILD_ID:
-                        guild_players.append({
-                            'name': player_data.get('name'),
-                            'kills': player_data.get('kills', 0),
-                            'deaths': player_data.get('deaths', 0),
-                            'fame': player_data.get('killFame', 0)
-                        })
-                        guild_kills += player_data.get('kills', 0)
-                        guild_deaths += player_data.get('deaths', 0)
-                        guild_fame += player_data.get('killFame', 0)
+    except Exception as e:
+        logging.error(f"Erro ao processar dados: {str(e)}")
+        return pd.DataFrame()
 
-                if guild_players:  # Só adicionar batalhas com jogadores da guild
-                    battle_id = battle.get('id')
-                    battle_time = datetime.fromisoformat(battle.get('startTime').replace('Z', '+00:00'))
-                    # Structure battle data with guilds information
-                    battle_details = {
-                        'battle_id': battle_id,
-                        'time': battle_time,
-                        'players': len(guild_players),
-                        'kills': guild_kills,
-                        'deaths': guild_deaths,
-                        'fame': guild_fame,
-                        'details': {
-                            'id': battle_id,
-                            'time': battle_time,
-                            'guilds': {
-                                'We Profit': {
-                                    'players': guild_players,
-                                    'total_kills': guild_kills,
-                                    'total_deaths': guild_deaths,
-                                    'total_fame': guild_fame
-                                }
-                            },
-                            'totalKills': battle.get('totalKills'),
-                            'totalFame': battle.get('totalFame')
-                        }
-                    }
-                    processed_battles.append(battle_details)
-            except Exception as e:
-                logging.error(f"Erro ao processar batalha {battle.get('id')}: {str(e)}")
-                continue
+def process_battles(response):
+    """Converte a listagem bruta de batalhas no DataFrame usado pelo app"""
+    try:
+        # Só batalhas com jogadores da guild; em 'details', apenas a própria guild
+        battles, players = normalize_battles(response)
+        summary = guild_battle_summary(battles, players, GUILD_ID)
+        # Detalhes compactos (battle_tables): nomes codificados, jogadores montados sob demanda
+        fields = battle_fields(battles)
+        for battle, total_kills, total_fame in zip(fields, battles['total_kills'].tolist(),
+                                                   battles['total_fame'].tolist()):
+            battle['totalKills'] = total_kills
+            battle['totalFame'] = total_fame
+        details = details_views(battles, players, guild_ids=[GUILD_ID], fields=fields)
 
-        battles_df = pd.DataFrame(processed_battles)
+        battles_df = pd.DataFrame({
+            'battle_id': summary['battle_id'],
+            'time': summary['time'],
+            'players': summary['players'],
+            'kills': summary['kills'],
+            'deaths': summary['deaths'],
+            'fame': summary['guild_fame'],
+            'details': summary['battle_id'].map(details)
+        })
         logging.info(f"Processadas {len(battles_df)} batalhas")
         return battles_df
 
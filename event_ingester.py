@@ -0,0 +1,352 @@
+"""
+Ingestão incremental dos eventos de kill (/events) de uma guild.
+
+A listagem de eventos vem das mais recentes para as mais antigas e os
+EventIds crescem com o tempo. Cada execução percorre as páginas até chegar
+ao maior EventId já gravado (o cursor) e grava só os eventos novos, página a
+página, com memória constante: os eventos são lidos em streaming e nenhum
+conjunto de IDs vistos é mantido.
+
+Dentro de uma execução os eventos são aceitos em ordem estritamente
+decrescente de EventId. Eventos novos que chegam durante a execução apenas
+empurram os demais para offsets maiores, gerando repetições que essa regra
+descarta. O checkpoint gravado após cada página (offset e menor EventId
+gravado) permite retomar uma execução interrompida. Se a execução cair entre
+a gravação de uma página e o checkpoint, a página é gravada de novo ao
+retomar; iter_events descarta esses EventIds repetidos na leitura.
+
+Os eventos são guardados de forma compacta (sem o equipamento) em arquivos
+JSON Lines compactados, um por dia, com o battle_id para cruzar com o
+histórico de batalhas.
+
+Uso:
+    python event_ingester.py --guild-id gUFLG-kcRFC1iOJDdwW2BQ
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import requests
+
+from battle_time import parse_time, parse_times
+from gameinfo_client import get_client
+from regions import REGIONS, region_path, use_region
+from json_stream import iter_response_items
+from rate_limiter import wait_before_retry
+from resilience import CircuitOpenError, Deadline
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Constantes
+EVENTS_DIR = "events"  # Eventos e cursores, um subdiretório por guild
+EVENTS_PAGE_LIMIT = 51  # Máximo aceito pela API por página
+EVENTS_MAX_PAGES = 200  # Limite de segurança de páginas por execução
+EVENTS_MAX_OFFSET = 10000  # Limite de segurança para o offset da listagem
+FIRST_RUN_DAYS = 1  # Período buscado na primeira execução de uma guild
+EVENTS_BUDGET = 120  # Tempo máximo (segundos) de uma execução
+
+
+def _guild_dir(guild_id):
+    return os.path.join(region_path(EVENTS_DIR), guild_id)
+
+
+def _cursor_path(guild_id):
+    return os.path.join(_guild_dir(guild_id), "cursor.json")
+
+
+def _compact_player(player):
+    player = player or {}
+    return [
+        player.get('Id'),
+        player.get('Name'),
+        player.get('GuildId') or None,
+        player.get('AllianceId') or None,
+        round(player.get('AverageItemPower') or 0)
+    ]
+
+
+def compact_event(event):
+    """
+    Reduz um evento da API aos campos usados nas análises (sem equipamento nem inventário).
+    Jogadores ficam como listas [id, nome, guild_id, alliance_id, item_power] e
+    participantes como [id, nome, guild_id, dano, cura].
+    """
+    battle_id = event.get('BattleId')
+    return {
+        'id': event['EventId'],
+        'ts': event.get('TimeStamp'),
+        # Kills fora de batalhas registradas usam o próprio EventId como BattleId
+        'battle_id': battle_id if battle_id and battle_id != event['EventId'] else None,
+        'fame': event.get('TotalVictimKillFame', 0),
+        'killer': _compact_player(event.get('Killer')),
+        'victim': _compact_player(event.get('Victim')),
+        'group': event.get('groupMemberCount') or len(event.get('GroupMembers') or []),
+        'participants': [
+            [p.get('Id'), p.get('Name'), p.get('GuildId') or None,
+             round(p.get('DamageDone') or 0), round(p.get('SupportHealingDone') or 0)]
+            for p in event.get('Participants') or []
+        ]
+    }
+
+
+class EventCursor:
+    """
+    Cursor persistente da ingestão de eventos de uma guild.
+
+    high_water: maior EventId já gravado por completo (execuções anteriores).
+    run: estado da execução em andamento (None se não houver), com o maior
+    EventId visto na execução ('top'), o menor gravado ('bottom') e o offset
+    da próxima página.
+    """
+
+    def __init__(self, guild_id):
+        self.guild_id = guild_id
+        self.path = _cursor_path(guild_id)
+        self.high_water = None
+        self.run = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                self.high_water = state.get('high_water')
+                self.run = state.get('run')
+            except (OSError, ValueError) as e:
+                logging.warning(f"Cursor de eventos inválido {self.path}, recomeçando: {e}")
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'guild_id': self.guild_id, 'high_water': self.high_water, 'run': self.run}, f)
+        os.replace(tmp_path, self.path)
+
+
+def _append_events(guild_id, events):
+    """
+    Acrescenta eventos compactos aos arquivos diários da guild.
+    Cada gravação adiciona um novo membro gzip ao arquivo, sem reescrever o que já existe.
+    """
+    by_day = {}
+    for event in events:
+        by_day.setdefault(event['ts'][:10].replace('-', ''), []).append(event)
+
+    os.makedirs(_guild_dir(guild_id), exist_ok=True)
+    for day, day_events in by_day.items():
+        path = os.path.join(_guild_dir(guild_id), f"events_{day}.jsonl.gz")
+        with gzip.open(path, 'at', encoding='utf-8') as f:
+            for event in day_events:
+                f.write(json.dumps(event, separators=(',', ':')) + '\n')
+
+
+def _fetch_events_page(guild_id, offset, limit, max_attempts, delay, deadline):
+    """
+    Busca uma página de eventos da guild em streaming.
+    Retorna um gerador de eventos brutos, ou None se todas as tentativas falharem.
+    """
+    client = get_client()
+    params = {'guildId': guild_id, 'offset': offset, 'limit': limit}
+
+    for attempt in range(max_attempts):
+        if deadline.expired():
+            return None
+        try:
+            timeout = deadline.cap_timeout(client.timeouts.get('events', client.timeouts['default']))
+            # Eventos mudam a todo momento: não usar o cache HTTP
+            response = client.get('events', '/events', params=params, timeout=timeout,
+                                  use_cache=False, stream=True, deadline=deadline.expires_at)
+            response.raise_for_status()
+            return iter_response_items(response)
+        except CircuitOpenError as e:
+            logging.warning(f"Busca de eventos cancelada: {e}")
+            return None
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Erro ao buscar eventos (offset {offset}): {e}")
+            if attempt < max_attempts - 1:
+                wait_before_retry(attempt, delay, deadline.expires_at)
+
+    return None
+
+
+def ingest_guild_events(guild_id, budget=EVENTS_BUDGET, first_run_days=FIRST_RUN_DAYS,
+                        max_pages=EVENTS_MAX_PAGES, max_attempts=3, delay=1):
+    """
+    Busca os eventos de kill novos de uma guild e grava-os em disco.
+
+    Returns:
+        Número de eventos novos gravados nesta execução
+    """
+    deadline = Deadline(budget)
+    cursor = EventCursor(guild_id)
+    floor = cursor.high_water
+    cutoff = None
+    if floor is None:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=first_run_days)
+
+    run = cursor.run or {'top': None, 'bottom': None, 'offset': 0}
+    if cursor.run:
+        logging.info(f"Retomando ingestão de eventos da guild {guild_id} no offset {run['offset']}")
+
+    written = 0
+    finished = False
+    stop_reason = f"limite de {max_pages} páginas"
+
+    for _ in range(max_pages):
+        if deadline.expired():
+            stop_reason = "orçamento de tempo esgotado"
+            break
+        if run['offset'] >= EVENTS_MAX_OFFSET:
+            stop_reason = "limite de offset da API"
+            finished = True
+            break
+
+        events_data = _fetch_events_page(guild_id, run['offset'], EVENTS_PAGE_LIMIT,
+                                         max_attempts, delay, deadline)
+        if events_data is None:
+            stop_reason = "falha ao obter a página"
+            break
+
+        page_events = []
+        received = 0
+        reached_floor = False
+        try:
+            for event in events_data:
+                if not isinstance(event, dict) or 'EventId' not in event:
+                    raise ValueError(f"Evento em formato inesperado: {type(event)}")
+                received += 1
+                event_id = event['EventId']
+
+                if run['top'] is None:
+                    # Primeiro evento da execução: o mais recente
+                    run['top'] = event_id
+                if floor is not None and event_id <= floor:
+                    reached_floor = True
+                    break
+                if cutoff is not None and parse_time(event['TimeStamp']) < cutoff:
+                    reached_floor = True
+                    break
+                # Ordem estritamente decrescente: repetições causadas por eventos novos são descartadas
+                if run['bottom'] is not None and event_id >= run['bottom']:
+                    continue
+                page_events.append(compact_event(event))
+                run['bottom'] = event_id
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logging.error(f"Erro ao ler eventos (offset {run['offset']}): {e}")
+            stop_reason = "falha ao ler a página"
+            break
+        finally:
+            events_data.close()
+
+        # Gravar os eventos antes de avançar o checkpoint (repetições de uma
+        # página regravada após uma queda são descartadas em iter_events)
+        if page_events:
+            _append_events(guild_id, page_events)
+            written += len(page_events)
+        run['offset'] += received
+        cursor.run = run
+        cursor.save()
+
+        if reached_floor:
+            stop_reason = "eventos já gravados"
+            finished = True
+            break
+        if received < EVENTS_PAGE_LIMIT:
+            stop_reason = "fim da listagem"
+            finished = True
+            break
+
+    if finished:
+        # Execução completa: o topo desta execução vira o novo cursor
+        if run['top'] is not None:
+            cursor.high_water = max(run['top'], floor or run['top'])
+        cursor.run = None
+        cursor.save()
+
+    logging.info(
+        f"Eventos da guild {guild_id}: {written} novos gravados "
+        f"(parada: {stop_reason}, cursor {cursor.high_water})")
+    return written
+
+
+def iter_events(guild_id, since=None):
+    """
+    Gera os eventos compactos gravados de uma guild, arquivo por arquivo (dia a dia).
+    since: datetime UTC; dias anteriores não são lidos.
+
+    Cada EventId é gerado uma única vez: uma página gravada de novo após uma
+    execução interrompida fica no mesmo arquivo diário, então basta lembrar os
+    IDs de um dia por vez.
+    """
+    since_day = since.strftime('%Y%m%d') if since else None
+    for path in sorted(glob.glob(os.path.join(_guild_dir(guild_id), "events_*.jsonl.gz"))):
+        day = os.path.basename(path)[len("events_"):-len(".jsonl.gz")]
+        if since_day and day < since_day:
+            continue
+        seen = set()
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if event['id'] in seen:
+                    continue
+                seen.add(event['id'])
+                yield event
+
+
+def load_events(guild_id, since=None, battle_ids=None):
+    """
+    Carrega os eventos de uma guild em um DataFrame (uma linha por kill).
+
+    battle_ids: se informado, mantém só os eventos dessas batalhas
+        (ex.: battle_history_manager.get_known_battle_ids()).
+    """
+    battle_ids = {str(battle_id) for battle_id in battle_ids} if battle_ids is not None else None
+    rows = []
+    for event in iter_events(guild_id, since):
+        if battle_ids is not None and str(event['battle_id']) not in battle_ids:
+            continue
+        killer, victim = event['killer'], event['victim']
+        rows.append({
+            'event_id': event['id'],
+            'time': event['ts'],
+            'battle_id': event['battle_id'],
+            'fame': event['fame'],
+            'killer_name': killer[1],
+            'killer_guild_id': killer[2],
+            'killer_ip': killer[4],
+            'victim_name': victim[1],
+            'victim_guild_id': victim[2],
+            'victim_ip': victim[4],
+            'participants': len(event['participants']),
+            'group': event['group']
+        })
+
+    events_df = pd.DataFrame(rows)
+    if not events_df.empty:
+        events_df['time'] = parse_times(events_df['time'])
+    return events_df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestão incremental dos eventos de kill de uma guild")
+    parser.add_argument('--guild-id', required=True, help="ID da guild")
+    parser.add_argument('--budget', type=float, default=EVENTS_BUDGET, help="tempo máximo (segundos)")
+    parser.add_argument('--first-run-days', type=int, default=FIRST_RUN_DAYS,
+                        help="período buscado na primeira execução")
+    parser.add_argument('--region', choices=list(REGIONS), default=None, help="servidor da guild")
+    args = parser.parse_args()
+
+    with use_region(args.region):
+        written = ingest_guild_events(args.guild_id, args.budget, args.first_run_days)
+    print(f"Eventos novos: {written}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""
+Cliente HTTP compartilhado para a API gameinfo do Albion Online.
+Mantém uma única sessão com pool de conexões keep-alive, headers padrão e
+timeouts por endpoint, reaproveitada entre execuções do agendador.
+As respostas passam pelo cache em disco de response_cache e as requisições
+de rede pelo limitador de taxa compartilhado de rate_limiter e pelo circuit
+breaker de resilience, que recusa chamadas enquanto a API está fora do ar.
+Cada região (ver regions) tem seu próprio cliente, limitador e circuit breaker.
+Chamadas idempotentes lentas são duplicadas conforme a política de hedging.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import requests
+from requests.adapters import HTTPAdapter
+from response_cache import ResponseCache, CachingRaw
+from rate_limiter import get_limiter, current_priority
+from resilience import CircuitOpenError, DeadlineExceeded, get_breaker
+from hedging import HedgePolicy
+from regions import DEFAULT_REGION, current_region, region_base_url, validate_region
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Constantes
+# URL da região padrão; pode ser substituída pela variável de ambiente GAMEINFO_BASE_URL
+# (ex.: gameinfo_stub_server). As demais regiões estão em regions.REGIONS
+GAMEINFO_BASE_URL = region_base_url(DEFAULT_REGION)
+
+# Headers enviados em todas as requisições (simulando um navegador)
+DEFAULT_HEADERS = {
+    'User-Agent':
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'application/json',
+    'Accept-Language': 'pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7',
+    'Referer': 'https://albiononline.com/',
+    'Connection': 'keep-alive'
+}
+
+# Timeouts (conexão, leitura) em segundos para cada tipo de endpoint
+ENDPOINT_TIMEOUTS = {
+    'search': (5, 10),    # Busca de guilds por nome
+    'battles': (5, 30),   # Listagem de batalhas de uma guild
+    'battle': (5, 30),    # Detalhes de uma batalha específica
+    'events': (5, 30),    # Eventos de kill de uma guild
+    'player': (5, 15),    # Perfil de um jogador (player_profiles)
+    'default': (5, 30)
+}
+
+# Tamanho do pool de conexões (deve cobrir o número de buscas simultâneas)
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+
+# Endpoints cujas chamadas lentas são duplicadas (só GETs idempotentes e sem streaming)
+HEDGED_ENDPOINTS = ('battle', 'search')
+HEDGE_WORKERS = 2 * POOL_MAXSIZE  # Threads para requisições originais e cópias em andamento
+
+
+def _close_response(future):
+    """
+    Descarta a resposta da requisição que perdeu a corrida.
+    """
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class GameinfoClient:
+    """
+    Cliente da API gameinfo com uma requests.Session persistente.
+    Todas as chamadas passam por get(), que aplica headers e timeouts padrão.
+    """
+
+    def __init__(self, base_url=GAMEINFO_BASE_URL, headers=None, timeouts=None,
+                 pool_maxsize=POOL_MAXSIZE, cache=None, limiter=None, breaker=None,
+                 hedging=None, hedged_endpoints=HEDGED_ENDPOINTS):
+        self.base_url = base_url.rstrip('/')
+        self.cache = cache
+        self.limiter = limiter
+        self.breaker = breaker
+        self.hedging = hedging
+        self.hedged_endpoints = tuple(hedged_endpoints)
+        self.headers = dict(DEFAULT_HEADERS if headers is None else headers)
+        self.timeouts = dict(ENDPOINT_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        self.pool_maxsize = pool_maxsize
+        self._session = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """
+        Sessão HTTP criada sob demanda e mantida viva entre chamadas.
+        """
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    session.headers.update(self.headers)
+                    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS,
+                                          pool_maxsize=self.pool_maxsize)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+
+    def url(self, path):
+        """
+        Monta a URL completa de um caminho relativo da API (ex.: '/battles/123')
+        """
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def get(self, endpoint, path, params=None, timeout=None, headers=None, use_cache=True,
+            stream=False, hedge=None, priority=None, deadline=None):
+        """
+        Faz uma requisição GET para a API.
+
+        Respostas ainda válidas no cache são devolvidas sem acessar a rede
+        (com o atributo from_cache=True). Respostas vencidas com ETag ou
+        Last-Modified são revalidadas com uma requisição condicional.
+
+        Args:
+            endpoint: tipo de endpoint ('search', 'battles', 'battle'), usado para timeout e validade do cache
+            path: caminho relativo à URL base da API
+            params: parâmetros de query string
+            timeout: timeout específico desta chamada (substitui o padrão do endpoint)
+            headers: headers adicionais desta chamada
+            use_cache: False para ignorar o cache nesta chamada
+            stream: True para ler o corpo sob demanda (ver json_stream.iter_response_items);
+                o corpo só é gravado no cache se for lido até o fim
+            hedge: duplicar a requisição se ela passar do p90 do endpoint; por padrão
+                só para os endpoints de hedged_endpoints (nunca com stream=True)
+            priority: prioridade no limitador de taxa (rate_limiter.PRIORITY_*); por
+                padrão a do contexto atual (ver rate_limiter.fetch_priority)
+            deadline: instante limite (time.monotonic()) da operação; a espera por um
+                token no limitador de taxa não passa dele (gera DeadlineExceeded)
+
+        Com o circuito aberto, a chamada falha na hora com CircuitOpenError,
+        a menos que exista uma cópia vencida no cache: nesse caso ela é
+        devolvida (com o atributo stale=True).
+
+        Returns:
+            requests.Response (exceções de rede do requests são propagadas)
+        """
+        if timeout is None:
+            timeout = self.timeouts.get(endpoint, self.timeouts['default'])
+
+        url = self.url(path)
+        if priority is None:
+            priority = current_priority()
+        if hedge is None:
+            hedge = endpoint in self.hedged_endpoints
+        hedge = hedge and not stream and self.hedging is not None
+        if self.cache is None or not use_cache:
+            return self._request(endpoint, url, params, timeout, headers, stream, hedge, priority,
+                                 deadline)
+
+        key, full_url = self.cache.make_key(url, params)
+        entry = self.cache.load(key)
+        if self.cache.is_fresh(entry):
+            logging.debug(f"Cache HTTP válido para {full_url}")
+            return self.cache.to_response(entry)
+
+        request_headers = dict(headers or {})
+        request_headers.update(self.cache.conditional_headers(entry))
+
+        try:
+            response = self._request(endpoint, url, params, timeout, request_headers or None,
+                                     stream, hedge, priority, deadline)
+        except CircuitOpenError:
+            if entry is None:
+                raise
+            logging.info(f"API indisponível, usando cópia vencida do cache para {full_url}")
+            response = self.cache.to_response(entry)
+            response.stale = True
+            return response
+
+        if response.status_code == 304 and entry is not None:
+            logging.debug(f"Cache HTTP revalidado para {full_url}")
+            response.close()
+            entry = self.cache.touch(key, entry, endpoint, response)
+            return self.cache.to_response(entry)
+
+        if response.status_code == 200:
+            try:
+                if stream:
+                    # Gravar no cache conforme o corpo for lido
+                    writer = self.cache.begin_stream(key, full_url, endpoint, response)
+                    response.raw = CachingRaw(response.raw, writer)
+                else:
+                    self.cache.store(key, full_url, endpoint, response)
+            except Exception as e:
+                logging.error(f"Erro ao salvar resposta no cache: {e}")
+
+        return response
+
+    def _request(self, endpoint, url, params, timeout, headers, stream, hedge, priority, deadline):
+        if hedge:
+            return self._send_hedged(endpoint, url, params, timeout, headers, priority, deadline)
+        return self._send(url, params, timeout, headers, stream, endpoint, priority, deadline)
+
+    def _hedge_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS,
+                                                        thread_name_prefix="gameinfo-hedge")
+        return self._executor
+
+    def _send_hedged(self, endpoint, url, params, timeout, headers, priority, deadline=None):
+        """
+        Envia a requisição e, se ela demorar mais que o p90 recente do endpoint,
+        dispara uma cópia (dentro do limite de carga extra); vale a primeira
+        resposta bem-sucedida. O tempo conta a partir do envio da original: a
+        espera por um token no limitador de taxa não dispara cópias.
+        """
+        policy = self.hedging
+        delay = policy.hedge_delay(endpoint)
+        policy.budget.on_request()
+        if delay is None:
+            # Ainda sem amostras suficientes para estimar o p90
+            return self._send(url, params, timeout, headers, False, endpoint, priority, deadline)
+
+        executor = self._hedge_executor()
+        sent = threading.Event()
+        primary = executor.submit(self._send, url, params, timeout, headers, False, endpoint,
+                                  priority, deadline, sent.set)
+        # Também libera a espera se a original terminar sem ser enviada (circuito, prazo)
+        primary.add_done_callback(lambda _: sent.set())
+        sent.wait()
+        done, _ = wait([primary], timeout=delay)
+        if done or not policy.budget.try_spend():
+            return primary.result()
+
+        logging.debug(f"Requisição lenta para {url} (>{delay:.2f}s), disparando cópia")
+        backup = executor.submit(self._send, url, params, timeout, headers, False, endpoint,
+                                 priority, deadline)
+        pending = {primary, backup}
+        fallback = None
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                if response.status_code >= 500 and pending:
+                    # Erro do servidor: esperar a outra requisição antes de desistir
+                    if fallback is not None:
+                        fallback.close()
+                    fallback = response
+                    continue
+                for other in pending:
+                    other.add_done_callback(_close_response)
+                if fallback is not None:
+                    fallback.close()
+                if future is backup:
+                    policy.record_win()
+                return response
+        if fallback is not None:
+            return fallback
+        raise error
+
+    def _send(self, url, params, timeout, headers, stream=False, endpoint=None, priority=None,
+              deadline=None, on_sent=None):
+        """
+        Envia a requisição pela rede, respeitando o circuit breaker e o limitador de taxa.
+        Gera DeadlineExceeded se o prazo (deadline) acabar antes de o limitador liberar o envio.
+        on_sent é chamada quando o limitador libera o envio.
+        """
+        if self.breaker is not None and not self.breaker.allow_request():
+            raise CircuitOpenError(
+                f"API gameinfo indisponível; nova tentativa em {self.breaker.retry_in():.0f}s")
+
+        if self.limiter is not None:
+            if priority is None:
+                priority = current_priority()
+            wait_limit = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not self.limiter.acquire(timeout=wait_limit, priority=priority):
+                if self.breaker is not None:
+                    self.breaker.release_probe()
+                raise DeadlineExceeded("Prazo esgotado aguardando o limitador de taxa")
+        if on_sent is not None:
+            on_sent()
+        started = time.monotonic()
+        try:
+            response = self.session.get(url, params=params, timeout=timeout, headers=headers,
+                                        stream=stream)
+        except Exception as e:
+            if self.limiter is not None and isinstance(
+                    e, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+                self.limiter.on_error()
+            if self.breaker is not None:
+                self.breaker.record_failure()
+            raise
+
+        if self.limiter is not None:
+            self.limiter.on_response(response.status_code, response.headers)
+        if self.breaker is not None:
+            # 5xx indica API com problemas; 429 é tratado pelo limitador de taxa
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+        if self.hedging is not None and endpoint is not None and response.status_code < 500:
+            self.hedging.tracker.record(endpoint, time.monotonic() - started)
+        return response
+
+    def close(self):
+        """
+        Fecha a sessão e todas as conexões do pool.
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+_clients = {}
+_client_lock = threading.Lock()
+
+
+def get_client(region=None):
+    """
+    Retorna o cliente compartilhado da região (por padrão, a do contexto atual),
+    criando-o na primeira chamada. Cada região tem seu limitador e circuit breaker.
+    """
+    region = validate_region(region or current_region())
+    client = _clients.get(region)
+    if client is None:
+        with _client_lock:
+            client = _clients.get(region)
+            if client is None:
+                client = GameinfoClient(base_url=region_base_url(region), cache=ResponseCache(),
+                                        limiter=get_limiter(region), breaker=get_breaker(region),
+                                        hedging=HedgePolicy())
+                _clients[region] = client
+                logging.info(f"Cliente gameinfo ({region}) criado para {client.base_url}")
+    return client
+
+
+def reset_client():
+    """
+    Fecha os clientes compartilhados; a próxima chamada a get_client() cria um novo.
+    """
+    with _client_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
@@ -0,0 +1,518 @@
+"""
+Servidor HTTP local que imita os endpoints da API gameinfo usados pelo api_scraper
+(/search, /battles, /battles/{id} e /players/{id}), servindo as respostas reais salvas no
+repositório (data.json, api_response.json, raw_battles_data.json, temp.json).
+Também serve /events com eventos de kill sintéticos, gerados a partir dos
+kills e mortes de cada jogador nas batalhas, /players/{id} com perfis
+montados a partir das batalhas de cada jogador, e as páginas HTML do
+albionbattles.com (/guilds/{id} e /battles/{id}) usadas por html_fallback.
+
+Permite medir e ajustar a ingestão sem acessar a API oficial: latência,
+taxa de erros 5xx e respostas 429 são configuráveis, e as batalhas podem ser
+multiplicadas sinteticamente para simular volumes maiores.
+
+Uso:
+    python gameinfo_stub_server.py --port 8765 --latency 0.2 --error-rate 0.05 --scale 10
+    GAMEINFO_BASE_URL=http://127.0.0.1:8765/api/gameinfo python api_data_processor.py
+"""
+
+import argparse
+import html
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Constantes
+FIXTURE_FILES = ["data.json", "api_response.json", "raw_battles_data.json", "temp.json"]
+API_PREFIX = "/api/gameinfo"
+SYNTHETIC_ID_STEP = 10 ** 10  # Deslocamento dos IDs das cópias sintéticas de cada batalha
+RANGE_DAYS = {'week': 7, '2weeks': 14, 'month': 30}
+MAX_PAGE_LIMIT = 51  # Mesmo limite da API oficial
+
+EVENT_ID_BASE = 10 ** 9  # Primeiro EventId dos eventos sintéticos
+_BATTLE_PATH = re.compile(rf"^{API_PREFIX}/battles/(\d+)$")
+_PLAYER_PATH = re.compile(rf"^{API_PREFIX}/players/([^/]+)$")
+_HTML_GUILD_PATH = re.compile(r"^/guilds/([^/]+)$")
+_HTML_BATTLE_PATH = re.compile(r"^/battles/(\d+)$")
+
+# Cabeçalho e rodapé das páginas HTML (navegação, estilos e scripts como no site real)
+_HTML_HEAD = """<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>{title} - Albion Battles</title>
+<link rel="stylesheet" href="/static/css/bootstrap.min.css"><link rel="stylesheet" href="/static/css/site.css">
+<script>window.dataLayer = window.dataLayer || []; function gtag(){{dataLayer.push(arguments);}}</script>
+</head><body><nav class="navbar navbar-expand-lg navbar-dark bg-dark"><a class="navbar-brand" href="/">Albion Battles</a>
+<ul class="navbar-nav"><li class="nav-item"><a class="nav-link" href="/battles">Battles</a></li>
+<li class="nav-item"><a class="nav-link" href="/guilds">Guilds</a></li><li class="nav-item"><a class="nav-link" href="/alliances">Alliances</a></li></ul>
+<form class="form-inline" action="/search"><input class="form-control" type="search" name="q" placeholder="Search"></form></nav>
+<div class="container-fluid">"""
+_HTML_FOOT = """</div><footer class="footer"><p>Data from the Albion Online gameinfo API &amp; community.</p></footer>
+<script src="/static/js/jquery.min.js"></script><script src="/static/js/bootstrap.bundle.min.js"></script></body></html>"""
+_TIME_FIELDS = ('startTime', 'endTime', 'timeout')
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _format_time(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def load_fixture_battles(paths=FIXTURE_FILES):
+    """
+    Carrega as batalhas brutas dos arquivos de exemplo, sem duplicar IDs.
+    """
+    battles = {}
+    for path in paths:
+        if not os.path.exists(path):
+            logging.warning(f"Arquivo de exemplo não encontrado: {path}")
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for battle in json.load(f):
+                battles.setdefault(battle['id'], battle)
+    logging.info(f"Carregadas {len(battles)} batalhas de exemplo")
+    return list(battles.values())
+
+
+def build_battles(fixtures, scale=1, shift_to_now=True):
+    """
+    Prepara as batalhas servidas pelo servidor.
+
+    Args:
+        fixtures: batalhas brutas de exemplo
+        scale: número de cópias de cada batalha; cada cópia recebe um novo ID e
+            é deslocada para trás no tempo pelo período coberto pelos exemplos
+        shift_to_now: se True, desloca os horários para que a batalha mais
+            recente termine agora (assim os filtros de 'range' encontram dados)
+    """
+    if not fixtures:
+        return []
+
+    start_times = [_parse_time(battle['startTime']) for battle in fixtures]
+    newest, oldest = max(start_times), min(start_times)
+    span = max(newest - oldest, timedelta(hours=1))
+    offset = (datetime.now(timezone.utc) - newest) if shift_to_now else timedelta(0)
+
+    battles = []
+    for copy_index in range(max(1, scale)):
+        copy_offset = offset - span * copy_index
+        for battle in fixtures:
+            copy = dict(battle)
+            copy['id'] = battle['id'] + SYNTHETIC_ID_STEP * copy_index
+            for field in _TIME_FIELDS:
+                if copy.get(field):
+                    copy[field] = _format_time(_parse_time(copy[field]) + copy_offset)
+            battles.append(copy)
+
+    # Mais recentes primeiro, como a listagem da API
+    battles.sort(key=lambda battle: battle['startTime'], reverse=True)
+    return battles
+
+
+def _event_player(player):
+    return {
+        'Id': player.get('id'), 'Name': player.get('name'),
+        'GuildId': player.get('guildId', ''), 'GuildName': player.get('guildName', ''),
+        'AllianceId': player.get('allianceId', ''), 'AllianceName': player.get('allianceName', ''),
+        'AverageItemPower': 1200.0, 'Equipment': {}, 'Inventory': []
+    }
+
+
+def build_player_profiles(battles):
+    """
+    Monta o perfil (/players/{id}) de cada jogador a partir das batalhas em
+    que ele aparece, no formato da API: a fama de kill soma a das batalhas e
+    a guild é a da batalha mais recente.
+    """
+    profiles = {}
+    for battle in sorted(battles, key=lambda battle: battle['startTime']):
+        for player_id, player in (battle.get('players') or {}).items():
+            profile = profiles.get(player_id)
+            if profile is None:
+                profile = profiles[player_id] = {
+                    'Id': player_id, 'KillFame': 0, 'DeathFame': 0, 'FameRatio': 0.0,
+                    'LifetimeStatistics': {
+                        'PvE': {'Total': 0}, 'Gathering': {'All': {'Total': 0}},
+                        'Crafting': {'Total': 0}
+                    }
+                }
+            profile.update({
+                'Name': player.get('name'), 'GuildId': player.get('guildId', ''),
+                'GuildName': player.get('guildName', ''), 'AllianceId': player.get('allianceId', ''),
+                'AllianceName': player.get('allianceName', '')
+            })
+            profile['KillFame'] += player.get('killFame', 0)
+            profile['DeathFame'] += player.get('deaths', 0) * 50000
+            profile['FameRatio'] = round(profile['KillFame'] / max(1, profile['DeathFame']), 2)
+    return profiles
+
+
+def build_events(battles):
+    """
+    Gera eventos de kill sintéticos: cada kill de um jogador vira um evento
+    contra um jogador de outra guild que morreu na mesma batalha.
+    Retorna os eventos do mais recente para o mais antigo, com EventIds crescentes no tempo.
+    """
+    events = []
+    for battle in sorted(battles, key=lambda battle: battle['startTime']):
+        players = list((battle.get('players') or {}).values())
+        victims = [player for player in players for _ in range(player.get('deaths', 0))]
+        if not victims:
+            continue
+        start = _parse_time(battle['startTime'])
+        end = _parse_time(battle.get('endTime') or battle['startTime'])
+        killers = [player for player in players for _ in range(player.get('kills', 0))]
+        for index, killer in enumerate(killers):
+            victim = next((v for v in victims[index:] + victims[:index]
+                           if v.get('guildId') != killer.get('guildId')), victims[index % len(victims)])
+            timestamp = start + (end - start) * (index + 1) / (len(killers) + 1)
+            events.append({
+                'BattleId': battle['id'],
+                'TimeStamp': _format_time(timestamp),
+                'TotalVictimKillFame': victim.get('deathFame', 0) or 10000,
+                'Killer': _event_player(killer),
+                'Victim': _event_player(victim),
+                'Participants': [dict(_event_player(killer), DamageDone=500.0, SupportHealingDone=0.0)],
+                'GroupMembers': [_event_player(killer)],
+                'groupMemberCount': 1,
+                'numberOfParticipants': 1,
+                'Type': 'KILL'
+            })
+
+    events.sort(key=lambda event: event['TimeStamp'])
+    for offset, event in enumerate(events):
+        event['EventId'] = EVENT_ID_BASE + offset
+    events.reverse()
+    return events
+
+
+def _html_time(value):
+    return _parse_time(value).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def render_guild_page(battles, guild_id):
+    """
+    Página de uma guild no albionbattles.com: tabela table-battles com as
+    batalhas da guild (link e horário, jogadores, kills, mortes, fama, total de jogadores).
+    """
+    rows = []
+    name = ''
+    for battle in sorted(battles, key=lambda battle: battle['startTime'], reverse=True):
+        players = [player for player in (battle.get('players') or {}).values()
+                   if player.get('guildId') == guild_id]
+        if not players:
+            continue
+        name = name or players[0].get('guildName', '')
+        rows.append(
+            f'<tr class="battle-row"><td><a href="/battles/{battle["id"]}">'
+            f'{_html_time(battle["startTime"])}</a></td>'
+            f'<td>{len(players)}</td>'
+            f'<td>{sum(player.get("kills", 0) for player in players)}</td>'
+            f'<td>{sum(player.get("deaths", 0) for player in players)}</td>'
+            f'<td>{battle.get("totalFame", 0):,}</td>'
+            f'<td><span class="badge badge-secondary">{len(battle.get("players") or {})}</span></td></tr>')
+    return (_HTML_HEAD.format(title=html.escape(name or guild_id))
+            + f'<h2 class="guild-name">{html.escape(name)}</h2>'
+            + '<table class="table table-striped table-battles"><thead><tr><th>Date</th><th>Players</th>'
+            + '<th>Kills</th><th>Deaths</th><th>Fame</th><th>Total</th></tr></thead><tbody>'
+            + ''.join(rows) + '</tbody></table>' + _HTML_FOOT)
+
+
+def render_battle_page(battle):
+    """
+    Página de uma batalha no albionbattles.com: título com o horário e uma
+    tabela table-responsive por guild (jogador, kills, mortes, fama, item).
+    """
+    guilds = {}
+    for player in (battle.get('players') or {}).values():
+        guilds.setdefault(player.get('guildName') or '', []).append(player)
+
+    cards = []
+    for guild_name, players in sorted(guilds.items()):
+        rows = ''.join(
+            f'<tr><td><a href="/players/{player.get("id", "")}">{html.escape(player.get("name", ""))}</a></td>'
+            f'<td>{player.get("kills", 0)}</td><td>{player.get("deaths", 0)}</td>'
+            f'<td>{player.get("killFame", 0):,}</td>'
+            f'<td><img class="item" src="/static/img/weapon.png" alt=""></td></tr>'
+            for player in players)
+        cards.append(
+            '<div class="card mb-3"><div class="card-body">'
+            '<table class="table table-sm table-responsive"><thead>'
+            f'<tr><th colspan="5">{html.escape(guild_name)}</th></tr>'
+            '<tr><th>Player</th><th>Kills</th><th>Deaths</th><th>Fame</th><th>Weapon</th></tr>'
+            f'</thead><tbody>{rows}</tbody></table></div></div>')
+
+    return (_HTML_HEAD.format(title=f"Battle {battle['id']}")
+            + '<div class="card"><div class="card-header">'
+            + f'<h4 class="card-title">Battle {battle["id"]} - {_html_time(battle["startTime"])}</h4>'
+            + f'<p>Total fame: {battle.get("totalFame", 0):,} &middot; Kills: {battle.get("totalKills", 0)}</p>'
+            + '</div></div>' + ''.join(cards) + _HTML_FOOT)
+
+
+class GameinfoStub:
+    """
+    Dados e comportamento (latência, erros, 429) do servidor substituto.
+    """
+
+    def __init__(self, battles, latency=0.0, jitter=0.0, error_rate=0.0,
+                 rate_limit_rate=0.0, retry_after=1, stall_rate=0.0, stall=0.0, seed=None):
+        self.battles = battles
+        self.battles_by_id = {str(battle['id']): battle for battle in battles}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.random = random.Random(seed)
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+        # Índices por guild e nomes de guilds para /search
+        self.battles_by_guild = {}
+        self.guilds = {}
+        for battle in battles:
+            for guild_id, guild in (battle.get('guilds') or {}).items():
+                self.battles_by_guild.setdefault(guild_id, []).append(battle)
+                self.guilds.setdefault(guild_id, guild.get('name', ''))
+
+        self.events = build_events(battles)
+        self.players = build_player_profiles(battles)
+
+    def add_events(self, events):
+        """
+        Acrescenta eventos novos ao topo da listagem (simula kills acontecendo agora).
+        """
+        with self._lock:
+            self.events = list(events) + self.events
+
+    def draw_fault(self):
+        """
+        Sorteia uma falha injetada para a próxima requisição: 429, 503 ou nenhuma.
+        """
+        with self._lock:
+            roll = self.random.random()
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            if self.random.random() < self.stall_rate:
+                # Cauda de latência: algumas requisições ficam presas por muito mais tempo
+                delay += self.stall
+        if roll < self.rate_limit_rate:
+            return 429, delay
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 503, delay
+        return None, delay
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def search(self, query):
+        query = (query or '').lower()
+        guilds = [
+            {'Id': guild_id, 'Name': name, 'AllianceId': '', 'AllianceName': None,
+             'KillFame': None, 'DeathFame': 0}
+            for guild_id, name in self.guilds.items()
+            if query in name.lower()
+        ]
+        return {'guilds': guilds, 'players': []}
+
+    def list_battles(self, params):
+        guild_id = params.get('guildId')
+        battles = self.battles_by_guild.get(guild_id, []) if guild_id else self.battles
+
+        days = RANGE_DAYS.get(params.get('range', 'week'), 7)
+        cutoff = _format_time(datetime.now(timezone.utc) - timedelta(days=days))
+        battles = [battle for battle in battles if battle['startTime'] >= cutoff]
+
+        if params.get('sort') == 'totalfame':
+            battles = sorted(battles, key=lambda battle: battle.get('totalFame', 0), reverse=True)
+
+        offset = max(0, int(params.get('offset', 0)))
+        limit = min(MAX_PAGE_LIMIT, max(1, int(params.get('limit', MAX_PAGE_LIMIT))))
+        return battles[offset:offset + limit]
+
+
+    def list_events(self, params):
+        guild_id = params.get('guildId')
+        events = self.events
+        if guild_id:
+            events = [event for event in events
+                      if guild_id in (event['Killer']['GuildId'], event['Victim']['GuildId'])]
+        offset = max(0, int(params.get('offset', 0)))
+        limit = min(MAX_PAGE_LIMIT, max(1, int(params.get('limit', MAX_PAGE_LIMIT))))
+        return events[offset:offset + limit]
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, como a API real
+
+    def do_GET(self):
+        stub = self.server.stub
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if url.path == '/__stub__/stats':
+            return self._send_json(200, dict(stub.stats))
+
+        fault, delay = stub.draw_fault()
+        if delay > 0:
+            time.sleep(delay)
+
+        if fault == 429:
+            stub.count('429')
+            return self._send_json(429, {'error': 'Too Many Requests'},
+                                   {'Retry-After': str(stub.retry_after)})
+        if fault == 503:
+            stub.count('503')
+            return self._send_json(503, {'error': 'Service Unavailable'})
+
+        battle_match = _BATTLE_PATH.match(url.path)
+        try:
+            if url.path == f"{API_PREFIX}/search":
+                stub.count('search')
+                return self._send_json(200, stub.search(params.get('q')))
+            if url.path == f"{API_PREFIX}/battles":
+                stub.count('battles')
+                return self._send_json(200, stub.list_battles(params))
+            if url.path == f"{API_PREFIX}/events":
+                stub.count('events')
+                return self._send_json(200, stub.list_events(params))
+            player_match = _PLAYER_PATH.match(url.path)
+            if player_match:
+                stub.count('player')
+                profile = stub.players.get(player_match.group(1))
+                if profile is None:
+                    return self._send_json(404, {'error': 'Not Found'})
+                return self._send_json(200, profile)
+            if battle_match:
+                stub.count('battle')
+                battle = stub.battles_by_id.get(battle_match.group(1))
+                if battle is None:
+                    return self._send_json(404, {'error': 'Not Found'})
+                return self._send_json(200, battle)
+
+            # Páginas do albionbattles.com
+            html_battle_match = _HTML_BATTLE_PATH.match(url.path)
+            if html_battle_match:
+                stub.count('html_battle')
+                battle = stub.battles_by_id.get(html_battle_match.group(1))
+                if battle is None:
+                    return self._send_html(404, "<html><body>Not Found</body></html>")
+                return self._send_html(200, render_battle_page(battle))
+            html_guild_match = _HTML_GUILD_PATH.match(url.path)
+            if html_guild_match:
+                stub.count('html_guild')
+                guild_id = html_guild_match.group(1)
+                return self._send_html(
+                    200, render_guild_page(stub.battles_by_guild.get(guild_id, []), guild_id))
+        except ValueError as e:
+            return self._send_json(400, {'error': str(e)})
+
+        stub.count('404')
+        return self._send_json(404, {'error': 'Not Found'})
+
+    def _send_html(self, status, page):
+        self._send_body(status, page.encode('utf-8'), 'text/html; charset=utf-8')
+
+    def _send_json(self, status, payload, headers=None):
+        self._send_body(status, json.dumps(payload).encode('utf-8'),
+                        'application/json; charset=utf-8', headers)
+
+    def _send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"stub: {format % args}")
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clientes que desistem da resposta no meio (ex.: busca incremental) não são erro
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            logging.debug(f"stub: conexão encerrada pelo cliente {client_address}")
+            return
+        super().handle_error(request, client_address)
+
+
+def start_stub_server(host='127.0.0.1', port=0, stub=None, **options):
+    """
+    Inicia o servidor em uma thread de fundo.
+
+    Args:
+        port: porta (0 = escolher uma porta livre)
+        stub: GameinfoStub já configurado; se None, um é criado com os
+            arquivos de exemplo e as opções informadas (scale, latency, ...)
+
+    Returns:
+        (servidor, URL base da API para usar em GAMEINFO_BASE_URL)
+    """
+    if stub is None:
+        scale = options.pop('scale', 1)
+        shift_to_now = options.pop('shift_to_now', True)
+        stub = GameinfoStub(build_battles(load_fixture_battles(), scale, shift_to_now), **options)
+
+    server = _StubServer((host, port), _StubHandler)
+    server.stub = stub
+    thread = threading.Thread(target=server.serve_forever, name="gameinfo-stub", daemon=True)
+    thread.start()
+
+    base_url = f"http://{host}:{server.server_address[1]}{API_PREFIX}"
+    logging.info(f"Servidor gameinfo local em {base_url} ({len(stub.battles)} batalhas)")
+    return server, base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita a API gameinfo com os dados de exemplo")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="latência fixa por requisição (segundos)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="latência aleatória adicional máxima (segundos)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fração de respostas 503")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="fração de respostas 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="valor do header Retry-After nas respostas 429")
+    parser.add_argument('--stall-rate', type=float, default=0.0, help="fração de requisições com latência extra --stall")
+    parser.add_argument('--stall', type=float, default=0.0, help="latência extra (segundos) das requisições presas")
+    parser.add_argument('--scale', type=int, default=1, help="cópias sintéticas de cada batalha")
+    parser.add_argument('--keep-times', action='store_true', help="não deslocar os horários para o presente")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(
+        args.host, args.port,
+        scale=args.scale, shift_to_now=not args.keep_times,
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+        stall_rate=args.stall_rate, stall=args.stall, seed=args.seed)
+
+    print(f"GAMEINFO_BASE_URL={base_url}")
+    print(f"ALBIONBATTLES_BASE_URL={base_url[:-len(API_PREFIX)]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Cache persistente da resolução de nomes de guilds para IDs (e de IDs para o
+nome atual da guild).
+
+IDs de guilds não mudam, então uma resolução feita pelo /search vale por
+muito tempo. Nomes que a busca não encontrou também ficam guardados, por
+um período mais curto, para não repetir buscas inúteis. Os nomes vistos
+nas batalhas baixadas também alimentam o cache. Cada região tem seu próprio cache.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from regions import DEFAULT_REGION, current_region, region_path
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Constantes
+GUILD_DIRECTORY_FILE = os.path.join("cache", "guilds.json")  # Arquivo do cache de guilds
+POSITIVE_TTL = 30 * 24 * 3600  # Validade (segundos) de um nome resolvido para um ID
+NEGATIVE_TTL = 6 * 3600  # Validade (segundos) de um nome não encontrado na busca
+
+# Guilds conhecidas de antemão na região padrão (nome, ID)
+SEED_GUILDS = [("We Profit", "gUFLG-kcRFC1iOJDdwW2BQ")]
+
+# Resultado de lookup() para nomes ainda não resolvidos
+MISS = object()
+
+
+def _normalize(name):
+    return " ".join(str(name).split()).lower()
+
+
+class GuildDirectory:
+    """
+    Mapeamento nome → ID e ID → nome atual, gravado em disco. Thread-safe.
+    """
+
+    def __init__(self, path=GUILD_DIRECTORY_FILE, positive_ttl=POSITIVE_TTL,
+                 negative_ttl=NEGATIVE_TTL, seeds=SEED_GUILDS):
+        self.path = path
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.names = {}
+        self.ids = {}
+        self._load()
+        for name, guild_id in seeds:
+            self.names.setdefault(_normalize(name), {'id': guild_id, 'name': name,
+                                                     'resolved_at': time.time()})
+            self.ids.setdefault(guild_id, {'name': name, 'seen_at': time.time()})
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.names = data.get('names', {})
+            self.ids = data.get('ids', {})
+            logging.info(f"Cache de guilds carregado com {len(self.names)} nomes")
+        except (OSError, ValueError) as e:
+            logging.warning(f"Cache de guilds inválido {self.path}, recomeçando: {e}")
+
+    def lookup(self, name):
+        """
+        Retorna o ID em cache para o nome, None se o nome é sabidamente
+        inexistente, ou MISS se for preciso consultar a API.
+        """
+        with self._lock:
+            entry = self.names.get(_normalize(name))
+        if entry is None:
+            return MISS
+        ttl = self.positive_ttl if entry['id'] else self.negative_ttl
+        if time.time() - entry['resolved_at'] > ttl:
+            return MISS
+        return entry['id']
+
+    def name_for(self, guild_id):
+        """
+        Nome atual da guild com esse ID, se conhecido
+        """
+        with self._lock:
+            entry = self.ids.get(guild_id)
+        return entry['name'] if entry else None
+
+    def remember(self, name, guild_id, canonical_name=None):
+        """
+        Registra o resultado de uma busca: guild_id=None indica nome não encontrado.
+        """
+        now = time.time()
+        with self._lock:
+            self.names[_normalize(name)] = {'id': guild_id, 'name': canonical_name or name,
+                                            'resolved_at': now}
+            if guild_id:
+                self.ids[guild_id] = {'name': canonical_name or name, 'seen_at': now}
+                if canonical_name:
+                    self.names[_normalize(canonical_name)] = {'id': guild_id, 'name': canonical_name,
+                                                              'resolved_at': now}
+            self._dirty = True
+
+    def learn_from_battle(self, battle):
+        """
+        Registra as guilds (ID e nome atual) que aparecem em uma batalha bruta.
+        """
+        guilds = battle.get('guilds') if isinstance(battle, dict) else None
+        if not guilds:
+            return
+        now = time.time()
+        with self._lock:
+            for guild_id, guild in guilds.items():
+                name = guild.get('name') if isinstance(guild, dict) else None
+                if not name:
+                    continue
+                known = self.ids.get(guild_id)
+                if known and known['name'] == name and now - known['seen_at'] < self.positive_ttl / 2:
+                    continue
+                self.ids[guild_id] = {'name': name, 'seen_at': now}
+                self.names[_normalize(name)] = {'id': guild_id, 'name': name, 'resolved_at': now}
+                self._dirty = True
+
+    def flush(self):
+        """
+        Grava o cache em disco se houver alterações.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {'names': dict(self.names), 'ids': dict(self.ids)}
+            self._dirty = False
+        tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.error(f"Erro ao gravar cache de guilds: {e}")
+            with self._lock:
+                self._dirty = True
+
+
+_directories = {}
+_directory_lock = threading.Lock()
+
+
+def get_guild_directory(region=None):
+    """
+    Retorna o cache de guilds compartilhado do processo para a região
+    (por padrão, a do contexto atual).
+    """
+    region = region or current_region()
+    with _directory_lock:
+        directory = _directories.get(region)
+        if directory is None:
+            seeds = SEED_GUILDS if region == DEFAULT_REGION else ()
+            directory = _directories[region] = GuildDirectory(
+                region_path(GUILD_DIRECTORY_FILE, region), seeds=seeds)
+    return directory
@@ -0,0 +1,119 @@
+"""
+Requisições "hedged" para reduzir a cauda de latência da API gameinfo.
+
+Quando uma chamada demora mais que o p90 recente do seu endpoint, uma
+cópia da mesma requisição é disparada e vale a resposta que chegar
+primeiro. O número de cópias é limitado a uma fração das requisições
+(HEDGE_MAX_RATIO), para que a carga extra sobre a API fique controlada.
+"""
+
+import threading
+import time
+from collections import deque
+
+# Constantes
+LATENCY_WINDOW = 200  # Latências recentes guardadas por endpoint
+MIN_SAMPLES = 20  # Amostras necessárias antes de começar a duplicar requisições
+HEDGE_PERCENTILE = 90  # Percentil da latência a partir do qual a cópia é disparada
+MIN_HEDGE_DELAY = 0.05  # Espera mínima (segundos) antes de disparar a cópia
+HEDGE_MAX_RATIO = 0.15  # Máximo de cópias por requisição normal (p90 dispara ~10%, com folga)
+HEDGE_BURST = 10  # Cópias que podem ser disparadas seguidas com o saldo cheio
+
+
+class LatencyTracker:
+    """
+    Janela deslizante das latências recentes de cada endpoint, com o instante
+    de cada medição. Thread-safe.
+    """
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds):
+        with self._lock:
+            samples = self._samples.get(endpoint)
+            if samples is None:
+                samples = self._samples[endpoint] = deque(maxlen=self.window)
+            samples.append((time.monotonic(), seconds))
+
+    def percentile(self, endpoint, percentile, min_samples=MIN_SAMPLES, max_age=None):
+        """
+        Retorna o percentil das latências do endpoint, ou None se ainda houver poucas amostras.
+        max_age: ignorar as amostras medidas há mais que isso (segundos)
+        """
+        oldest = None if max_age is None else time.monotonic() - max_age
+        with self._lock:
+            samples = sorted(seconds for measured, seconds in self._samples.get(endpoint, ())
+                             if oldest is None or measured >= oldest)
+        if len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+        return samples[index]
+
+
+class HedgeBudget:
+    """
+    Limita as cópias a HEDGE_MAX_RATIO das requisições: cada requisição normal
+    acrescenta uma fração de crédito e cada cópia consome um crédito inteiro.
+    """
+
+    def __init__(self, ratio=HEDGE_MAX_RATIO, burst=HEDGE_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self._credit = float(burst)
+        self._lock = threading.Lock()
+        self.hedges = 0
+        self.denied = 0
+
+    def on_request(self):
+        with self._lock:
+            self._credit = min(self.burst, self._credit + self.ratio)
+
+    def try_spend(self):
+        with self._lock:
+            if self._credit >= 1:
+                self._credit -= 1
+                self.hedges += 1
+                return True
+            self.denied += 1
+            return False
+
+
+class HedgePolicy:
+    """
+    Decide quando duplicar uma requisição, a partir das latências observadas.
+    """
+
+    def __init__(self, percentile=HEDGE_PERCENTILE, tracker=None, budget=None,
+                 min_delay=MIN_HEDGE_DELAY):
+        self.percentile = percentile
+        self.tracker = tracker or LatencyTracker()
+        self.budget = budget or HedgeBudget()
+        self.min_delay = min_delay
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def hedge_delay(self, endpoint):
+        """
+        Tempo de espera pela resposta antes de disparar a cópia (None = não duplicar ainda).
+        """
+        delay = self.tracker.percentile(endpoint, self.percentile)
+        if delay is None:
+            return None
+        return max(self.min_delay, delay)
+
+    def record_win(self):
+        """
+        Registra que a cópia respondeu antes da requisição original.
+        """
+        with self._lock:
+            self.hedge_wins += 1
+
+    def stats(self):
+        return {
+            'hedges': self.budget.hedges,
+            'hedge_wins': self.hedge_wins,
+            'denied': self.budget.denied
+        }
@@ -0,0 +1,492 @@
+"""
+Fonte alternativa de batalhas: as páginas HTML do albionbattles.com.
+
+Usada automaticamente pelo api_scraper quando a API gameinfo está lenta ou
+fora do ar. As páginas das batalhas são baixadas em paralelo e lidas em um
+único passo por expressões regulares que só reconhecem as tags de tabela,
+links e título, guardando o texto das células das tabelas de interesse, sem
+montar a árvore do documento como o BeautifulSoup do antigo unused/scraper.py.
+Os registros têm o mesmo formato dos de api_scraper.refresh_battle_data.
+
+As batalhas obtidas aqui são marcadas como não encerradas, para que a
+próxima atualização com a API no ar troque a versão do HTML pela da API.
+
+Uso:
+    python html_fallback.py --guild-id gUFLG-kcRFC1iOJDdwW2BQ --days 7
+    python html_fallback.py --benchmark     # custo de parsing por página, com os fixtures
+"""
+
+import argparse
+import html
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from battle_history_manager import HTML_SOURCE
+from rate_limiter import AdaptiveRateLimiter, wait_before_retry
+from regions import DEFAULT_REGION, current_region, submit_in_context, use_region, validate_region
+from resilience import Deadline, DeadlineExceeded
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Constantes
+# Site de cada região; pode ser substituído pela variável de ambiente
+# ALBIONBATTLES_BASE_URL_<REGIÃO> (ou ALBIONBATTLES_BASE_URL na região padrão)
+ALBIONBATTLES_URLS = {
+    'americas': "https://albionbattles.com",
+    'europe': "https://europe.albionbattles.com",
+    'asia': "https://east.albionbattles.com",
+}
+HTML_FETCH_CONCURRENCY = 8  # Páginas de batalhas baixadas em paralelo
+HTML_TIMEOUT = (5, 15)  # Timeouts (conexão, leitura) de cada página
+HTML_RATE = 4.0  # Requisições por segundo ao site
+HTML_MAX_BATTLES = 60  # Máximo de batalhas detalhadas por atualização
+GUILD_COLUMNS = 5  # Colunas mínimas de uma linha da tabela de batalhas da guild
+PLAYER_COLUMNS = 4  # Colunas mínimas de uma linha de jogador
+
+_TIME_PATTERN = re.compile(r"(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})")
+# Únicas tags analisadas pelo parser; as demais ficam no texto das células e são removidas por _text
+_TAG_PATTERN = re.compile(r"<(/?)(table|thead|tbody|tr|td|th|a|h4|script)\b([^>]*)>", re.IGNORECASE)
+_INNER_TAG_PATTERN = re.compile(r"<[^>]*>")
+_CLASS_PATTERN = re.compile(r"class\s*=\s*[\"']([^\"']*)[\"']", re.IGNORECASE)
+_HREF_PATTERN = re.compile(r"href\s*=\s*[\"']([^\"']*)[\"']", re.IGNORECASE)
+
+_session = None
+_limiters = {}
+_lock = threading.Lock()
+
+
+def _has_class(attrs, name):
+    match = _CLASS_PATTERN.search(attrs)
+    return bool(match) and name in match.group(1).split()
+
+
+def _text(fragment):
+    """
+    Texto de um trecho de HTML (sem as tags internas e com as entidades convertidas).
+    """
+    if '<' in fragment:
+        fragment = _INNER_TAG_PATTERN.sub('', fragment)
+    if '&' in fragment:
+        fragment = html.unescape(fragment)
+    return fragment.strip()
+
+
+def _scan_tables(page, table_class, title_tag=None, title_class=None):
+    """
+    Percorre a página uma única vez, olhando só as tags de tabela, links e do
+    título (as demais, e o conteúdo de <script>, são puladas sem análise).
+
+    Returns:
+        (tabelas, título): o cabeçalho com colspan e as linhas do tbody (células
+        como (texto, primeiro link)) de cada tabela com a classe table_class, e
+        o texto do primeiro title_tag com a classe title_class.
+    """
+    tables = []
+    title = None
+    table = None
+    nested = 0
+    section = None
+    row = None
+    cell_start = None
+    href = None
+    header_start = None
+    title_start = None
+
+    position = 0
+    search = _TAG_PATTERN.search
+    while True:
+        match = search(page, position)
+        if match is None:
+            break
+        position = match.end()
+        closing, tag, attrs = match.groups()
+        tag = tag.lower()
+
+        if tag == 'script':
+            if not closing:
+                end = page.find('</script', position)
+                position = len(page) if end < 0 else end + len('</script')
+            continue
+
+        if table is None:
+            if tag == 'table':
+                if not closing and _has_class(attrs, table_class):
+                    table = {'header': None, 'rows': []}
+            elif tag == title_tag and title is None:
+                if not closing and _has_class(attrs, title_class):
+                    title_start = position
+                elif closing and title_start is not None:
+                    title = _text(page[title_start:match.start()])
+            continue
+
+        if tag == 'table':
+            if not closing:
+                nested += 1
+            elif nested:
+                nested -= 1
+            else:
+                tables.append(table)
+                table = section = row = cell_start = header_start = None
+            continue
+        if nested:
+            continue
+
+        if closing:
+            if tag == 'td':
+                if cell_start is not None:
+                    row.append((_text(page[cell_start:match.start()]), href))
+                    cell_start = None
+            elif tag == 'tr':
+                if row is not None:
+                    table['rows'].append(row)
+                    row = None
+            elif tag == 'th':
+                if header_start is not None:
+                    table['header'] = _text(page[header_start:match.start()])
+                    header_start = None
+            elif tag in ('thead', 'tbody'):
+                section = None
+        elif tag == 'td':
+            if row is not None:
+                cell_start = position
+                href = None
+        elif tag == 'a':
+            if cell_start is not None and href is None:
+                href_match = _HREF_PATTERN.search(attrs)
+                href = html.unescape(href_match.group(1)) if href_match else None
+        elif tag == 'tr':
+            if section == 'tbody':
+                row = []
+        elif tag == 'th':
+            if section != 'tbody' and table['header'] is None and 'colspan' in attrs.lower():
+                header_start = position
+        elif tag in ('thead', 'tbody'):
+            section = tag
+
+    return tables, title
+
+
+def _to_int(text):
+    return int(text.replace(',', '').strip() or 0)
+
+
+def _parse_time(text):
+    match = _TIME_PATTERN.search(text or '')
+    if not match:
+        return None
+    # O site mostra os horários do servidor do jogo (UTC)
+    return datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+
+
+def _battle_id(href):
+    battle_id = (href or '').rstrip('/').rsplit('/', 1)[-1]
+    return int(battle_id) if battle_id.isdigit() else battle_id
+
+
+def parse_guild_page(page):
+    """
+    Extrai as batalhas da página de uma guild (tabela table-battles).
+    Retorna dicionários com battle_id, time, players, kills, deaths e fame.
+    """
+    tables, _ = _scan_tables(page, 'table-battles')
+
+    battles = []
+    for table in tables:
+        for row in table['rows']:
+            if len(row) < GUILD_COLUMNS or not row[0][1]:
+                continue
+            try:
+                battle_time = _parse_time(row[0][0])
+                if battle_time is None:
+                    continue
+                battles.append({
+                    'battle_id': _battle_id(row[0][1]),
+                    'time': battle_time,
+                    'players': _to_int(row[1][0]),
+                    'kills': _to_int(row[2][0]),
+                    'deaths': _to_int(row[3][0]),
+                    'fame': _to_int(row[4][0])
+                })
+            except ValueError as e:
+                logging.debug(f"Linha de batalha inválida no HTML: {e}")
+    return battles
+
+
+def parse_battle_page(page, battle_id):
+    """
+    Extrai os detalhes de uma batalha (uma tabela table-responsive por guild),
+    no mesmo formato de api_scraper.process_battle_details.
+    """
+    tables, title = _scan_tables(page, 'table-responsive', 'h4', 'card-title')
+
+    guilds = {}
+    for table in tables:
+        guild_name = table['header']
+        if guild_name is None:
+            continue
+        stats = guilds.setdefault(guild_name, {
+            'players': [],
+            'total_kills': 0,
+            'total_deaths': 0,
+            'total_fame': 0
+        })
+        for row in table['rows']:
+            if len(row) < PLAYER_COLUMNS:
+                continue
+            try:
+                player = {
+                    'name': row[0][0],
+                    'kills': _to_int(row[1][0]),
+                    'deaths': _to_int(row[2][0]),
+                    'fame': _to_int(row[3][0])
+                }
+            except ValueError as e:
+                logging.debug(f"Linha de jogador inválida no HTML da batalha {battle_id}: {e}")
+                continue
+            stats['players'].append(player)
+            stats['total_kills'] += player['kills']
+            stats['total_deaths'] += player['deaths']
+            stats['total_fame'] += player['fame']
+
+    return {
+        'id': battle_id,
+        'time': _parse_time(title),
+        'guilds': guilds
+    }
+
+
+def fallback_base_url(region=None):
+    """
+    URL do albionbattles.com da região (por padrão, a do contexto atual).
+    """
+    region = validate_region(region or current_region())
+    override = os.environ.get(f"ALBIONBATTLES_BASE_URL_{region.upper()}")
+    if override is None and region == DEFAULT_REGION:
+        override = os.environ.get("ALBIONBATTLES_BASE_URL")
+    return (override or ALBIONBATTLES_URLS[region]).rstrip('/')
+
+
+def _get_session():
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            session.headers.update({
+                'User-Agent':
+                'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+                'Accept': 'text/html,application/xhtml+xml'
+            })
+            adapter = HTTPAdapter(pool_maxsize=HTML_FETCH_CONCURRENCY)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def _get_limiter(base_url):
+    with _lock:
+        limiter = _limiters.get(base_url)
+        if limiter is None:
+            limiter = _limiters[base_url] = AdaptiveRateLimiter(rate=HTML_RATE)
+        return limiter
+
+
+def _fetch_page(url, deadline, max_attempts=2, delay=0.5):
+    """
+    Baixa uma página HTML. Retorna o texto, ou None se todas as tentativas falharem.
+    """
+    limiter = _get_limiter(url.split('/', 3)[2])
+    for attempt in range(max_attempts):
+        if deadline.expired():
+            break
+        if not limiter.acquire(timeout=deadline.remaining()):
+            # Prazo esgotado na fila do limitador
+            break
+        try:
+            response = _get_session().get(url, timeout=deadline.cap_timeout(HTML_TIMEOUT))
+        except DeadlineExceeded:
+            break
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"Erro ao baixar {url}: {e}")
+            limiter.on_error()
+            if attempt < max_attempts - 1:
+                wait_before_retry(attempt, delay, deadline.expires_at)
+            continue
+
+        limiter.on_response(response.status_code, response.headers)
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            logging.warning(f"HTTP {response.status_code} ao baixar {url}")
+            if attempt < max_attempts - 1:
+                wait_before_retry(attempt, delay, deadline.expires_at)
+            continue
+        return response.text
+    return None
+
+
+def fetch_guild_battles_html(guild_id, days=30, known_ids=None, deadline=None,
+                             max_battles=HTML_MAX_BATTLES, max_workers=HTML_FETCH_CONCURRENCY):
+    """
+    Busca as batalhas recentes de uma guild no albionbattles.com.
+
+    Args:
+        guild_id: ID da guild (o mesmo da API gameinfo)
+        days: período das batalhas
+        known_ids: IDs já no histórico, que não são baixados de novo
+        deadline: resilience.Deadline da atualização
+        max_battles: máximo de páginas de batalhas baixadas
+
+    Returns:
+        DataFrame com os mesmos campos de refresh_battle_data (battle_id, time,
+        players, kills, deaths, fame, finished, details) e source=HTML_SOURCE,
+        ou None se a página da guild não puder ser obtida.
+    """
+    deadline = deadline or Deadline()
+    base_url = fallback_base_url()
+    page = _fetch_page(f"{base_url}/guilds/{guild_id}", deadline)
+    if page is None:
+        logging.warning(f"Não foi possível obter a página da guild {guild_id} em {base_url}")
+        return None
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    known = {str(battle_id) for battle_id in (known_ids or ())}
+    listed = [battle for battle in parse_guild_page(page)
+              if battle['time'] >= cutoff and str(battle['battle_id']) not in known]
+    listed = listed[:max_battles]
+    logging.info(f"{len(listed)} batalhas novas da guild {guild_id} no HTML de {base_url}")
+    if not listed:
+        return pd.DataFrame()
+
+    records = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(listed))),
+                            thread_name_prefix="html-fetch") as executor:
+        futures = {
+            submit_in_context(executor, _fetch_page, f"{base_url}/battles/{battle['battle_id']}",
+                              deadline): battle
+            for battle in listed
+        }
+        for future in as_completed(futures):
+            battle = futures[future]
+            battle_page = future.result()
+            if battle_page is None:
+                continue
+            details = parse_battle_page(battle_page, battle['battle_id'])
+            if not details['guilds']:
+                continue
+            details['time'] = details['time'] or battle['time']
+            records.append({
+                **battle,
+                # Versão provisória: será substituída pela da API (ver refresh_open_battles)
+                'finished': False,
+                'source': HTML_SOURCE,
+                'details': details
+            })
+
+    records.sort(key=lambda record: record['time'], reverse=True)
+    return pd.DataFrame(records)
+
+
+def _parse_battle_page_bs4(page, battle_id):
+    """
+    Parsing do antigo unused/scraper.py (BeautifulSoup), usado só para comparação no benchmark.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page, 'html.parser')
+    title = soup.select_one('h4.card-title')
+    guilds = {}
+    for table in soup.select('div.card-body table.table-responsive'):
+        header = table.select_one('th[colspan]')
+        if not header:
+            continue
+        stats = guilds.setdefault(header.text.strip(), {'players': [], 'total_kills': 0,
+                                                        'total_deaths': 0, 'total_fame': 0})
+        for row in table.select('tbody tr'):
+            cols = row.select('td')
+            if len(cols) < PLAYER_COLUMNS:
+                continue
+            player = {'name': cols[0].text.strip(), 'kills': int(cols[1].text.strip()),
+                      'deaths': int(cols[2].text.strip()),
+                      'fame': int(cols[3].text.strip().replace(',', ''))}
+            stats['players'].append(player)
+            stats['total_kills'] += player['kills']
+            stats['total_deaths'] += player['deaths']
+            stats['total_fame'] += player['fame']
+    return {'id': battle_id, 'time': _parse_time(title.text if title else None), 'guilds': guilds}
+
+
+def benchmark(repeat=5):
+    """
+    Mede o custo de parsing por página com as batalhas dos fixtures do repositório
+    (renderizadas como no albionbattles.com pelo gameinfo_stub_server).
+    """
+    from gameinfo_stub_server import (load_fixture_battles, build_battles, render_battle_page,
+                                      render_guild_page)
+    from battle_history_manager import PRIMARY_GUILD_ID
+
+    battles = build_battles(load_fixture_battles(), shift_to_now=False)
+    pages = [(battle['id'], render_battle_page(battle)) for battle in battles]
+    guild_page = render_guild_page(battles, PRIMARY_GUILD_ID)
+    total_bytes = sum(len(page) for _, page in pages)
+    print(f"{len(pages)} páginas de batalha ({total_bytes / len(pages) / 1024:.1f} KiB em média), "
+          f"página da guild com {len(parse_guild_page(guild_page))} batalhas")
+
+    parsers = [('parser de um passo', parse_battle_page)]
+    try:
+        import bs4  # noqa: F401
+        parsers.append(('BeautifulSoup (unused/scraper.py)', _parse_battle_page_bs4))
+    except ImportError:
+        print("BeautifulSoup não instalado; comparação com o parser antigo omitida")
+
+    for name, parse in parsers:
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for battle_id, page in pages:
+                parse(page, battle_id)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{name}: {best / len(pages) * 1000:.3f} ms/página")
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        parse_guild_page(guild_page)
+    print(f"página da guild: {(time.perf_counter() - started) / repeat * 1000:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batalhas de uma guild a partir do HTML do albionbattles.com")
+    parser.add_argument('--guild-id', help="ID da guild")
+    parser.add_argument('--days', type=int, default=7, help="período das batalhas")
+    parser.add_argument('--region', choices=list(ALBIONBATTLES_URLS), default=None,
+                        help="servidor da guild")
+    parser.add_argument('--benchmark', action='store_true',
+                        help="medir o custo de parsing com os fixtures e sair")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark()
+        return
+    if not args.guild_id:
+        parser.error("informe --guild-id ou --benchmark")
+
+    with use_region(args.region):
+        battles_df = fetch_guild_battles_html(args.guild_id, args.days)
+    if battles_df is None:
+        raise SystemExit(1)
+    print(battles_df.drop(columns=['details'], errors='ignore').to_string())
+
+
+if __name__ == "__main__":
+    main()
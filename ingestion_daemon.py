@@ -0,0 +1,310 @@
+"""
+Serviço de ingestão independente do Streamlit.
+
+É o único processo que acessa a API gameinfo e grava os dados em disco:
+a listagem bruta usada pelo app (data.json), o histórico de batalhas
+(battle_history_manager), os eventos de kill (event_ingester) e os perfis
+dos jogadores (player_profiles). O app apenas lê esses arquivos, então várias
+instâncias do app podem usar um mesmo serviço de ingestão. Os detalhes de uma
+batalha aberta no app também são buscados aqui, a pedido do app
+(detail_requests), com prioridade sobre as atualizações em andamento.
+
+Cada região (servidor) é atualizada em paralelo, com seu próprio cliente,
+limitador de taxa e arquivos; uma região lenta não atrasa as demais.
+
+Uso:
+    python ingestion_daemon.py              # roda continuamente (a cada 10 minutos)
+    python ingestion_daemon.py --once       # uma única atualização
+    python ingestion_daemon.py --interval 5
+    python ingestion_daemon.py --guild "americas:We Profit" --guild "europe:Outra Guild"
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from regions import DEFAULT_REGION, use_region, validate_region
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Constantes
+GUILD_NAME = "We Profit"
+REFRESH_INTERVAL_MINUTES = 10  # Intervalo entre atualizações
+HISTORY_DAYS = 30  # Período consultado na atualização do histórico
+STATUS_FILE = "ingestion_status.json"  # Estado da última execução, lido pelo app
+LOCK_FILE = "ingestion.lock"  # Garante um único serviço de ingestão por diretório
+
+# Guilds acompanhadas em cada região (pode ser substituído pela opção --guild)
+REGION_GUILDS = {DEFAULT_REGION: [GUILD_NAME]}
+
+_status_lock = threading.Lock()
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def read_status(status_file=STATUS_FILE):
+    """
+    Lê o estado gravado pelo serviço de ingestão.
+    Retorna um dicionário vazio se o serviço ainda não rodou.
+    """
+    try:
+        with open(status_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_status(status, status_file=STATUS_FILE):
+    """
+    Grava o estado de forma atômica para que os leitores nunca vejam um arquivo incompleto.
+    """
+    tmp_path = f"{status_file}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(status, f, indent=2)
+    os.replace(tmp_path, status_file)
+
+
+def _update_status(part, result, interval_minutes):
+    """
+    Grava o resultado de uma etapa ('listing' ou uma região) e recalcula o resumo
+    lido pelo app. Etapas em threads diferentes gravam uma de cada vez.
+    """
+    with _status_lock:
+        status = read_status()
+        if part == 'listing':
+            status['listing'] = result
+            if 'battles' in result:
+                status['battles'] = result['battles']
+        else:
+            status.setdefault('regions', {})[part] = result
+
+        parts = [status.get('listing', {})] + list(status.get('regions', {}).values())
+        errors = [part_result['error'] for part_result in parts if part_result.get('error')]
+        status['last_run'] = result['last_run']
+        status['ok'] = not errors
+        status['error'] = "; ".join(errors) or None
+        if not errors:
+            status['last_success'] = status['last_run']
+        status['duration'] = result['duration']
+        status['next_run'] = (_now() + timedelta(minutes=interval_minutes)).isoformat()
+        status['interval_minutes'] = interval_minutes
+        regions = status.get('regions', {}).values()
+        status['new_history_battles'] = sum(r.get('new_history_battles', 0) for r in regions)
+        status['new_events'] = sum(r.get('new_events', 0) for r in regions)
+        status['new_player_profiles'] = sum(r.get('new_player_profiles', 0) for r in regions)
+
+        try:
+            write_status(status)
+        except OSError as e:
+            logging.error(f"Erro ao gravar {STATUS_FILE}: {e}")
+
+
+def run_listing(interval_minutes=REFRESH_INTERVAL_MINUTES):
+    """
+    Atualiza a listagem bruta usada pelo app (data.json). Retorna True se funcionou.
+    """
+    # Importado aqui para que o app possa usar read_status sem carregar o cliente da API
+    from direct_scraper import refresh_local_data
+
+    started = time.monotonic()
+    result = {'last_run': _now().isoformat(), 'error': None}
+    try:
+        result['battles'] = len(refresh_local_data())
+    except Exception as e:
+        logging.error(f"Erro ao atualizar a listagem de batalhas: {e}")
+        result['error'] = f"listagem: {e}"
+    result['duration'] = round(time.monotonic() - started, 2)
+    _update_status('listing', result, interval_minutes)
+    return result['error'] is None
+
+
+def run_region(region, guild_names, interval_minutes=REFRESH_INTERVAL_MINUTES):
+    """
+    Atualiza o histórico, os eventos de kill e os perfis dos jogadores das guilds
+    acompanhadas em uma região,
+    com o cliente, o limitador e os arquivos dessa região. Retorna True se todas as etapas funcionaram.
+    """
+    from api_scraper import refresh_battle_data, get_guild_id
+    from backfill import backfill_guild, needs_backfill
+    from event_ingester import ingest_guild_events
+    from player_profiles import enrich_pending_players
+
+    started = time.monotonic()
+    result = {'last_run': _now().isoformat(), 'guilds': list(guild_names),
+              'new_history_battles': 0, 'new_events': 0, 'new_player_profiles': 0}
+    errors = []
+
+    with use_region(region):
+        for guild_name in guild_names:
+            guild_id = get_guild_id(guild_name)
+            if not guild_id:
+                errors.append(f"{guild_name}: guild não encontrada")
+                continue
+
+            # Guild nunca preenchida (ou com backfill interrompido): buscar o mês inteiro antes
+            if needs_backfill(guild_id):
+                try:
+                    if backfill_guild(guild_id) is None:
+                        errors.append(f"{guild_name}: backfill incompleto")
+                except Exception as e:
+                    logging.error(f"[{region}] Erro no backfill do histórico de {guild_name}: {e}")
+                    errors.append(f"{guild_name}: backfill: {e}")
+
+            try:
+                new_battles_df = refresh_battle_data(guild_name, days=HISTORY_DAYS)
+                result['new_history_battles'] += len(new_battles_df)
+            except Exception as e:
+                logging.error(f"[{region}] Erro ao atualizar o histórico de {guild_name}: {e}")
+                errors.append(f"{guild_name}: histórico: {e}")
+
+            try:
+                result['new_events'] += ingest_guild_events(guild_id)
+            except Exception as e:
+                logging.error(f"[{region}] Erro ao atualizar os eventos de kill de {guild_name}: {e}")
+                errors.append(f"{guild_name}: eventos: {e}")
+
+        # Perfis dos jogadores vistos nas batalhas novas, em lote para toda a região
+        try:
+            result['new_player_profiles'] = enrich_pending_players()
+        except Exception as e:
+            logging.error(f"[{region}] Erro ao buscar perfis de jogadores: {e}")
+            errors.append(f"perfis: {e}")
+
+    result['ok'] = not errors
+    result['error'] = f"{region}: " + "; ".join(errors) if errors else None
+    result['duration'] = round(time.monotonic() - started, 2)
+    _update_status(region, result, interval_minutes)
+
+    logging.info(
+        f"Ingestão da região {region} concluída em {result['duration']}s "
+        f"({'ok' if result['ok'] else 'com erros'})")
+    return result['ok']
+
+
+def run_ingestion(interval_minutes=REFRESH_INTERVAL_MINUTES, region_guilds=None):
+    """
+    Executa uma atualização completa: listagem usada pelo app e, em paralelo,
+    histórico e eventos de kill das guilds de cada região.
+    Retorna True se todas as etapas funcionaram.
+    """
+    region_guilds = region_guilds or REGION_GUILDS
+    started = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=len(region_guilds) + 1,
+                            thread_name_prefix="ingestion") as executor:
+        futures = [executor.submit(run_listing, interval_minutes)]
+        futures += [executor.submit(run_region, region, guild_names, interval_minutes)
+                    for region, guild_names in region_guilds.items()]
+        ok = all(future.result() for future in futures)
+
+    logging.info(
+        f"Ingestão concluída em {time.monotonic() - started:.2f}s "
+        f"({'ok' if ok else 'com erros'})")
+    return ok
+
+
+def parse_region_guilds(values):
+    """
+    Converte opções 'região:nome da guild' em {região: [nomes]}.
+    """
+    region_guilds = {}
+    for value in values:
+        region, _, guild_name = value.partition(':')
+        if not guild_name.strip():
+            raise ValueError(f"Use região:nome da guild (recebido: {value})")
+        region_guilds.setdefault(validate_region(region), []).append(guild_name.strip())
+    return region_guilds
+
+
+def acquire_lock(lock_file=LOCK_FILE):
+    """
+    Impede que dois serviços de ingestão gravem nos mesmos arquivos.
+    Retorna o arquivo de lock aberto (mantê-lo aberto mantém o lock), ou None
+    se outro serviço já estiver rodando.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        logging.warning("fcntl indisponível nesta plataforma; rodando sem lock de instância única")
+        return open(lock_file, 'a')
+
+    handle = open(lock_file, 'a')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço de ingestão de batalhas da API gameinfo")
+    parser.add_argument('--once', action='store_true', help="executar uma única atualização e sair")
+    parser.add_argument('--interval', type=float, default=REFRESH_INTERVAL_MINUTES,
+                        help="intervalo entre atualizações (minutos)")
+    parser.add_argument('--guild', action='append', default=[], metavar='REGIÃO:NOME',
+                        help="guild acompanhada (repetir para várias; padrão: "
+                             f"{DEFAULT_REGION}:{GUILD_NAME})")
+    args = parser.parse_args()
+
+    try:
+        region_guilds = parse_region_guilds(args.guild) or REGION_GUILDS
+    except ValueError as e:
+        parser.error(str(e))
+
+    lock = acquire_lock()
+    if lock is None:
+        logging.error(f"Outro serviço de ingestão já está rodando ({LOCK_FILE})")
+        raise SystemExit(1)
+
+    from gameinfo_client import reset_client
+    from detail_requests import DetailRequestServer
+
+    detail_server = None
+    try:
+        if args.once:
+            raise SystemExit(0 if run_ingestion(args.interval, region_guilds) else 1)
+
+        from apscheduler.schedulers.blocking import BlockingScheduler
+
+        scheduler = BlockingScheduler(timezone=timezone.utc)
+        # Um job por região, para que uma região lenta não atrase as demais.
+        # Primeira execução imediata; execuções atrasadas não se acumulam
+        scheduler.add_job(run_listing, 'interval', minutes=args.interval, args=[args.interval],
+                          id='listing', next_run_time=_now(), max_instances=1, coalesce=True)
+        for region, guild_names in region_guilds.items():
+            scheduler.add_job(run_region, 'interval', minutes=args.interval,
+                              args=[region, guild_names, args.interval], id=f"region-{region}",
+                              next_run_time=_now(), max_instances=1, coalesce=True)
+
+        def stop(signum, frame):
+            logging.info("Encerrando o serviço de ingestão")
+            scheduler.shutdown(wait=False)
+
+        signal.signal(signal.SIGTERM, stop)
+        # Pedidos de detalhes do app atendidos entre as atualizações agendadas
+        detail_server = DetailRequestServer()
+        detail_server.start()
+        logging.info(f"Serviço de ingestão iniciado - atualizações a cada {args.interval:g} minutos")
+        try:
+            scheduler.start()
+        except KeyboardInterrupt:
+            pass
+    finally:
+        if detail_server is not None:
+            detail_server.stop()
+        reset_client()
+        lock.close()
+
+
+if __name__ == "__main__":
+    main()
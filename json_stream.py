@@ -0,0 +1,127 @@
+"""
+Leitura incremental de arrays JSON (listagens de batalhas da API ou arquivos locais).
+Os elementos são decodificados um a um conforme o texto chega, de modo que a
+memória usada fica limitada a um elemento (uma batalha) por vez, e não ao
+conteúdo inteiro.
+"""
+
+import json
+
+# Constantes
+CHUNK_SIZE = 64 * 1024  # Tamanho dos blocos lidos do arquivo / da resposta
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+def iter_json_array(chunks):
+    """
+    Gera os elementos de um array JSON a partir de blocos de texto.
+
+    Se o conteúdo não for um array (por exemplo, um objeto de erro da API),
+    o valor inteiro é gerado como um único elemento.
+    """
+    chunks = iter(chunks)
+    buffer = ''
+    pos = 0
+    exhausted = False
+
+    def read_more(min_chars=1):
+        # Lê pelo menos min_chars caracteres novos; descarta o que já foi consumido
+        nonlocal buffer, pos, exhausted
+        parts = [buffer[pos:]]
+        added = 0
+        for chunk in chunks:
+            parts.append(chunk)
+            added += len(chunk)
+            if added >= min_chars:
+                break
+        else:
+            exhausted = True
+        buffer = ''.join(parts)
+        pos = 0
+        return added > 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buffer) or not read_more():
+                return
+
+    skip_whitespace()
+    if pos >= len(buffer):
+        return
+
+    if buffer[pos] != '[':
+        # Não é um array: decodificar o valor completo
+        while read_more():
+            pass
+        yield json.loads(buffer[pos:])
+        return
+
+    pos += 1
+    expect_value = True
+    count = 0
+    while True:
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise ValueError("Array JSON incompleto")
+
+        char = buffer[pos]
+        if char == ']':
+            if expect_value and count:
+                raise ValueError("Vírgula sobrando no array JSON")
+            return
+        if not expect_value:
+            if char != ',':
+                raise ValueError(f"Separador inesperado no array JSON: {char!r}")
+            pos += 1
+            expect_value = True
+            continue
+
+        # Decodificar o próximo elemento; se o texto acabar no meio dele, ler mais
+        while True:
+            try:
+                value, end = _decoder.raw_decode(buffer, pos)
+                # Um número no fim do buffer pode continuar no próximo bloco
+                if end < len(buffer) or exhausted:
+                    break
+            except json.JSONDecodeError:
+                if exhausted:
+                    raise
+            # Dobrar o trecho pendente a cada nova leitura mantém o custo linear
+            if not read_more(max(1, len(buffer) - pos)):
+                value, end = _decoder.raw_decode(buffer, pos)
+                break
+
+        pos = end
+        expect_value = False
+        count += 1
+        yield value
+
+
+def iter_json_file(path, chunk_size=CHUNK_SIZE):
+    """
+    Gera os elementos do array JSON guardado em um arquivo.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from iter_json_array(iter(lambda: f.read(chunk_size), ''))
+
+
+def iter_response_items(response, chunk_size=CHUNK_SIZE):
+    """
+    Gera os elementos do array JSON de uma resposta HTTP conforme o corpo é
+    recebido (use stream=True na requisição). A resposta é fechada ao final.
+    """
+    if response.encoding is None:
+        response.encoding = 'utf-8'
+    chunks = response.iter_content(chunk_size, decode_unicode=True)
+    try:
+        yield from iter_json_array(chunks)
+        # Consumir o restante do corpo (normalmente vazio) para concluir a leitura
+        for _ in chunks:
+            pass
+    finally:
+        response.close()
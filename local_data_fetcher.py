@@ -1,7 +1,7 @@
 import pandas as pd
-import json
 import logging
-from datetime import datetime
+from battle_normalizer import summarize_in_batches
+from json_stream import iter_json_file
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -19,78 +19,16 @@ def get_battle_data():
     try:
         logging.info(f"Lendo dados de batalhas do arquivo local: {DATA_FILE}")
         
-        # Abrir o arquivo JSON
-        with open(DATA_FILE, 'r') as f:
-            battles_data = json.load(f)
+        # Ler e processar as batalhas em lotes, sem carregar o JSON inteiro (ver battle_normalizer)
+        columns = ['battle_id', 'time', 'players', 'kills', 'deaths', 'fame', 'details']
+        summaries = []
+        total = 0
+        for summary, _, count in summarize_in_batches(iter_json_file(DATA_FILE), GUILD_ID):
+            summaries.append(summary[columns])
+            total += count
+        battles_df = pd.concat(summaries, ignore_index=True)
         
-        logging.info(f"Encontrados dados de {len(battles_data)} batalhas no arquivo")
-        
-        # Processar batalhas
-        processed_battles = []
-        
-        for battle in battles_data:
-            try:
-                # Extrair informações básicas
-                battle_id = battle['id']
-                battle_time = datetime.fromisoformat(battle['startTime'].replace('Z', '+00:00'))
-                total_fame = battle['totalFame']
-                
-                # Filtrar jogadores da guild
-                guild_players = [p for p in battle['players'] if p.get('guildId') == GUILD_ID]
-                
-                if guild_players:
-                    players_count = len(guild_players)
-                    guild_kills = sum(p.get('kills', 0) for p in guild_players)
-                    guild_deaths = sum(p.get('deaths', 0) for p in guild_players)
-                    
-                    # Agrupar por guild
-                    guilds_stats = {}
-                    
-                    for player in battle['players']:
-                        guild_name = player.get('guildName', 'Unknown')
-                        
-                        if guild_name not in guilds_stats:
-                            guilds_stats[guild_name] = {
-                                'players': [],
-                                'total_kills': 0,
-                                'total_deaths': 0,
-                                'total_fame': 0
-                            }
-                        
-                        player_stats = {
-                            'name': player.get('name', 'Unknown'),
-                            'kills': player.get('kills', 0),
-                            'deaths': player.get('deaths', 0),
-                            'fame': player.get('killFame', 0)
-                        }
-                        
-                        guilds_stats[guild_name]['players'].append(player_stats)
-                        guilds_stats[guild_name]['total_kills'] += player_stats['kills']
-                        guilds_stats[guild_name]['total_deaths'] += player_stats['deaths']
-                        guilds_stats[guild_name]['total_fame'] += player_stats['fame']
-                    
-                    # Criar objeto de detalhes
-                    battle_details = {
-                        'id': battle_id,
-                        'time': battle_time,
-                        'guilds': guilds_stats
-                    }
-                    
-                    # Adicionar à lista
-                    processed_battles.append({
-                        'battle_id': battle_id,
-                        'time': battle_time,
-                        'players': players_count,
-                        'kills': guild_kills,
-                        'deaths': guild_deaths,
-                        'fame': total_fame,
-                        'details': battle_details
-                    })
-            except Exception as e:
-                logging.error(f"Erro ao processar batalha: {e}")
-        
-        # Criar DataFrame
-        battles_df = pd.DataFrame(processed_battles)
+        logging.info(f"Encontrados dados de {total} batalhas no arquivo")
         logging.info(f"Processados dados de {len(battles_df)} batalhas com sucesso")
         
         return battles_df
@@ -0,0 +1,353 @@
+"""
+Perfis de jogadores (fama total, guild e aliança atuais) obtidos do
+endpoint /players/{id} da API gameinfo, com cache persistente.
+
+Os jogadores das batalhas novas da guild acompanhada entram em uma fila de
+pendentes durante a ingestão; enrich_pending_players busca os perfis em
+lote, em paralelo, e cada perfil é buscado no máximo uma vez por
+PROFILE_TTL. Assim os rankings mostram o histórico completo de centenas de
+membros sem uma requisição por linha. Cada região tem seu próprio cache.
+
+Uso:
+    python player_profiles.py                  # busca os perfis pendentes
+    python player_profiles.py --region europe --budget 60
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+
+from gameinfo_client import get_client
+from regions import current_region, region_path, submit_in_context, use_region
+from resilience import CircuitOpenError, Deadline
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Constantes
+PLAYER_PROFILES_FILE = os.path.join("cache", "players.json")  # Arquivo do cache de perfis
+PROFILE_TTL = 24 * 3600  # Validade (segundos) de um perfil obtido da API
+MISSING_TTL = 6 * 3600  # Validade (segundos) de um jogador que a API não encontrou
+PROFILE_FETCH_CONCURRENCY = 8  # Perfis buscados em paralelo
+PROFILE_REQUEST_TIMEOUT = 15  # Timeout (segundos) de cada requisição de perfil
+ENRICH_BUDGET = 60  # Segundos por rodada de enriquecimento; o que faltar fica pendente
+FLUSH_EVERY = 50  # Perfis obtidos entre gravações do cache em disco
+
+# Colunas de load_profiles (uma linha por jogador)
+PROFILE_COLUMNS = ['player_id', 'name', 'guild_id', 'guild_name', 'alliance_name',
+                   'kill_fame', 'death_fame', 'fame_ratio', 'pve_fame',
+                   'gathering_fame', 'crafting_fame', 'fetched_at']
+
+
+def _compact_profile(data):
+    """
+    Reduz a resposta de /players/{id} aos campos usados pelo app.
+    """
+    stats = data.get('LifetimeStatistics') or {}
+    gathering = (stats.get('Gathering') or {}).get('All') or {}
+    return {
+        'name': data.get('Name'),
+        'guild_id': data.get('GuildId') or None,
+        'guild_name': data.get('GuildName') or None,
+        'alliance_name': data.get('AllianceName') or None,
+        'kill_fame': data.get('KillFame') or 0,
+        'death_fame': data.get('DeathFame') or 0,
+        'fame_ratio': data.get('FameRatio') or 0,
+        'pve_fame': (stats.get('PvE') or {}).get('Total') or 0,
+        'gathering_fame': gathering.get('Total') or 0,
+        'crafting_fame': (stats.get('Crafting') or {}).get('Total') or 0,
+    }
+
+
+class PlayerProfileCache:
+    """
+    Perfis por ID de jogador e fila de IDs pendentes, gravados em disco. Thread-safe.
+    """
+
+    def __init__(self, path=PLAYER_PROFILES_FILE, ttl=PROFILE_TTL, missing_ttl=MISSING_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.profiles = {}
+        self.pending = set()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.profiles = data.get('profiles', {})
+            self.pending = set(data.get('pending', []))
+            logging.info(f"Cache de perfis carregado com {len(self.profiles)} jogadores")
+        except (OSError, ValueError) as e:
+            logging.warning(f"Cache de perfis inválido {self.path}, recomeçando: {e}")
+
+    def _is_fresh(self, entry, now):
+        ttl = self.ttl if entry.get('profile') else self.missing_ttl
+        return now - entry['fetched_at'] <= ttl
+
+    def get(self, player_id):
+        """
+        Perfil em cache do jogador (vencido ou não), ou None.
+        """
+        with self._lock:
+            entry = self.profiles.get(player_id)
+        return entry.get('profile') if entry else None
+
+    def stale_ids(self, player_ids):
+        """
+        IDs, entre os informados, sem perfil em cache ou com o perfil vencido.
+        """
+        now = time.time()
+        with self._lock:
+            return [player_id for player_id in dict.fromkeys(player_ids)
+                    if player_id not in self.profiles
+                    or not self._is_fresh(self.profiles[player_id], now)]
+
+    def queue(self, player_ids):
+        """
+        Acrescenta à fila de pendentes os jogadores cujo perfil precisa ser buscado.
+        Retorna quantos entraram na fila.
+        """
+        stale = self.stale_ids(player_ids)
+        with self._lock:
+            added = [player_id for player_id in stale if player_id not in self.pending]
+            self.pending.update(added)
+            if added:
+                self._dirty = True
+        return len(added)
+
+    def pending_ids(self):
+        with self._lock:
+            return list(self.pending)
+
+    def put(self, player_id, profile):
+        """
+        Registra o perfil obtido; profile=None indica jogador não encontrado.
+        """
+        with self._lock:
+            self.profiles[player_id] = {'profile': profile, 'fetched_at': time.time()}
+            self.pending.discard(player_id)
+            self._dirty = True
+
+    def discard(self, player_ids):
+        """
+        Remove da fila IDs que não precisam mais ser buscados (perfil ainda válido).
+        """
+        with self._lock:
+            before = len(self.pending)
+            self.pending.difference_update(player_ids)
+            if len(self.pending) != before:
+                self._dirty = True
+
+    def flush(self):
+        """
+        Grava o cache em disco se houver alterações.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {'profiles': dict(self.profiles), 'pending': sorted(self.pending)}
+            self._dirty = False
+        tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.error(f"Erro ao gravar cache de perfis: {e}")
+            with self._lock:
+                self._dirty = True
+
+
+_caches = {}
+_cache_lock = threading.Lock()
+
+
+def get_profile_cache(region=None):
+    """
+    Retorna o cache de perfis compartilhado do processo para a região
+    (por padrão, a do contexto atual).
+    """
+    region = region or current_region()
+    with _cache_lock:
+        cache = _caches.get(region)
+        if cache is None:
+            cache = _caches[region] = PlayerProfileCache(
+                region_path(PLAYER_PROFILES_FILE, region))
+    return cache
+
+
+def guild_player_ids(battle, guild_id):
+    """
+    IDs dos jogadores da guild em uma batalha bruta da API.
+    """
+    if not isinstance(battle, dict):
+        return []
+    players = battle.get('players') or {}
+    if isinstance(players, dict):
+        players = players.values()
+    return [player['id'] for player in players
+            if isinstance(player, dict) and player.get('guildId') == guild_id and player.get('id')]
+
+
+def queue_guild_players(battles, guild_id):
+    """
+    Coloca na fila de enriquecimento os jogadores da guild que aparecem nas
+    batalhas brutas, já aprovadas na validação (ver battle_schema.validate_battles).
+    """
+    player_ids = []
+    for battle in battles:
+        player_ids.extend(guild_player_ids(battle, guild_id))
+    if not player_ids:
+        return 0
+    cache = get_profile_cache()
+    added = cache.queue(player_ids)
+    if added:
+        cache.flush()
+        logging.info(f"{added} jogadores da guild {guild_id} aguardando busca de perfil")
+    return added
+
+
+def fetch_player_profile(player_id, deadline=None):
+    """
+    Busca o perfil de um jogador na API.
+
+    Retorna (True, perfil), (True, None) se o jogador não existe, ou
+    (False, None) se a busca falhou e deve ser repetida depois. Com o
+    circuito aberto, CircuitOpenError é propagada.
+    """
+    timeout = PROFILE_REQUEST_TIMEOUT
+    if deadline is not None:
+        remaining = deadline.remaining()
+        if remaining is not None:
+            if remaining <= 0:
+                return False, None
+            timeout = max(0.1, min(timeout, remaining))
+    try:
+        response = get_client().get('player', f"/players/{player_id}", timeout=timeout,
+                                    use_cache=False,
+                                    deadline=None if deadline is None else deadline.expires_at)
+        if response.status_code == 404:
+            return True, None
+        response.raise_for_status()
+        data = response.json()
+    except CircuitOpenError:
+        raise
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logging.warning(f"Erro ao buscar perfil do jogador {player_id}: {e}")
+        return False, None
+    if not isinstance(data, dict) or not data.get('Id'):
+        return True, None
+    return True, _compact_profile(data)
+
+
+def enrich_players(player_ids, budget=ENRICH_BUDGET, max_workers=PROFILE_FETCH_CONCURRENCY):
+    """
+    Busca, em paralelo, os perfis vencidos ou ausentes entre os jogadores
+    informados, cada um uma única vez. Os perfis obtidos são gravados no
+    cache; os que não couberem no prazo continuam pendentes.
+
+    Returns:
+        Número de perfis obtidos.
+    """
+    cache = get_profile_cache()
+    player_ids = list(dict.fromkeys(player_ids))
+    stale = cache.stale_ids(player_ids)
+    cache.discard(set(player_ids) - set(stale))
+    if not stale:
+        cache.flush()
+        return 0
+
+    deadline = Deadline(budget)
+    circuit_open = threading.Event()
+    fetched = 0
+    failed = 0
+    started = time.monotonic()
+
+    def fetch(player_id):
+        if deadline.expired() or circuit_open.is_set():
+            return player_id, False, None
+        try:
+            ok, profile = fetch_player_profile(player_id, deadline)
+        except CircuitOpenError as e:
+            if not circuit_open.is_set():
+                circuit_open.set()
+                logging.warning(f"Busca de perfis interrompida: {e}")
+            return player_id, False, None
+        return player_id, ok, profile
+
+    logging.info(f"Buscando perfis de {len(stale)} jogadores")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [submit_in_context(executor, fetch, player_id) for player_id in stale]
+        for future in futures:
+            player_id, ok, profile = future.result()
+            if not ok:
+                failed += 1
+                continue
+            cache.put(player_id, profile)
+            fetched += 1
+            if fetched % FLUSH_EVERY == 0:
+                cache.flush()
+
+    cache.flush()
+    logging.info(
+        f"Perfis: {fetched} obtidos, {failed} pendentes para a próxima rodada "
+        f"em {time.monotonic() - started:.1f}s")
+    return fetched
+
+
+def enrich_pending_players(budget=ENRICH_BUDGET, max_workers=PROFILE_FETCH_CONCURRENCY):
+    """
+    Busca os perfis da fila de pendentes (ver queue_guild_players).
+    """
+    return enrich_players(get_profile_cache().pending_ids(), budget, max_workers)
+
+
+def load_profiles(region=None):
+    """
+    Lê do disco os perfis em cache da região, um por linha (colunas PROFILE_COLUMNS).
+
+    Lê sempre o arquivo, e não o cache do processo, porque quem o atualiza é
+    o serviço de ingestão.
+    """
+    path = region_path(PLAYER_PROFILES_FILE, region)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            profiles = json.load(f).get('profiles', {})
+    except (OSError, ValueError):
+        return pd.DataFrame(columns=PROFILE_COLUMNS)
+
+    rows = [
+        {'player_id': player_id, 'fetched_at': entry['fetched_at'], **entry['profile']}
+        for player_id, entry in profiles.items() if entry.get('profile')
+    ]
+    return pd.DataFrame(rows, columns=PROFILE_COLUMNS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Busca os perfis de jogadores pendentes")
+    parser.add_argument('--region', default=None, help="Região (americas, europe, asia)")
+    parser.add_argument('--budget', type=float, default=ENRICH_BUDGET,
+                        help="Tempo máximo (segundos) da rodada")
+    args = parser.parse_args()
+
+    with use_region(args.region):
+        fetched = enrich_pending_players(args.budget)
+        print(f"{fetched} perfis obtidos, {len(get_profile_cache().pending_ids())} pendentes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Limitador de taxa compartilhado para as chamadas à API gameinfo.
+Implementa um token bucket adaptativo: a taxa cai pela metade a cada resposta
+429 (um pouco menos a cada 5xx ou erro de rede) e volta a subir aos poucos
+com as respostas bem sucedidas. O header Retry-After bloqueia novas
+requisições até o instante indicado. Também provê o backoff exponencial com jitter usado nas novas tentativas.
+
+As requisições têm prioridade: as interativas (disparadas por um usuário na
+interface) passam na frente das de fundo (atualizações agendadas, backfill,
+ingestão de eventos), que também deixam tokens de reserva para elas.
+"""
+
+import contextvars
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from regions import current_region
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Constantes
+DEFAULT_RATE = 5.0  # Requisições por segundo em regime normal
+DEFAULT_BURST = 10  # Requisições que podem sair de uma vez com o bucket cheio
+MIN_RATE = 0.5  # Taxa mínima depois de reduções sucessivas
+RATE_LIMIT_DECREASE = 0.5  # Fator aplicado à taxa a cada 429 (limite explícito da API)
+ERROR_DECREASE = 0.8  # Fator aplicado à taxa a cada 5xx ou erro de rede
+INCREASE_STEP = 0.05  # Aumento da taxa a cada resposta bem sucedida (fração da taxa máxima)
+DEFAULT_PENALTY = 1.0  # Pausa (segundos) após 429 sem Retry-After
+MAX_RETRY_AFTER = 120  # Limite para o Retry-After informado pelo servidor
+BACKOFF_CAP = 30.0  # Espera máxima (segundos) entre tentativas
+
+# Classes de prioridade (menor valor = atendida primeiro)
+PRIORITY_INTERACTIVE = 0  # Requisições disparadas por um usuário na interface
+PRIORITY_BACKGROUND = 1  # Atualizações agendadas, backfill e ingestão
+INTERACTIVE_RESERVE = 1  # Tokens que as requisições de fundo deixam no bucket para as interativas
+
+# Prioridade das requisições feitas no contexto atual (ver fetch_priority)
+_current_priority = contextvars.ContextVar('fetch_priority', default=PRIORITY_BACKGROUND)
+
+
+def current_priority():
+    """
+    Prioridade das requisições feitas no contexto atual.
+    """
+    return _current_priority.get()
+
+
+@contextmanager
+def fetch_priority(priority):
+    """
+    Define a prioridade das requisições feitas dentro do bloco with (na thread atual).
+    """
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def parse_retry_after(value):
+    """
+    Converte o header Retry-After (segundos ou data HTTP) em segundos de espera.
+    Retorna None se o valor for inválido.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        seconds = (retry_at - datetime.now(timezone.utc)).total_seconds()
+    return max(0.0, min(seconds, MAX_RETRY_AFTER))
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket thread-safe com taxa adaptativa (AIMD) e prioridades.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, min_rate=MIN_RATE,
+                 reserve=INTERACTIVE_RESERVE):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.burst = burst
+        self.reserve = max(0, min(reserve, burst - 1))
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._waiting = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 0}
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def _preempted(self, priority):
+        return any(count for waiting_priority, count in self._waiting.items()
+                   if waiting_priority < priority)
+
+    def acquire(self, timeout=None, priority=PRIORITY_BACKGROUND):
+        """
+        Aguarda um token para fazer uma requisição.
+        Enquanto houver requisições de prioridade maior esperando, as de
+        prioridade menor não recebem tokens.
+        Retorna False se o timeout (segundos) esgotar antes disso.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # As requisições de fundo só usam os tokens acima da reserva
+        needed = 1 if priority <= PRIORITY_INTERACTIVE else 1 + self.reserve
+        with self._cond:
+            self._waiting[priority] = self._waiting.get(priority, 0) + 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+
+                    if now < self._blocked_until:
+                        wait = self._blocked_until - now
+                    elif self._preempted(priority):
+                        # Aguardar as requisições prioritárias (notify_all ao saírem da fila)
+                        wait = 1 / self.rate
+                    elif self._tokens >= needed:
+                        self._tokens -= 1
+                        return True
+                    else:
+                        wait = (needed - self._tokens) / self.rate
+
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            return False
+                        wait = min(wait, remaining)
+
+                    self._cond.wait(wait)
+            finally:
+                self._waiting[priority] -= 1
+                if priority < PRIORITY_BACKGROUND:
+                    self._cond.notify_all()
+
+    def on_response(self, status_code, headers=None):
+        """
+        Ajusta a taxa conforme o status de uma resposta recebida.
+        """
+        if status_code == 429 or status_code >= 500:
+            retry_after = parse_retry_after((headers or {}).get('Retry-After'))
+            if retry_after is None and status_code == 429:
+                retry_after = DEFAULT_PENALTY
+            factor = RATE_LIMIT_DECREASE if status_code == 429 else ERROR_DECREASE
+            self._slow_down(f"HTTP {status_code}", factor, retry_after)
+        else:
+            with self._cond:
+                self.rate = min(self.max_rate, self.rate + INCREASE_STEP * self.max_rate)
+
+    def on_error(self):
+        """
+        Registra uma falha de rede (timeout, conexão recusada) como sinal de sobrecarga.
+        """
+        self._slow_down("erro de rede", ERROR_DECREASE)
+
+    def _slow_down(self, reason, factor, pause=None):
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * factor)
+            # Descartar o excesso acumulado para não disparar uma rajada logo em seguida
+            self._tokens = min(self._tokens, 1.0)
+            if pause:
+                self._blocked_until = max(self._blocked_until, now + pause)
+            self._cond.notify_all()
+        message = f"Limitador de taxa: {reason}, taxa reduzida para {self.rate:.2f} req/s"
+        if pause:
+            message += f", pausa de {pause:.1f}s"
+        logging.warning(message)
+
+
+def backoff_delay(attempt, base_delay=1.0, cap=BACKOFF_CAP):
+    """
+    Espera exponencial com jitter completo para a tentativa 'attempt' (começando em 0).
+    """
+    return random.uniform(0, min(cap, base_delay * (2 ** attempt)))
+
+
+def wait_before_retry(attempt, base_delay=1.0, deadline=None):
+    """
+    Dorme o tempo de backoff antes de uma nova tentativa.
+    Com deadline (instante de time.monotonic()), a espera nunca passa do prazo.
+    """
+    delay = backoff_delay(attempt, base_delay)
+    if deadline is not None:
+        delay = min(delay, max(0.0, deadline - time.monotonic()))
+    if delay > 0:
+        time.sleep(delay)
+
+
+_limiters = {}
+_limiter_lock = threading.Lock()
+
+
+def get_limiter(region=None):
+    """
+    Retorna o limitador compartilhado do processo para a API gameinfo da região
+    (cada servidor tem seus próprios limites de taxa).
+    """
+    region = region or current_region()
+    with _limiter_lock:
+        limiter = _limiters.get(region)
+        if limiter is None:
+            limiter = _limiters[region] = AdaptiveRateLimiter()
+    return limiter
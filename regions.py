@@ -0,0 +1,86 @@
+"""
+Regiões (servidores) do Albion Online e a região ativa de cada execução.
+
+Cada servidor (Americas, Europe, Asia) tem sua própria API gameinfo, com
+IDs de guilds e de batalhas independentes. Tudo que é obtido da API é
+gravado separado por região: a região padrão continua usando os caminhos
+originais e as demais ficam em regions/<região>/.
+
+A região das chamadas à API é a do contexto atual (ver use_region), herdada
+pelas threads iniciadas com submit_in_context.
+"""
+
+import contextvars
+import os
+from contextlib import contextmanager
+
+# Constantes
+# URL base da API gameinfo de cada servidor; pode ser substituída pela
+# variável de ambiente GAMEINFO_BASE_URL_<REGIÃO> (ex.: GAMEINFO_BASE_URL_EUROPE)
+REGIONS = {
+    'americas': "https://gameinfo.albiononline.com/api/gameinfo",
+    'europe': "https://gameinfo-ams.albiononline.com/api/gameinfo",
+    'asia': "https://gameinfo-sgp.albiononline.com/api/gameinfo",
+}
+DEFAULT_REGION = 'americas'  # Região dos dados já existentes (caminhos sem prefixo)
+REGIONS_DIR = "regions"  # Dados das demais regiões, um subdiretório por região
+
+_current_region = contextvars.ContextVar('gameinfo_region', default=DEFAULT_REGION)
+
+
+def validate_region(region):
+    """
+    Normaliza o nome da região; ValueError se ela não existir.
+    """
+    region = (region or DEFAULT_REGION).strip().lower()
+    if region not in REGIONS:
+        raise ValueError(f"Região desconhecida: {region} (disponíveis: {', '.join(REGIONS)})")
+    return region
+
+
+def current_region():
+    """
+    Região das chamadas à API feitas no contexto atual.
+    """
+    return _current_region.get()
+
+
+@contextmanager
+def use_region(region):
+    """
+    Define a região das chamadas à API e dos arquivos usados dentro do bloco with.
+    """
+    token = _current_region.set(validate_region(region))
+    try:
+        yield
+    finally:
+        _current_region.reset(token)
+
+
+def region_base_url(region=None):
+    """
+    URL base da API gameinfo da região (por padrão, a do contexto atual).
+    """
+    region = validate_region(region or current_region())
+    override = os.environ.get(f"GAMEINFO_BASE_URL_{region.upper()}")
+    if override is None and region == DEFAULT_REGION:
+        # Variável antiga, anterior ao suporte a várias regiões
+        override = os.environ.get("GAMEINFO_BASE_URL")
+    return override or REGIONS[region]
+
+
+def region_path(path, region=None):
+    """
+    Caminho de um arquivo ou diretório de dados na região (por padrão, a do contexto atual).
+    """
+    region = validate_region(region or current_region())
+    if region == DEFAULT_REGION:
+        return path
+    return os.path.join(REGIONS_DIR, region, path)
+
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    """
+    executor.submit que roda fn com o contexto atual (região e prioridade das requisições).
+    """
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
@@ -0,0 +1,175 @@
+"""
+Proteções para as chamadas à API gameinfo quando ela está lenta ou fora do ar:
+- CircuitBreaker: depois de falhas seguidas, recusa novas requisições
+  imediatamente (CircuitOpenError) e só volta a testar a API após um intervalo.
+- Deadline: orçamento de tempo total de uma atualização, usado para limitar
+  timeouts e novas tentativas.
+"""
+
+import logging
+import threading
+import time
+
+import requests
+
+from regions import current_region, DEFAULT_REGION
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Constantes
+FAILURE_THRESHOLD = 5  # Falhas seguidas para abrir o circuito
+COOLDOWN_SECONDS = 60  # Tempo com o circuito aberto antes de testar a API de novo
+
+# Estados do circuito
+CLOSED = "fechado"
+OPEN = "aberto"
+HALF_OPEN = "em teste"
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """
+    Requisição recusada sem acessar a rede porque o circuito está aberto.
+    Herda de RequestException para ser tratada como qualquer falha de rede.
+    """
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """
+    Requisição não enviada porque o orçamento de tempo da atualização acabou.
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker thread-safe.
+
+    Fechado: requisições passam normalmente. Após FAILURE_THRESHOLD falhas
+    seguidas, abre: requisições falham na hora. Depois de COOLDOWN_SECONDS,
+    uma única requisição de teste é liberada; se ela funcionar o circuito
+    fecha, senão volta a abrir por mais um intervalo.
+    """
+
+    def __init__(self, name="gameinfo", failure_threshold=FAILURE_THRESHOLD,
+                 cooldown=COOLDOWN_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """
+        Indica se uma requisição pode ser enviada agora.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                logging.info(f"Circuito {self.name}: testando a API novamente")
+                return True
+            return False
+
+    def is_open(self):
+        """
+        Indica se o circuito está recusando requisições (sem consumir o teste pendente).
+        """
+        with self._lock:
+            return self.state == OPEN and time.monotonic() - self._opened_at < self.cooldown
+
+    def retry_in(self):
+        """
+        Segundos até o circuito liberar a próxima requisição de teste (0 se fechado).
+        """
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+    def release_probe(self):
+        """
+        Devolve a requisição de teste liberada por allow_request() que acabou não sendo enviada.
+        """
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logging.info(f"Circuito {self.name} fechado: API respondendo normalmente")
+            self.state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logging.warning(
+                        f"Circuito {self.name} aberto após {self._failures} falha(s); "
+                        f"novo teste em {self.cooldown}s")
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+class Deadline:
+    """
+    Orçamento de tempo de uma operação. seconds=None significa sem limite.
+    """
+
+    def __init__(self, seconds=None):
+        self.seconds = seconds
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self):
+        """
+        Segundos restantes (None se não houver limite)
+        """
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def cap_timeout(self, timeout):
+        """
+        Limita um timeout de requisição (número ou tupla conexão/leitura) ao tempo restante.
+        Gera DeadlineExceeded se o orçamento já acabou.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        if remaining <= 0:
+            raise DeadlineExceeded("Orçamento de tempo da atualização esgotado")
+        if isinstance(timeout, tuple):
+            return tuple(min(value, remaining) for value in timeout)
+        return min(timeout, remaining)
+
+
+_breakers = {}
+_breaker_lock = threading.Lock()
+
+
+def get_breaker(region=None):
+    """
+    Retorna o circuit breaker compartilhado do processo para a API gameinfo da região
+    (uma região fora do ar não bloqueia as demais).
+    """
+    region = region or current_region()
+    with _breaker_lock:
+        breaker = _breakers.get(region)
+        if breaker is None:
+            name = "gameinfo" if region == DEFAULT_REGION else f"gameinfo-{region}"
+            breaker = _breakers[region] = CircuitBreaker(name)
+    return breaker
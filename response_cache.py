@@ -0,0 +1,300 @@
+"""
+Cache em disco das respostas HTTP da API gameinfo.
+Cada resposta é guardada por URL + parâmetros, com validade (TTL) definida por
+tipo de endpoint. Respostas vencidas que trazem ETag ou Last-Modified são
+revalidadas com uma requisição condicional em vez de baixadas de novo.
+
+Cada entrada tem dois arquivos: os metadados ({chave}.json) e o corpo da
+resposta ({chave}.body). Respostas lidas em streaming são gravadas no cache
+conforme o corpo é consumido.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from battle_time import parse_time
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Constantes
+CACHE_DIR = os.path.join("cache", "http")  # Diretório das respostas em cache
+
+# Validade (segundos) das respostas de cada tipo de endpoint
+ENDPOINT_TTLS = {
+    'search': 24 * 3600,      # Busca de guilds: IDs quase nunca mudam
+    'battles': 120,           # Listagem de batalhas: muda a todo momento
+    'battle': 24 * 3600,      # Batalha encerrada: a cópia permanente fica em battle_store
+    'battle_open': 60,        # Batalha ainda em andamento
+    'default': 60
+}
+
+# Headers de resposta guardados junto com o corpo
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+def battle_is_finished(battle, now=None):
+    """
+    Indica se uma batalha bruta da API já foi encerrada (passou do seu 'timeout').
+    """
+    timeout_str = battle.get('timeout') if isinstance(battle, dict) else None
+    if not timeout_str:
+        return False
+    try:
+        return parse_time(timeout_str) <= (now or datetime.now(timezone.utc))
+    except (TypeError, ValueError):
+        return False
+
+
+class ResponseCache:
+    """
+    Cache de respostas em disco, com metadados e corpo em arquivos separados.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, ttls=None):
+        self.cache_dir = cache_dir
+        self.ttls = dict(ENDPOINT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+
+    @staticmethod
+    def make_key(url, params=None):
+        """
+        Gera a chave do cache a partir da URL e dos parâmetros já normalizados
+        """
+        full_url = requests.Request('GET', url, params=params).prepare().url
+        return hashlib.sha256(full_url.encode('utf-8')).hexdigest(), full_url
+
+    def _meta_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _body_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.body")
+
+    def ttl_for(self, endpoint, body):
+        """
+        Calcula a validade de uma resposta conforme o endpoint.
+        Batalhas em andamento têm validade curta, pois ainda podem mudar.
+        """
+        if endpoint == 'battle':
+            try:
+                if battle_is_finished(json.loads(body)):
+                    return self.ttls['battle']
+            except ValueError:
+                pass
+            return self.ttls['battle_open']
+        return self.ttls.get(endpoint, self.ttls['default'])
+
+    def load(self, key):
+        """
+        Lê os metadados de uma entrada; retorna None se não existir ou estiver incompleta
+        """
+        path = self._meta_path(key)
+        if not os.path.exists(path) or not os.path.exists(self._body_path(key)):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            entry['key'] = key
+            return entry
+        except Exception as e:
+            logging.warning(f"Entrada de cache inválida {path}: {e}")
+            return None
+
+    def read_body(self, key):
+        with open(self._body_path(key), 'rb') as f:
+            return f.read()
+
+    def store(self, key, full_url, endpoint, response):
+        """
+        Salva uma resposta 200 já lida por completo e retorna a entrada gravada
+        """
+        writer = self.begin_stream(key, full_url, endpoint, response)
+        writer.write(response.content)
+        return writer.commit()
+
+    def begin_stream(self, key, full_url, endpoint, response):
+        """
+        Inicia a gravação de uma resposta lida em streaming.
+        O corpo só passa a valer no cache quando commit() é chamado.
+        """
+        return _CacheWriter(self, key, full_url, endpoint, response)
+
+    def _commit(self, key, full_url, endpoint, response, body_tmp_path):
+        body = b''
+        if endpoint == 'battle':
+            with open(body_tmp_path, 'rb') as f:
+                body = f.read()
+        ttl = self.ttl_for(endpoint, body)
+        now = time.time()
+        entry = {
+            'url': full_url,
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'headers': {name: response.headers[name] for name in STORED_HEADERS
+                        if name in response.headers},
+            'stored_at': now,
+            'expires_at': now + ttl
+        }
+        os.replace(body_tmp_path, self._body_path(key))
+        self._write_meta(key, entry)
+        entry['key'] = key
+        return entry
+
+    def touch(self, key, entry, endpoint, response):
+        """
+        Renova a validade de uma entrada após uma revalidação 304
+        """
+        for name in ('ETag', 'Last-Modified'):
+            if name in response.headers:
+                entry['headers'][name] = response.headers[name]
+        entry['expires_at'] = time.time() + self.ttl_for(endpoint, self.read_body(key))
+        self._write_meta(key, entry)
+        return entry
+
+    def _write_meta(self, key, entry):
+        path = self._meta_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({k: v for k, v in entry.items() if k != 'key'}, f)
+        # Substituição atômica para leitores concorrentes
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def is_fresh(entry):
+        return entry is not None and entry.get('expires_at', 0) > time.time()
+
+    @staticmethod
+    def conditional_headers(entry):
+        """
+        Headers de revalidação condicional (If-None-Match / If-Modified-Since)
+        """
+        headers = {}
+        if entry is None:
+            return headers
+        if 'ETag' in entry['headers']:
+            headers['If-None-Match'] = entry['headers']['ETag']
+        if 'Last-Modified' in entry['headers']:
+            headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+        return headers
+
+    def to_response(self, entry):
+        """
+        Reconstrói um requests.Response a partir de uma entrada do cache
+        """
+        response = requests.Response()
+        response.status_code = entry['status']
+        response._content = self.read_body(entry['key'])
+        response._content_consumed = True
+        response.encoding = 'utf-8'
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.url = entry['url']
+        response.from_cache = True
+        return response
+
+    def purge_expired(self):
+        """
+        Remove do disco as entradas vencidas sem dados de revalidação.
+        Retorna o número de entradas removidas.
+        """
+        removed = 0
+        if not os.path.exists(self.cache_dir):
+            return removed
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                key = name[:-len('.json')]
+                entry = self.load(key)
+                if entry is not None and (self.is_fresh(entry) or self.conditional_headers(entry)):
+                    continue
+                for path in (self._meta_path(key), self._body_path(key)):
+                    try:
+                        if os.path.exists(path):
+                            os.remove(path)
+                    except OSError as e:
+                        logging.error(f"Erro ao remover entrada de cache {path}: {e}")
+                removed += 1
+        logging.info(f"Cache HTTP: {removed} entradas vencidas removidas")
+        return removed
+
+
+class _CacheWriter:
+    """
+    Grava o corpo de uma resposta em um arquivo temporário até o commit.
+    """
+
+    def __init__(self, cache, key, full_url, endpoint, response):
+        self.cache = cache
+        self.key = key
+        self.full_url = full_url
+        self.endpoint = endpoint
+        self.response = response
+        body_path = cache._body_path(key)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        self.tmp_path = f"{body_path}.{threading.get_ident()}.tmp"
+        self._file = open(self.tmp_path, 'wb')
+        self.done = False
+
+    def write(self, chunk):
+        self._file.write(chunk)
+
+    def commit(self):
+        self.done = True
+        self._file.close()
+        try:
+            return self.cache._commit(self.key, self.full_url, self.endpoint,
+                                      self.response, self.tmp_path)
+        except Exception as e:
+            logging.error(f"Erro ao salvar resposta no cache: {e}")
+            self.abort()
+            return None
+
+    def abort(self):
+        self.done = True
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class CachingRaw:
+    """
+    Envolve o corpo bruto (urllib3) de uma resposta em streaming e grava uma
+    cópia no cache à medida que ele é lido. A entrada só é confirmada se o
+    corpo for lido até o fim.
+    """
+
+    def __init__(self, raw, writer):
+        self._raw = raw
+        self._writer = writer
+
+    def stream(self, amt=2 ** 16, decode_content=None):
+        completed = False
+        try:
+            for chunk in self._raw.stream(amt, decode_content=decode_content):
+                self._writer.write(chunk)
+                yield chunk
+            completed = True
+        finally:
+            if completed:
+                self._writer.commit()
+            else:
+                self._writer.abort()
+
+    def close(self):
+        # Corpo abandonado antes do fim: descartar a cópia parcial
+        if not self._writer.done:
+            self._writer.abort()
+        self._raw.close()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+import backfill
+from backfill import backfill_guild, has_pending_backfill, needs_backfill
+from battle_history_manager import get_guild_history_file
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def empty_listing(*args, **kwargs):
+    yield from ()
+
+
+def test_guild_without_battles_is_not_backfilled_again(monkeypatch):
+    monkeypatch.setattr(backfill, '_fetch_battles_page', empty_listing)
+    assert needs_backfill('sem-batalhas')
+
+    backfill_df = backfill_guild('sem-batalhas', shards=2)
+
+    assert backfill_df is not None and backfill_df.empty
+    assert not os.path.exists(get_guild_history_file('sem-batalhas'))
+    assert not has_pending_backfill('sem-batalhas')
+    assert not needs_backfill('sem-batalhas')
+
+
+def test_interrupted_backfill_is_still_needed(monkeypatch):
+    monkeypatch.setattr(backfill, '_fetch_battles_page', lambda *args, **kwargs: None)
+    assert backfill_guild('falhou', shards=1) is None
+    assert needs_backfill('falhou')
+
+
+def test_existing_history_counts_as_backfilled():
+    history_file = get_guild_history_file('antiga')
+    os.makedirs(os.path.dirname(history_file) or '.', exist_ok=True)
+    with open(history_file, 'w', encoding='utf-8') as f:
+        f.write('[]')
+    assert not needs_backfill('antiga')
@@ -0,0 +1,129 @@
+from datetime import datetime, timezone
+
+import pandas as pd
+import pytest
+
+import battle_schema
+from battle_normalizer import (BATTLE_COLUMNS, PLAYER_COLUMNS, UNKNOWN_NAME, details_for_battle,
+                               normalize_battles, summarize_guild_battles, summarize_in_batches)
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    # A quarentena das batalhas reprovadas é gravada no diretório atual
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(battle_schema, '_quarantines', {})
+
+
+def player(player_id, guild_id, guild_name, kills=0, deaths=0, fame=0, **fields):
+    return {'id': player_id, 'name': f"Jogador {player_id}", 'guildId': guild_id,
+            'guildName': guild_name, 'kills': kills, 'deaths': deaths, 'killFame': fame, **fields}
+
+
+def battle(battle_id, players, **fields):
+    return {'id': battle_id, 'startTime': '2024-05-01T10:00:00.123Z',
+            'endTime': '2024-05-01T10:30:00Z', 'totalFame': 1000, 'totalKills': 5,
+            'players': {p['id']: p for p in players}, **fields}
+
+
+RAW = [
+    battle(10, [player('a', 'g1', 'Guild 1', kills=2, fame=60),
+                player('b', 'g2', 'Guild 2', kills=1, deaths=1, fame=40),
+                player('c', 'g1', 'Guild 1', deaths=1)]),
+    battle(20, [player('d', 'g2', 'Guild 2', kills=3, fame=90)],
+           timeout='2024-05-01T11:00:00Z'),
+    battle(30, [player('e', 'g1', 'Guild 1', kills=1, fame=10)]),
+]
+
+
+def test_normalize_builds_one_row_per_battle_and_per_player():
+    battles, players = normalize_battles(RAW)
+
+    assert list(battles.columns) == BATTLE_COLUMNS
+    assert battles['battle_id'].tolist() == [10, 20, 30]
+    assert battles['total_players'].tolist() == [3, 1, 1]
+    assert battles['finished'].tolist() == [False, True, False]
+    assert battles['time'].iloc[0] == datetime(2024, 5, 1, 10, 0, 0, 123000, tzinfo=timezone.utc)
+
+    assert list(players.columns) == PLAYER_COLUMNS
+    assert players['battle_id'].tolist() == [10, 10, 10, 20, 30]
+    assert players['player_id'].tolist() == ['a', 'b', 'c', 'd', 'e']
+    assert players['kill_fame'].tolist() == [60, 40, 0, 90, 10]
+
+
+def test_normalize_accepts_json_text_and_skips_invalid_battles():
+    import json
+    raw = [json.dumps(RAW[0]), '{não é json', {'id': 'x', 'startTime': 'ontem', 'players': []}]
+    battles, players = normalize_battles(raw)
+    assert battles['battle_id'].tolist() == [10]
+    assert len(players) == 3
+    assert len(battle_schema.get_quarantine().entries()) == 2
+
+
+def test_missing_player_and_guild_names_become_unknown():
+    nameless = player('b', None, None, kills=1)
+    del nameless['name']
+    battles, players = normalize_battles([battle(10, [player('a', 'g1', 'Guild 1'), nameless])])
+    assert players['name'].tolist() == ['Jogador a', UNKNOWN_NAME]
+    assert players['guild_name'].tolist() == ['Guild 1', UNKNOWN_NAME]
+
+
+def test_missing_counts_become_zero():
+    raw = player('a', 'g1', 'Guild 1')
+    del raw['kills'], raw['killFame']
+    _, players = normalize_battles([battle(10, [raw])])
+    assert players['kills'].tolist() == [0]
+    assert players['kill_fame'].tolist() == [0]
+
+
+def test_summary_keeps_only_battles_with_the_guild():
+    summary, approved = summarize_guild_battles(RAW + [{'id': 0}], 'g1')
+    assert approved == RAW
+    assert summary['battle_id'].tolist() == [10, 30]
+    assert summary['players'].tolist() == [2, 1]
+    assert summary['kills'].tolist() == [2, 1]
+    assert summary['deaths'].tolist() == [1, 0]
+    assert summary['guild_fame'].tolist() == [60, 10]
+    assert summary['fame'].tolist() == [1000, 1000]
+
+
+def test_details_group_players_by_guild():
+    details = details_for_battle(RAW[0])
+    assert details['id'] == 10
+    assert set(details['guilds']) == {'Guild 1', 'Guild 2'}
+    guild = details['guilds']['Guild 1']
+    assert [p['name'] for p in guild['players']] == ['Jogador a', 'Jogador c']
+    assert (guild['total_kills'], guild['total_deaths'], guild['total_fame']) == (2, 1, 60)
+
+    only_g2 = details_for_battle(RAW[0], guild_ids=['g2'])
+    assert list(only_g2['guilds']) == ['Guild 2']
+
+
+def test_details_for_invalid_battle_is_none():
+    assert details_for_battle({'id': -1}) is None
+
+
+def test_batches_read_lazily_and_match_one_pass():
+    read = []
+
+    def stream():
+        for raw in RAW:
+            read.append(raw['id'])
+            yield raw
+
+    batches = summarize_in_batches(stream(), 'g1', batch_size=2)
+    first, approved, count = next(batches)
+    assert read == [10, 20] and count == 2
+    assert [b['id'] for b in approved] == [10, 20]
+
+    rest = list(batches)
+    assert [count for _, _, count in rest] == [1]
+    combined = pd.concat([first] + [summary for summary, _, _ in rest], ignore_index=True)
+    expected, _ = summarize_guild_battles(RAW, 'g1')
+    pd.testing.assert_frame_equal(combined, expected)
+
+
+def test_batches_of_empty_stream_yield_one_empty_summary():
+    batches = list(summarize_in_batches(iter(()), 'g1'))
+    assert len(batches) == 1
+    assert batches[0][0].empty and batches[0][2] == 0
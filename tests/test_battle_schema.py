@@ -0,0 +1,91 @@
+import pytest
+
+import battle_schema
+from battle_schema import Quarantine, battle_error, get_quarantine, validate_battles
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(battle_schema, '_quarantines', {})
+
+
+def player(player_id, **fields):
+    return {'id': player_id, 'name': 'Ana', 'guildId': 'g1', 'guildName': 'Guild 1',
+            'kills': 1, 'deaths': 0, 'killFame': 10, **fields}
+
+
+def battle(battle_id, players=None, **fields):
+    players = [player(f"p{battle_id}")] if players is None else players
+    return {'id': battle_id, 'startTime': '2024-05-01T10:00:00Z', 'players': players, **fields}
+
+
+@pytest.mark.parametrize('raw, reason', [
+    ('{"id": 1', "texto que não é JSON válido"),
+    ([1, 2], "batalha não é um objeto JSON (list)"),
+    (battle(0), "'id' inválido: 0"),
+    (battle(True), "'id' inválido: True"),
+    (battle('7'), "'id' inválido: '7'"),
+    (battle(1, startTime=None), "'startTime' ausente ou não é texto"),
+    ({'id': 1, 'startTime': '2024-05-01T10:00:00Z'}, "'players' ausente ou não é lista/objeto"),
+    (battle(1, players='a,b'), "'players' ausente ou não é lista/objeto"),
+    (battle(1, totalFame=-5), "'totalFame' não é um inteiro não negativo: -5"),
+    (battle(1, totalKills=2.5), "'totalKills' não é um inteiro não negativo: 2.5"),
+])
+def test_battle_error_reasons(raw, reason):
+    assert battle_error(raw) == reason
+
+
+def test_valid_battle_has_no_error():
+    assert battle_error(battle(1, totalFame=None, players={})) is None
+
+
+def test_approved_battles_keep_order_and_aligned_player_columns():
+    raw = [
+        battle(1, [player('a'), player('b')]),
+        battle(2, [player('c', kills=-1)]),
+        battle(-3),
+        battle(4, {'d': player('d'), 'e': player('e'), 'f': player('f')}),
+    ]
+    approved, columns, counts = validate_battles(raw)
+
+    assert [b['id'] for b in approved] == [1, 4]
+    assert approved[0] is raw[0]
+    assert counts.tolist() == [2, 3]
+    assert columns['id'].tolist() == ['a', 'b', 'd', 'e', 'f']
+    assert columns['kills'].tolist() == [1] * 5
+
+
+@pytest.mark.parametrize('players, reason', [
+    (['não é jogador', player('x', kills=-1)], "jogador não é um objeto JSON"),
+    ([player(''), player('x', name=5)], "jogador sem 'id' de texto"),
+    ([player('x', name=5, kills=-1)], "'name' de jogador não é texto"),
+    ([player('x', guildId=3)], "'guildId' de jogador não é texto"),
+    ([player('x', killFame=1.5, deaths=-1)], "'deaths' de jogador não é um inteiro não negativo"),
+])
+def test_first_failing_player_check_defines_the_reason(players, reason):
+    approved, _, _ = validate_battles([battle(1, players, startTime='inválido')])
+    assert approved == []
+    assert [entry['reason'] for entry in get_quarantine().entries()] == [reason]
+
+
+def test_invalid_start_time_is_rejected_after_player_checks():
+    approved, _, _ = validate_battles([battle(1, startTime='ontem à noite')])
+    assert approved == []
+    assert get_quarantine().entries()[0]['reason'] == "'startTime' não é um horário válido"
+
+
+def test_quarantine_records_battle_level_rejections_first():
+    validate_battles([battle(1, [player('a', kills='3')]), battle(-2), battle(3)])
+    entries = get_quarantine().entries()
+    assert [entry['battle_id'] for entry in entries] == [-2, 1]
+
+
+def test_quarantine_keeps_each_battle_once(tmp_path):
+    validate_battles([battle(-2)])
+    validate_battles([battle(-2), battle(-2)])
+    assert len(get_quarantine().entries()) == 1
+
+    reloaded = Quarantine(get_quarantine().path)
+    assert reloaded.contains(-2)
+    assert reloaded.add([(battle(-2), "de novo")]) == 0
@@ -0,0 +1,158 @@
+import pickle
+from datetime import datetime, timezone
+
+import pandas as pd
+import pytest
+
+import battle_schema
+from battle_normalizer import build_details, normalize_battles
+from battle_tables import (BattleDetails, DetailsTable, compact_details, details_views,
+                           guild_matcher, guild_totals, player_totals)
+from data_processor import get_battles_with_min_members
+
+TIME = datetime(2024, 5, 1, 10, tzinfo=timezone.utc)
+
+
+def guild(players):
+    return {
+        'players': [{'name': name, 'kills': kills, 'deaths': deaths, 'fame': fame}
+                    for name, kills, deaths, fame in players],
+        'total_kills': sum(p[1] for p in players),
+        'total_deaths': sum(p[2] for p in players),
+        'total_fame': sum(p[3] for p in players),
+    }
+
+
+DETAILS = [
+    {'id': 1, 'time': TIME, 'guilds': {
+        'We Profit': guild([('Ana', 3, 0, 300), ('Bia', 1, 1, 50)]),
+        'Rivais': guild([('Caio', 0, 2, 0)]),
+    }},
+    {'id': 2, 'time': TIME, 'guilds': {}},
+    None,
+    {'id': 3, 'time': TIME, 'guilds': {
+        'Rivais': guild([('Caio', 2, 0, 120), ('Ana', 0, 0, 0)]),
+        'We Profit': guild([('Ana', 0, 1, 0)]),
+    }},
+]
+
+
+def test_compact_details_round_trip():
+    compact = compact_details(DETAILS)
+    assert compact[2] is None
+    assert all(isinstance(details, BattleDetails) for i, details in enumerate(compact) if i != 2)
+    assert [details.to_dict() if details is not None else None for details in compact] == DETAILS
+    # O mesmo conteúdo também pela interface de dicionário
+    assert compact[0]['guilds']['We Profit']['players'] == DETAILS[0]['guilds']['We Profit']['players']
+    assert compact[3]['guilds']['Rivais']['total_fame'] == 120
+    assert list(compact[3]['guilds']) == ['Rivais', 'We Profit']
+
+
+def test_battle_details_behaves_like_a_dict():
+    details = compact_details(DETAILS)[0]
+    assert list(details) == ['id', 'time', 'guilds']
+    assert len(details) == 3
+    assert details['id'] == 1
+    assert dict(details['guilds']['Rivais']) == DETAILS[0]['guilds']['Rivais']
+
+    details['extra'] = 'x'
+    assert details['extra'] == 'x'
+    del details['extra']
+    assert 'extra' not in details
+    with pytest.raises(KeyError):
+        details['guilds']['Rivais']['desconhecido']
+
+    # Um 'guilds' atribuído substitui o da tabela
+    details['guilds'] = {}
+    assert details.to_dict() == {'id': 1, 'time': TIME, 'guilds': {}}
+
+
+def test_tables_keep_their_own_strings():
+    first = compact_details(DETAILS)[0].table
+    second = compact_details([{'id': 9, 'time': TIME, 'guilds': {'Outra': guild([('Zé', 1, 0, 1)])}}])[0].table
+    assert first.strings == ['We Profit', 'Rivais', 'Ana', 'Bia', 'Caio']
+    assert second.strings == ['Outra', 'Zé']
+
+
+def test_pickle_round_trip_keeps_shared_table():
+    compact = compact_details(DETAILS)
+    restored = pickle.loads(pickle.dumps(compact))
+    assert restored[0].table is restored[3].table
+    assert [details.to_dict() if details is not None else None for details in restored] == DETAILS
+
+
+def test_views_from_frames_match_build_details(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(battle_schema, '_quarantines', {})
+    raw = [{'id': 5, 'startTime': '2024-05-01T10:00:00Z', 'players': [
+        {'id': 'a', 'name': 'Ana', 'guildId': 'g1', 'guildName': 'We Profit', 'kills': 2,
+         'deaths': 0, 'killFame': 40},
+        {'id': 'c', 'name': 'Caio', 'guildId': 'g2', 'guildName': 'Rivais', 'kills': 0,
+         'deaths': 1, 'killFame': 0},
+        {'id': 'b', 'name': 'Bia', 'guildId': 'g1', 'guildName': 'We Profit', 'kills': 1,
+         'deaths': 1, 'killFame': 10},
+    ]}]
+    battles, players = normalize_battles(raw)
+    views = details_views(battles, players)
+    assert {battle_id: view.to_dict() for battle_id, view in views.items()} == \
+        build_details(battles, players)
+    assert isinstance(DetailsTable.from_frames(battles, players, ['g2']), DetailsTable)
+
+
+def test_totals_group_players_and_guilds():
+    details = pd.Series(compact_details([d for d in DETAILS if d is not None]))
+    players = player_totals(details, guild_matcher('we profit'))
+    assert players.to_dict('records') == [
+        {'name': 'Ana', 'player_id': None, 'kills': 3, 'deaths': 1, 'fame': 300, 'battles': 2},
+        {'name': 'Bia', 'player_id': None, 'kills': 1, 'deaths': 1, 'fame': 50, 'battles': 1},
+    ]
+    guilds = guild_totals(details, lambda name: name == 'Rivais')
+    assert guilds.to_dict('records') == [
+        {'name': 'Rivais', 'kills': 2, 'deaths': 2, 'fame': 120, 'battles': 2}]
+
+
+def test_player_totals_group_by_player_id():
+    def with_ids(players):
+        stats = guild([player[1:] for player in players])
+        for record, player in zip(stats['players'], players):
+            if player[0] is not None:
+                record['id'] = player[0]
+        return stats
+
+    details = compact_details([
+        # Mais recente: Ana trocou de nome
+        {'id': 3, 'time': TIME, 'guilds': {'We Profit': with_ids([('p-ana', 'Ana2', 1, 0, 10)])}},
+        {'id': 2, 'time': TIME, 'guilds': {'We Profit': with_ids([('p-ana', 'Ana', 2, 1, 20),
+                                                                  ('p-bia', 'Bia', 0, 1, 0)])}},
+        # Histórico antigo, sem IDs
+        {'id': 1, 'time': TIME, 'guilds': {'We Profit': with_ids([(None, 'Bia', 1, 0, 5),
+                                                                  (None, 'Caio', 1, 1, 1)])}},
+    ])
+    assert details[1]['guilds']['We Profit']['players'][0] == \
+        {'id': 'p-ana', 'name': 'Ana', 'kills': 2, 'deaths': 1, 'fame': 20}
+
+    players = player_totals(pd.Series(details), guild_matcher('we profit'))
+    assert players.to_dict('records') == [
+        {'name': 'Ana2', 'player_id': 'p-ana', 'kills': 3, 'deaths': 1, 'fame': 30, 'battles': 2},
+        {'name': 'Bia', 'player_id': 'p-bia', 'kills': 1, 'deaths': 1, 'fame': 5, 'battles': 2},
+        {'name': 'Caio', 'player_id': None, 'kills': 1, 'deaths': 1, 'fame': 1, 'battles': 1},
+    ]
+
+
+def test_battles_with_min_members_has_a_fresh_index():
+    now = pd.Timestamp.now(tz='UTC')
+    battles_df = pd.DataFrame({
+        'battle_id': [1, 2, 3],
+        'time': [now, now, now],
+        'details': compact_details([
+            {'id': 1, 'time': TIME, 'guilds': {'We Profit': guild([('Ana', 1, 0, 1)])}},
+            {'id': 2, 'time': TIME, 'guilds': {'Rivais': guild([('Caio', 1, 0, 1)]),
+                                               'We Profit': guild([('Ana', 1, 0, 1),
+                                                                   ('Bia', 1, 0, 1)])}},
+            {'id': 3, 'time': TIME, 'guilds': {'We Profit': guild([('Bia', 1, 0, 1),
+                                                                   ('Ana', 1, 0, 1)])}},
+        ]),
+    })
+    selected = get_battles_with_min_members(battles_df, 'We Profit', min_members=2)
+    assert selected['battle_id'].tolist() == [2, 3]
+    assert selected.index.tolist() == [0, 1]
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from battle_time import TIME_DTYPE, parse_time, parse_times, server_day, within_days
+
+
+def utc(*args):
+    return pd.Timestamp(datetime(*args, tzinfo=timezone.utc))
+
+
+def test_parse_times_accepts_api_and_history_formats():
+    times = parse_times([
+        '2024-05-01T10:00:00Z',
+        '2024-05-01T10:00:00.123456789Z',
+        '2024-05-01T07:00:00-03:00',
+        '2024-05-01 10:00:00',
+        '2024-05-01T10:00:00+00:00',
+    ])
+    assert str(times.dtype) == TIME_DTYPE
+    assert times.iloc[0] == utc(2024, 5, 1, 10)
+    assert times.iloc[1].nanosecond == 789
+    assert times.iloc[1].floor('s') == utc(2024, 5, 1, 10)
+    assert times.iloc[2] == utc(2024, 5, 1, 10)
+    assert times.iloc[3] == utc(2024, 5, 1, 10)
+    assert times.iloc[4] == utc(2024, 5, 1, 10)
+
+
+def test_parse_times_accepts_datetime_objects_and_marks_invalid_as_nat():
+    times = parse_times([datetime(2024, 5, 1, 10), utc(2024, 5, 1, 11), None, 'ontem', 42.5])
+    assert times.iloc[0] == utc(2024, 5, 1, 10)
+    assert times.iloc[1] == utc(2024, 5, 1, 11)
+    assert times.iloc[2:].isna().all()
+
+
+def test_parse_times_keeps_the_series_index():
+    values = pd.Series(['2024-05-01T10:00:00Z', 'x'], index=[7, 3])
+    times = parse_times(values)
+    assert times.index.tolist() == [7, 3]
+    assert pd.isna(times.loc[3])
+
+
+def test_parse_times_converts_datetime_columns():
+    naive = pd.Series(pd.to_datetime(['2024-05-01 10:00']))
+    aware = naive.dt.tz_localize('America/Sao_Paulo')
+    assert parse_times(naive).iloc[0] == utc(2024, 5, 1, 10)
+    assert parse_times(aware).iloc[0] == utc(2024, 5, 1, 13)
+    assert str(parse_times(aware).dtype) == TIME_DTYPE
+
+
+def test_parse_time_single_value():
+    assert parse_time('2024-05-01T10:00:00Z') == utc(2024, 5, 1, 10)
+    assert parse_time(datetime(2024, 5, 1, 10)) == utc(2024, 5, 1, 10)
+    assert parse_time('não é data') is pd.NaT
+    assert parse_time(None) is pd.NaT
+
+
+def test_within_days_and_server_day():
+    now = utc(2024, 5, 10, 12)
+    times = [now - timedelta(days=1), now - timedelta(days=8), None]
+    assert within_days(times, 7, now=now).tolist() == [True, False, False]
+    assert server_day(['2024-05-01T23:59:59Z']).iloc[0] == pd.Timestamp('2024-05-01')
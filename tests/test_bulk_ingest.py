@@ -0,0 +1,60 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import pytest
+
+import battle_schema
+import bulk_ingest as bulk_ingest_module
+from bulk_ingest import bulk_ingest
+from regions import region_path, use_region
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(battle_schema, '_quarantines', {})
+
+
+def raw_battle(battle_id, guild_id='g1'):
+    return {'id': battle_id, 'startTime': '2024-05-01T10:00:00Z', 'totalFame': 100,
+            'players': [{'id': f"p{battle_id}", 'name': 'Ana', 'guildId': guild_id,
+                         'guildName': 'Guild 1', 'kills': 1, 'deaths': 0, 'killFame': 100}]}
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_pool_workers_write_to_the_callers_region(tmp_path, monkeypatch, workers):
+    # Com spawn (e forkserver) os processos não herdam o contexto de quem os criou
+    monkeypatch.setattr(bulk_ingest_module, 'ProcessPoolExecutor',
+                        partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context('spawn')))
+    path = tmp_path / 'dump.jsonl'
+    lines = [json.dumps(raw_battle(i)) for i in range(1, 41)] + ['{"id": "inválido"}']
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+    with use_region('europe'):
+        battles_df = bulk_ingest([str(path)], guild_id='g1', workers=workers, chunk_bytes=1024)
+        quarantine_file = region_path(battle_schema.QUARANTINE_FILE)
+
+    assert len(battles_df) == 40
+    assert os.path.exists(quarantine_file)
+    assert not os.path.exists(battle_schema.QUARANTINE_FILE)
+
+
+def test_players_of_rejected_battles_are_not_queued(tmp_path):
+    from player_profiles import get_profile_cache
+    import player_profiles
+
+    rejected = raw_battle(2)
+    rejected['players'].append({'id': 'p-ruim', 'guildId': 'g1', 'kills': -1})
+    path = tmp_path / 'dump.jsonl'
+    path.write_text('\n'.join(json.dumps(b) for b in [raw_battle(1), rejected]), encoding='utf-8')
+
+    with use_region('asia'):
+        player_profiles._caches.pop('asia', None)
+        battles_df = bulk_ingest([str(path)], guild_id='g1', workers=1)
+        pending = get_profile_cache().pending_ids()
+
+    assert battles_df['battle_id'].tolist() == [1]
+    assert pending == ['p1']
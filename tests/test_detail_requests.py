@@ -0,0 +1,103 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from gameinfo_stub_server import FIXTURE_FILES, GameinfoStub, build_battles, \
+    load_fixture_battles, start_stub_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Serviço de ingestão: carga de fundo saturando o limitador e atendimento dos pedidos do app
+DAEMON_SCRIPT = textwrap.dedent("""
+    import json, logging, sys, threading, time
+    logging.disable(logging.CRITICAL)
+    from gameinfo_client import get_client
+    from detail_requests import DetailRequestServer
+
+    background_ids = sys.argv[1].split(',')
+    stop = threading.Event()
+    latencies = []
+
+    def background_load(battle_id):
+        while not stop.is_set():
+            started = time.monotonic()
+            get_client().get('battle', f'/battles/{battle_id}', use_cache=False, hedge=False)
+            latencies.append((started, time.monotonic() - started))
+
+    threads = [threading.Thread(target=background_load, args=(background_ids[i % len(background_ids)],))
+               for i in range(24)]
+    for thread in threads:
+        thread.start()
+    server = DetailRequestServer()
+    server.start()
+    # Esvaziar o bucket para medir a fila em regime
+    time.sleep(2)
+    ready = time.monotonic()
+    print('ready', flush=True)
+    sys.stdin.readline()
+    # Aguardar as requisições de fundo que entraram na fila junto com o pedido do app
+    time.sleep(5)
+    stop.set()
+    server.stop()
+    queued = [latency for started, latency in list(latencies) if started >= ready]
+    print(json.dumps({'background_mean': sum(queued) / len(queued)}), flush=True)
+    import os
+    os._exit(0)
+""")
+
+# App: pede os detalhes ao serviço, sem acessar a API
+APP_SCRIPT = textwrap.dedent("""
+    import json, logging, sys, time
+    logging.disable(logging.CRITICAL)
+    from detail_requests import request_battle_details
+
+    started = time.monotonic()
+    details = request_battle_details(sys.argv[1], 'We Profit')
+    print(json.dumps({'elapsed': time.monotonic() - started,
+                      'guilds': len(details['guilds']) if details else None,
+                      'time': details['time'].isoformat() if details else None,
+                      'client_loaded': 'gameinfo_client' in sys.modules}))
+""")
+
+
+@pytest.fixture
+def stub():
+    battles = build_battles(load_fixture_battles([os.path.join(ROOT, path) for path in FIXTURE_FILES]))
+    server, base_url = start_stub_server(stub=GameinfoStub(battles, latency=0.02))
+    yield server.stub, base_url
+    server.shutdown()
+    server.server_close()
+
+
+def test_interactive_request_preempts_background_load_in_daemon_process(stub, tmp_path):
+    stub, base_url = stub
+    battle_ids = [str(battle['id']) for battle in stub.battles]
+    interactive_id, background_ids = battle_ids[0], battle_ids[1:5]
+    env = dict(os.environ, GAMEINFO_BASE_URL=base_url, PYTHONPATH=ROOT)
+
+    daemon = subprocess.Popen([sys.executable, '-c', DAEMON_SCRIPT, ','.join(background_ids)],
+                              cwd=tmp_path, env=env, text=True,
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    try:
+        assert daemon.stdout.readline().strip() == 'ready'
+        app = subprocess.run([sys.executable, '-c', APP_SCRIPT, interactive_id],
+                             cwd=tmp_path, env=env, text=True, capture_output=True, timeout=60)
+        result = json.loads(app.stdout)
+        daemon.stdin.write('stop\n')
+        daemon.stdin.flush()
+        load = json.loads(daemon.stdout.readline())
+    finally:
+        daemon.kill()
+        daemon.wait()
+
+    # O app não acessou a API: a batalha foi buscada pelo serviço
+    assert not result['client_loaded']
+    assert result['guilds']
+    assert result['time']
+    # Com o limitador do serviço saturado, o pedido interativo passou na frente da fila
+    assert load['background_mean'] > 1.0
+    assert result['elapsed'] < load['background_mean'] / 2
@@ -0,0 +1,55 @@
+import pytest
+
+import event_ingester
+from event_ingester import EventCursor, ingest_guild_events, load_events
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def make_event(event_id):
+    return {
+        'EventId': event_id,
+        'TimeStamp': '2099-01-01T12:00:00.000000Z',
+        'BattleId': 500,
+        'TotalVictimKillFame': 1000,
+        'Killer': {'Id': 'k', 'Name': 'Killer', 'GuildId': 'g1'},
+        'Victim': {'Id': 'v', 'Name': 'Victim', 'GuildId': 'g2'},
+        'Participants': [],
+    }
+
+
+def fake_listing(events):
+    def fetch(guild_id, offset, limit, max_attempts, delay, deadline):
+        def page():
+            yield from events[offset:offset + limit]
+        return page()
+    return fetch
+
+
+def test_page_rewritten_after_crash_is_read_once(monkeypatch):
+    events = [make_event(event_id) for event_id in range(60, 0, -1)]
+    monkeypatch.setattr(event_ingester, '_fetch_events_page', fake_listing(events))
+
+    # Queda entre a gravação da primeira página e o checkpoint
+    save = EventCursor.save
+    calls = []
+
+    def crash_on_first_save(self):
+        calls.append(self.run)
+        if len(calls) == 1:
+            raise KeyboardInterrupt
+        save(self)
+
+    monkeypatch.setattr(EventCursor, 'save', crash_on_first_save)
+    with pytest.raises(KeyboardInterrupt):
+        ingest_guild_events('g1', first_run_days=36500)
+    monkeypatch.setattr(EventCursor, 'save', save)
+
+    assert ingest_guild_events('g1', first_run_days=36500) == len(events)
+
+    events_df = load_events('g1')
+    assert len(events_df) == len(events)
+    assert events_df['event_id'].is_unique
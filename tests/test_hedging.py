@@ -0,0 +1,115 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from gameinfo_client import GameinfoClient
+from hedging import HedgeBudget, HedgePolicy, LatencyTracker
+from rate_limiter import AdaptiveRateLimiter
+
+
+class SlowFirstHandler(BaseHTTPRequestHandler):
+    """
+    A primeira requisição demora 'slow' segundos; as demais respondem na hora.
+    """
+    slow = 0.0
+    calls = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with SlowFirstHandler.lock:
+            SlowFirstHandler.calls += 1
+            first = SlowFirstHandler.calls == 1
+        if first:
+            time.sleep(SlowFirstHandler.slow)
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    SlowFirstHandler.calls = 0
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), SlowFirstHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_policy(latency):
+    tracker = LatencyTracker()
+    for _ in range(50):
+        tracker.record('battle', latency)
+    return HedgePolicy(tracker=tracker)
+
+
+def test_percentile_needs_min_samples():
+    tracker = LatencyTracker()
+    for value in range(10):
+        tracker.record('battle', value)
+    assert tracker.percentile('battle', 90) is None
+    for value in range(10, 20):
+        tracker.record('battle', value)
+    assert tracker.percentile('battle', 90) == 18
+
+
+def test_budget_limits_hedges_to_ratio():
+    budget = HedgeBudget(ratio=0.25, burst=1)
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    for _ in range(4):
+        budget.on_request()
+    assert budget.try_spend()
+    assert (budget.hedges, budget.denied) == (2, 1)
+
+
+def test_slow_response_is_hedged(server):
+    SlowFirstHandler.slow = 1.0
+    policy = make_policy(0.05)
+    client = GameinfoClient(base_url=server, hedging=policy)
+
+    started = time.monotonic()
+    response = client.get('battle', '/battles/1')
+    assert response.json() == {'ok': True}
+    assert time.monotonic() - started < 0.9
+    assert policy.stats()['hedges'] == 1
+    assert policy.stats()['hedge_wins'] == 1
+    client.close()
+
+
+def test_time_waiting_for_the_limiter_does_not_trigger_hedges(server):
+    SlowFirstHandler.slow = 0.0
+    policy = make_policy(0.05)
+    # Sem tokens: a original espera ~0.5 s no limitador antes de ser enviada
+    limiter = AdaptiveRateLimiter(rate=2, burst=1, reserve=0)
+    assert limiter.acquire()
+    client = GameinfoClient(base_url=server, hedging=policy, limiter=limiter)
+
+    response = client.get('battle', '/battles/1')
+    assert response.status_code == 200
+    assert policy.stats()['hedges'] == 0
+    assert SlowFirstHandler.calls == 1
+    client.close()
+
+
+def test_percentile_ignores_expired_samples(monkeypatch):
+    import hedging
+    now = [100.0]
+    monkeypatch.setattr(hedging.time, 'monotonic', lambda: now[0])
+    tracker = LatencyTracker()
+    for _ in range(5):
+        tracker.record('battles', 20.0)
+    assert tracker.percentile('battles', 50, min_samples=5, max_age=60) == 20.0
+
+    now[0] += 61
+    assert tracker.percentile('battles', 50, min_samples=5, max_age=60) is None
+    assert tracker.percentile('battles', 50, min_samples=5) == 20.0
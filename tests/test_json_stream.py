@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from json_stream import iter_json_array, iter_json_file
+
+BATTLES = [
+    {'id': 101, 'name': 'Batalha "um"', 'players': {'a': {'kills': 3}}},
+    {'id': 102, 'totalFame': 123456789, 'startTime': '2024-05-01T10:00:00Z'},
+    [1, 2.5, -3e2],
+    12345,
+    'texto com ] e , dentro',
+    None,
+]
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 10_000])
+def test_items_split_at_any_chunk_boundary(size):
+    text = json.dumps(BATTLES, indent=1)
+    assert list(iter_json_array(chunked(text, size))) == BATTLES
+
+
+def test_number_split_across_chunks_is_not_truncated():
+    assert list(iter_json_array(['[12', '34', '5, 6', '7]'])) == [12345, 67]
+
+
+def test_empty_chunks_and_whitespace_are_ignored():
+    assert list(iter_json_array(['', '  [', '', ' {"id": 1} ', '', ']\n'])) == [{'id': 1}]
+    assert list(iter_json_array(['[]'])) == []
+    assert list(iter_json_array(['', '  '])) == []
+
+
+def test_non_array_is_yielded_whole():
+    error = {'error': 'rate limited', 'retry': [1, 2]}
+    assert list(iter_json_array(chunked(json.dumps(error), 3))) == [error]
+
+
+@pytest.mark.parametrize('text', ['[1, 2', '[1 2]', '[1,]', '[{"id": 1'])
+def test_malformed_array_raises(text):
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunked(text, 2)))
+
+
+def test_items_are_yielded_before_the_rest_is_read():
+    read = []
+
+    def chunks():
+        for chunk in ['[{"id": 1}', ', {"id": 2}', ']']:
+            read.append(chunk)
+            yield chunk
+
+    items = iter_json_array(chunks())
+    assert next(items) == {'id': 1}
+    assert len(read) < 3
+
+
+def test_iter_json_file(tmp_path):
+    path = tmp_path / 'data.json'
+    path.write_text(json.dumps(BATTLES), encoding='utf-8')
+    assert list(iter_json_file(path, chunk_size=5)) == BATTLES
@@ -0,0 +1,70 @@
+import threading
+import time
+
+import rate_limiter
+from rate_limiter import (AdaptiveRateLimiter, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE,
+                          parse_retry_after)
+
+
+def test_parse_retry_after_seconds_and_cap():
+    assert parse_retry_after('3') == 3.0
+    assert parse_retry_after('-5') == 0.0
+    assert parse_retry_after('100000') == rate_limiter.MAX_RETRY_AFTER
+    assert parse_retry_after('amanhã') is None
+    assert parse_retry_after(None) is None
+
+
+def test_rate_halves_on_429_and_recovers_additively():
+    limiter = AdaptiveRateLimiter(rate=4.0, min_rate=0.5)
+    limiter.on_response(429, {'Retry-After': '0'})
+    assert limiter.rate == 2.0
+    limiter.on_response(503)
+    assert limiter.rate == 2.0 * rate_limiter.ERROR_DECREASE
+
+    limiter.on_response(200)
+    assert limiter.rate == 1.6 + rate_limiter.INCREASE_STEP * 4.0
+    for _ in range(100):
+        limiter.on_response(200)
+    assert limiter.rate == 4.0
+
+
+def test_rate_never_drops_below_minimum():
+    limiter = AdaptiveRateLimiter(rate=4.0, min_rate=0.5)
+    for _ in range(10):
+        limiter.on_response(429, {'Retry-After': '0'})
+    assert limiter.rate == 0.5
+
+
+def test_retry_after_blocks_new_tokens():
+    limiter = AdaptiveRateLimiter(rate=100, burst=5)
+    limiter.on_response(429, {'Retry-After': '0.3'})
+    assert not limiter.acquire(timeout=0.1)
+    assert limiter.acquire(timeout=1)
+
+
+def test_background_requests_leave_the_interactive_reserve():
+    limiter = AdaptiveRateLimiter(rate=0.1, burst=2, reserve=1)
+    assert limiter.acquire(timeout=0, priority=PRIORITY_BACKGROUND)
+    assert not limiter.acquire(timeout=0, priority=PRIORITY_BACKGROUND)
+    assert limiter.acquire(timeout=0, priority=PRIORITY_INTERACTIVE)
+
+
+def test_waiting_interactive_request_is_served_before_background():
+    limiter = AdaptiveRateLimiter(rate=4, burst=1, reserve=0)
+    assert limiter.acquire(timeout=0)
+    order = []
+
+    def take(priority, name):
+        limiter.acquire(priority=priority)
+        order.append(name)
+
+    background = threading.Thread(target=take, args=(PRIORITY_BACKGROUND, 'background'))
+    background.start()
+    while limiter._waiting[PRIORITY_BACKGROUND] == 0:
+        time.sleep(0.001)
+    interactive = threading.Thread(target=take, args=(PRIORITY_INTERACTIVE, 'interactive'))
+    interactive.start()
+    background.join(timeout=5)
+    interactive.join(timeout=5)
+
+    assert order == ['interactive', 'background']
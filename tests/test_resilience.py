@@ -0,0 +1,125 @@
+import time
+
+import pytest
+
+import resilience
+from gameinfo_client import GameinfoClient
+from rate_limiter import AdaptiveRateLimiter
+from resilience import CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience.time, 'monotonic', clock)
+    return clock
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=60)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == resilience.OPEN
+    assert not breaker.allow_request()
+    assert breaker.retry_in() == 60
+
+
+def test_breaker_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == resilience.CLOSED
+
+
+def test_breaker_half_open_allows_a_single_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+    breaker.record_failure()
+    clock.now += 60
+
+    assert breaker.allow_request()
+    assert breaker.state == resilience.HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == resilience.CLOSED
+    assert breaker.allow_request()
+
+
+def test_breaker_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+    breaker.record_failure()
+    clock.now += 60
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == resilience.OPEN
+    assert breaker.is_open()
+    clock.now += 59
+    assert not breaker.allow_request()
+
+
+def test_breaker_released_probe_can_be_retried(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+    breaker.record_failure()
+    clock.now += 60
+    assert breaker.allow_request()
+
+    breaker.release_probe()
+    assert breaker.allow_request()
+
+
+def test_deadline_caps_timeouts(clock):
+    deadline = Deadline(10)
+    assert deadline.cap_timeout((5, 30)) == (5, 10)
+    assert deadline.cap_timeout(3) == 3
+    assert Deadline().cap_timeout((5, 30)) == (5, 30)
+
+    clock.now += 10
+    assert deadline.expired()
+    with pytest.raises(DeadlineExceeded):
+        deadline.cap_timeout(3)
+
+
+def test_client_limiter_wait_is_bounded_by_deadline():
+    limiter = AdaptiveRateLimiter(rate=0.5, burst=1, reserve=0)
+    assert limiter.acquire()
+    client = GameinfoClient(base_url='http://127.0.0.1:9', limiter=limiter)
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        client.get('battle', '/battles/1', deadline=started + 0.1)
+    assert time.monotonic() - started < 1
+
+
+def test_client_deadline_in_limiter_releases_breaker_probe():
+    limiter = AdaptiveRateLimiter(rate=0.5, burst=1, reserve=0)
+    assert limiter.acquire()
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+    breaker.record_failure()
+    client = GameinfoClient(base_url='http://127.0.0.1:9', limiter=limiter, breaker=breaker)
+
+    with pytest.raises(DeadlineExceeded):
+        client.get('battle', '/battles/1', deadline=time.monotonic() + 0.05)
+    # O teste do circuito não chegou a ser enviado: outra requisição pode fazê-lo
+    assert breaker.allow_request()
+
+
+def test_client_refuses_requests_with_open_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+    breaker.record_failure()
+    client = GameinfoClient(base_url='http://127.0.0.1:9', breaker=breaker)
+
+    with pytest.raises(CircuitOpenError):
+        client.get('battle', '/battles/1')